@@ -10,6 +10,10 @@ class AgentBundle:
         self.metadata = metadata or {}
 
     def save(self, filepath: str):
+        if filepath.endswith('.qt'):
+            from agents.model_format import save_compact
+            save_compact(self.agent, filepath, self.metadata)
+            return
         directory = os.path.dirname(filepath)
         if directory and not os.path.exists(directory):
             os.makedirs(directory)
@@ -22,8 +26,15 @@ class AgentBundle:
 
     @classmethod
     def load(cls, filepath: str):
+        if filepath.endswith('.qt'):
+            # memory-mapped: Q-values are paged in on demand and shared between processes
+            from agents.model_format import load_compact
+            return cls(*load_compact(filepath))
         with open(filepath, 'rb') as f:
             bundle = pickle.load(f)
+        if isinstance(bundle, BaseAgent):
+            # plain agent pickled by BaseAgent.save
+            return cls(bundle)
         agent = bundle.get('agent_state')
         metadata = bundle.get('metadata')
         return cls(agent, metadata)
@@ -3,6 +3,11 @@ import abc
 import pickle
 
 class BaseAgent(abc.ABC):
+    # agents are slotted; subclasses list their own attributes
+    __slots__ = ('action_space', 'knowledge')
+    # 'thief' or 'guard'; loaders and the tournament classify agents by it
+    role = None
+
     def __init__(self, action_space):
         self.action_space = action_space
         self.knowledge = {}
@@ -15,7 +20,22 @@ class BaseAgent(abc.ABC):
     def update(self, state, action, reward, next_state, done):
         pass
 
+    def __getstate__(self):
+        # pickled as a plain attribute dict, the same layout as the
+        # pre-__slots__ agents, so old and new pickles load either way
+        return {name: getattr(self, name)
+                for cls in type(self).__mro__ for name in getattr(cls, '__slots__', ())
+                if hasattr(self, name)}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def save(self, filepath):
+        if filepath.endswith('.qt'):
+            from agents.model_format import save_compact
+            save_compact(self, filepath)
+            return
         directory = os.path.dirname(filepath)
         if directory and not os.path.exists(directory):
             os.makedirs(directory)
@@ -23,11 +43,25 @@ class BaseAgent(abc.ABC):
             pickle.dump(self, f)
 
     @classmethod
-    def load(cls, filepath):
-        with open(filepath, 'rb') as f:
-            agent = pickle.load(f)
+    def load(cls, filepath, role=None):
+        if filepath.endswith('.qt'):
+            from agents.model_format import load_compact
+            agent, _ = load_compact(filepath)
+        else:
+            agent = cls._load_pickle(filepath)
         if not isinstance(agent, cls):
             raise TypeError(f"Loaded object is not a {cls.__name__}")
+        if role is not None and agent.role != role:
+            raise TypeError(f"{filepath} holds a {type(agent).__name__}, not a {role} agent")
+        return agent
+
+    @staticmethod
+    def _load_pickle(filepath):
+        with open(filepath, 'rb') as f:
+            agent = pickle.load(f)
+        # AgentBundle pickles wrap the agent in a dict
+        if isinstance(agent, dict) and 'agent_state' in agent:
+            agent = agent['agent_state']
         return agent
 
     def reset(self):
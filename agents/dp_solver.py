@@ -0,0 +1,418 @@
+import copy
+import itertools
+
+import numpy as np
+
+from env.heist_env import HeistEnv
+from agents.q_table import ArrayQTable, StateEncoder
+from agents.thief_agent import ThiefAgent
+from utils import _best_trap_tile
+
+# HeistEnv.step reward terms seen by the thief
+R_IDLE, R_ALARM, R_GEM, R_TRAP, R_CAUGHT, R_ESCAPE = -0.1, -1.0, 1.0, -2.0, -5.0, 5.0
+
+
+class GuardPolicy:
+    """
+    Action distribution of a fixed guard over its masked observation.
+
+    With a GuardAgent this is exactly what select_action() samples from:
+    epsilon spread uniformly, the rest split over the greedy actions (all
+    of them for unseen states). Without an agent the guard is uniform
+    random, like evaluate.py's fallback when no model is found.
+    """
+    def __init__(self, agent=None, epsilon=None, num_actions=6):
+        self.agent = agent
+        self.num_actions = num_actions
+        if epsilon is None:
+            epsilon = agent.epsilon if agent is not None else 1.0
+        self.epsilon = epsilon
+        if agent is not None:
+            self.keys, self.values = agent.q_table.sorted_arrays()
+
+    def probs(self, keys):
+        """
+        [len(keys), num_actions] action probabilities for encoded guard states.
+        """
+        n, A = len(keys), self.num_actions
+        greedy = np.ones((n, A))
+        if self.agent is not None and len(self.keys):
+            pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            seen = self.keys[pos] == keys
+            q = np.asarray(self.values[pos[seen]])
+            greedy[seen] = q == q.max(axis=1, keepdims=True)
+        greedy /= greedy.sum(axis=1, keepdims=True)
+        return (1.0 - self.epsilon) * greedy + self.epsilon / A
+
+
+class ThiefModel:
+    """
+    Tabular MDP over the thief's observation (the 6-tuple state) for a fixed
+    guard policy, built by breadth-first expansion from reset states.
+
+    States are StateEncoder keys, expanded in vectorised batches. One step
+    follows HeistEnv.step term for term. The counters the observation does
+    not carry are approximated:
+
+    * exit relocation (every EXIT_CHANGE_INTERVAL steps) is a per-step
+      hazard of 1 / EXIT_CHANGE_INTERVAL;
+    * a triggered alarm stays visible for two observations, modelled as
+      clearing with probability 1/2 per step;
+    * traps persist until sprung (no TTL);
+    * trap placement scores paths of the remaining gems only, since the
+      observation does not say where collected gems were.
+    """
+    def __init__(self, layout=None, guard_policy=None, beta_t=0.05):
+        env = HeistEnv(layout, beta_t=beta_t)
+        self.env = env
+        self.layout = env.layout
+        self.encoder = StateEncoder.for_env(env)
+        self.guard_policy = guard_policy or GuardPolicy()
+        guard = self.guard_policy.agent
+        if guard is not None and vars(guard.encoder) != vars(self.encoder):
+            raise ValueError("guard policy was trained on a different layout")
+        self.num_actions = len(env.ACTIONS)
+        self.width = env.width
+        self.C = env.height * env.width
+        self.R = self.C + 1
+        self.k = self.encoder.max_items
+        self.num_gems = env.num_gems
+        self.max_traps = env.max_traps
+        self.exit_hazard = 1.0 / env.EXIT_CHANGE_INTERVAL
+        self._trap_cache = {}
+        self._build_tables()
+
+    def _build_tables(self):
+        C, env = self.C, self.env
+        cells = [(c // self.width, c % self.width) for c in range(C)]
+        deltas = {0: (0, 0), 1: (-1, 0), 2: (1, 0), 3: (0, -1), 4: (0, 1), 5: (0, 0)}
+        self.next_cell = np.zeros((C, self.num_actions), dtype=np.int64)
+        for c, (x, y) in enumerate(cells):
+            for a, (dx, dy) in deltas.items():
+                pos = (x + dx, y + dy)
+                self.next_cell[c, a] = pos[0] * self.width + pos[1] if env._is_valid(pos) else c
+        xs = np.array([p[0] for p in cells] + [0])
+        ys = np.array([p[1] for p in cells] + [0])
+        # row/column C is the padding code; its distances are never used
+        self.manhattan = np.abs(xs[:, None] - xs[None, :]) + np.abs(ys[:, None] - ys[None, :])
+        self.alarm_cells = np.zeros(self.R, dtype=bool)
+        for x, y in env.alarms:
+            self.alarm_cells[x * self.width + y] = True
+        self.corners = np.array([x * self.width + y for x, y in env._corners], dtype=np.int64)
+
+    # ---- key packing ----
+
+    def encode(self, thief, guard, gems, traps, alarm, exit_cell):
+        R = self.R
+        key = thief * R + guard
+        for j in range(self.k):
+            key = key * R + gems[:, j]
+        for j in range(self.k):
+            key = key * R + traps[:, j]
+        key = key * 2 + alarm
+        return key * self.C + exit_cell
+
+    def decode(self, keys):
+        R = self.R
+        keys, exit_cell = np.divmod(keys, self.C)
+        keys, alarm = np.divmod(keys, 2)
+        items = np.empty((len(keys), 2 * self.k), dtype=np.int64)
+        for j in reversed(range(2 * self.k)):
+            keys, items[:, j] = np.divmod(keys, R)
+        thief, guard = np.divmod(keys, R)
+        return thief, guard, items[:, :self.k], items[:, self.k:], alarm, exit_cell
+
+    def start_keys(self, num_starts=None, seed=None):
+        """
+        Keys of reset states: every gem/exit draw, or num_starts of them.
+        """
+        env = self.env
+        thief_start, guard_start = self.layout.thief_start, self.layout.guard_start
+        exits = [c for c in env._corners if c not in (thief_start, guard_start)]
+        states = []
+        for exit_pos in exits:
+            forbidden = env.walls | env.alarms | {thief_start, guard_start, exit_pos}
+            empties = [(x, y) for x in range(env.height) for y in range(env.width)
+                       if (x, y) not in forbidden]
+            for gems in itertools.combinations(empties, self.num_gems):
+                states.append((thief_start, guard_start, gems, (), False, exit_pos))
+        if num_starts is not None and num_starts < len(states):
+            rng = np.random.default_rng(seed)
+            states = [states[i] for i in rng.choice(len(states), num_starts, replace=False)]
+        return np.unique(np.array([self.encoder.encode(s) for s in states], dtype=np.int64))
+
+    # ---- transitions ----
+
+    def _trap_tiles(self, thief, gems, traps, exit_cell, guard):
+        """
+        compute_best_trap_tile for each lane (falling back to the guard's tile).
+        """
+        R, k, w = self.R, self.k, self.width
+        key = thief
+        for j in range(k):
+            key = key * R + gems[:, j]
+        for j in range(k):
+            key = key * R + traps[:, j]
+        key = key * self.C + exit_cell
+        uniq, inverse = np.unique(key, return_inverse=True)
+        first = np.zeros(len(uniq), dtype=np.int64)
+        first[inverse[::-1]] = np.arange(len(key))[::-1]
+        walls, alarms = self.layout.walls, self.layout.alarms
+        tiles = np.empty(len(uniq), dtype=np.int64)
+        for u, i in enumerate(first):
+            tile = self._trap_cache.get(int(uniq[u]))
+            if tile is None:
+                best = _best_trap_tile(
+                    walls, alarms, self.width, self.env.height,
+                    (int(thief[i]) // w, int(thief[i]) % w),
+                    tuple((int(c) // w, int(c) % w) for c in gems[i] if c != self.C), (),
+                    (int(exit_cell[i]) // w, int(exit_cell[i]) % w),
+                    frozenset((int(c) // w, int(c) % w) for c in traps[i] if c != self.C),
+                )
+                tile = -1 if best is None else best[0] * w + best[1]
+                self._trap_cache[int(uniq[u])] = tile
+            tiles[u] = tile
+        tiles = tiles[inverse]
+        return np.where(tiles < 0, guard, tiles)
+
+    def expand(self, keys):
+        """
+        All one-step outcomes of the given states under every thief action.
+
+        Returns (state, action, next_key, prob, reward, done) arrays with one
+        entry per outcome; `state` indexes into keys.
+        """
+        C, k, A = self.C, self.k, self.num_actions
+        n = len(keys)
+        thief, guard, gems, traps, alarm, exit_cell = self.decode(keys)
+
+        # the guard acts on its masked view of the current observation
+        visible = (alarm == 1) | (self.manhattan[thief, guard] <= 2)
+        guard_keys = self.encode(np.where(visible, thief, C), guard, gems, traps, alarm, exit_cell)
+        guard_probs = self.guard_policy.probs(guard_keys)
+
+        # exit relocation
+        lane_state, lane_exit, lane_prob = [], [], []
+        h = self.exit_hazard if len(self.corners) > 1 else 0.0
+        for corner in self.corners:
+            p = np.where(exit_cell == corner, 1.0 - h, h / max(len(self.corners) - 1, 1))
+            keep = p > 0
+            lane_state.append(np.nonzero(keep)[0])
+            lane_exit.append(np.full(keep.sum(), corner, dtype=np.int64))
+            lane_prob.append(p[keep])
+        s = np.concatenate(lane_state)
+        new_exit = np.concatenate(lane_exit)
+        prob = np.concatenate(lane_prob)
+
+        # thief actions
+        s = np.repeat(s, A)
+        new_exit = np.repeat(new_exit, A)
+        prob = np.repeat(prob, A)
+        action = np.tile(np.arange(A), len(s) // A)
+        t_old = thief[s]
+        t_new = self.next_cell[t_old, action]
+        gem_slots = gems[s]
+        reward = np.where(t_new == t_old, R_IDLE, 0.0)
+        dist = np.where(gem_slots < C, self.manhattan[t_old[:, None], gem_slots], np.iinfo(np.int64).max)
+        nearest = gem_slots[np.arange(len(s)), dist.argmin(axis=1)]
+        goal = np.where(gem_slots[:, 0] < C, nearest, new_exit)
+        reward += self.env.beta_t * (self.manhattan[t_old, goal] - self.manhattan[t_new, goal])
+
+        # guard actions with non-zero probability
+        gp = guard_probs[s]
+        lane, g_action = np.nonzero(gp > 0)
+        prob = prob[lane] * gp[lane, g_action]
+        s, action, new_exit, t_new, reward = s[lane], action[lane], new_exit[lane], t_new[lane], reward[lane]
+        g_old = guard[s]
+        gem_slots = gems[s]
+        trap_slots = traps[s].copy()
+        g_new = np.where(g_action == 5, g_old, self.next_cell[g_old, np.minimum(g_action, 4)])
+        num_traps = (trap_slots < C).sum(axis=1)
+        place = (g_action == 5) & (num_traps < self.max_traps)
+        if place.any():
+            idx = np.nonzero(place)[0]
+            tiles = self._trap_tiles(t_new[idx], gem_slots[idx], trap_slots[idx], new_exit[idx], g_old[idx])
+            already = (trap_slots[idx] == tiles[:, None]).any(axis=1)
+            trap_slots[idx[~already], self.k - 1] = tiles[~already]
+            trap_slots.sort(axis=1)
+
+        # alarm: triggered by the thief's tile, otherwise clears with p = 1/2
+        on_alarm = self.alarm_cells[t_new]
+        was_on = alarm[s] == 1
+        split = ~on_alarm & was_on
+        new_alarm = (on_alarm | was_on).astype(np.int64)
+        reward = reward + np.where(on_alarm, R_ALARM, 0.0)
+        extra = np.nonzero(split)[0]
+        prob = np.where(split, 0.5, 1.0) * prob
+        s = np.concatenate([s, s[extra]])
+        action = np.concatenate([action, action[extra]])
+        t_new = np.concatenate([t_new, t_new[extra]])
+        g_new = np.concatenate([g_new, g_new[extra]])
+        new_exit = np.concatenate([new_exit, new_exit[extra]])
+        gem_slots = np.concatenate([gem_slots, gem_slots[extra]])
+        trap_slots = np.concatenate([trap_slots, trap_slots[extra]])
+        new_alarm = np.concatenate([new_alarm, np.zeros(len(extra), dtype=np.int64)])
+        reward = np.concatenate([reward, reward[extra]])
+        prob = np.concatenate([prob, prob[extra]])
+
+        # gem pickup and sprung traps
+        got_gem = gem_slots == t_new[:, None]
+        reward = reward + np.where(got_gem.any(axis=1), R_GEM, 0.0)
+        gem_slots = np.where(got_gem, C, gem_slots)
+        gem_slots.sort(axis=1)
+        sprung = trap_slots == t_new[:, None]
+        reward = reward + np.where(sprung.any(axis=1), R_TRAP, 0.0)
+        trap_slots = np.where(sprung, C, trap_slots)
+        trap_slots.sort(axis=1)
+
+        caught = t_new == g_new
+        escaped = ~caught & (gem_slots[:, 0] == C) & (t_new == new_exit)
+        reward = reward + np.where(caught, R_CAUGHT, 0.0) + np.where(escaped, R_ESCAPE, 0.0)
+        next_keys = self.encode(t_new, g_new, gem_slots, trap_slots, new_alarm, new_exit)
+        return s, action, next_keys, prob, reward, caught | escaped
+
+    def build(self, start_keys, max_states=None, batch_size=20000, verbose=False):
+        """
+        Breadth-first expansion from start_keys.
+
+        Returns (keys, num_expanded, expected_rewards, rows, cols, probs):
+        keys[:num_expanded] were expanded; any remaining keys are frontier
+        states left unexpanded because max_states was reached. expected_rewards
+        is [num_expanded, num_actions]; (rows, cols, probs) is the sparse
+        transition matrix from state-action rows (state * num_actions + action)
+        to non-terminal next states.
+        """
+        A = self.num_actions
+        order = [np.asarray(start_keys, dtype=np.int64)]
+        known = np.sort(order[0])
+        frontier = order[0]
+        expanded = 0
+        rewards, rows, next_keys, probs = [], [], [], []
+        while len(frontier):
+            if max_states is not None and expanded + len(frontier) > max_states:
+                frontier = frontier[:max(max_states - expanded, 0)]
+                if not len(frontier):
+                    break
+            found = []
+            for lo in range(0, len(frontier), batch_size):
+                batch = frontier[lo:lo + batch_size]
+                s, a, nk, p, r, done = self.expand(batch)
+                sa = s * A + a
+                rewards.append(np.bincount(sa, weights=p * r, minlength=len(batch) * A))
+                live = ~done
+                # merge outcomes that lead to the same state
+                sa, nk, p = sa[live] + (expanded + lo) * A, nk[live], p[live]
+                perm = np.lexsort((nk, sa))
+                sa, nk, p = sa[perm], nk[perm], p[perm]
+                first = np.ones(len(sa), dtype=bool)
+                first[1:] = (sa[1:] != sa[:-1]) | (nk[1:] != nk[:-1])
+                starts = np.nonzero(first)[0]
+                rows.append(sa[starts].astype(np.int32))
+                next_keys.append(nk[starts])
+                probs.append(np.add.reduceat(p, starts).astype(np.float32) if len(p) else p.astype(np.float32))
+                found.append(np.unique(nk))
+            expanded += len(frontier)
+            found = np.unique(np.concatenate(found))
+            frontier = found[~np.isin(found, known, assume_unique=True)]
+            known = np.union1d(known, frontier)
+            order.append(frontier)
+            if verbose:
+                print(f"  expanded {expanded} states, {len(frontier)} new")
+            if max_states is not None and expanded >= max_states:
+                break
+        keys = np.concatenate(order)
+        sorter = np.argsort(keys)
+        cols = [sorter[np.searchsorted(keys, nk, sorter=sorter)].astype(np.int32) for nk in next_keys]
+        expected = np.concatenate(rewards).reshape(expanded, A)
+        return keys, expanded, expected, np.concatenate(rows), np.concatenate(cols), np.concatenate(probs)
+
+
+def lookup_values(table, keys):
+    """
+    max_a Q(s, a) from an existing Q-table for each key (0 for unseen keys).
+    """
+    table_keys, table_values = table.sorted_arrays()
+    values = np.zeros(len(keys))
+    if len(table_keys):
+        pos = np.minimum(np.searchsorted(table_keys, keys), len(table_keys) - 1)
+        seen = table_keys[pos] == keys
+        values[seen] = np.asarray(table_values[pos[seen]]).max(axis=1)
+    return values
+
+
+def value_iteration(expected_rewards, rows, cols, probs, num_states, gamma=0.99,
+                    tol=1e-4, max_iters=10000, frontier_values=None, block_size=2000):
+    """
+    Q* for the sparse model from ThiefModel.build.
+
+    Sweeps are block Gauss-Seidel in reverse expansion order, so values
+    flow back from the deep (terminal-heavy) layers within one sweep.
+    States past the expanded ones (the frontier) keep frontier_values, or 0.
+    Returns (Q, sweeps, final max |dV|).
+    """
+    num_expanded, A = expected_rewards.shape
+    V = np.zeros(num_states)
+    if frontier_values is not None:
+        V[num_expanded:] = frontier_values
+    weights = probs.astype(np.float64)
+    bounds = np.append(np.arange(0, num_expanded, block_size), num_expanded)
+    ptr = np.searchsorted(rows, bounds * A)
+    delta = 0.0
+    sweep = 0
+    for sweep in range(1, max_iters + 1):
+        delta = 0.0
+        for b in reversed(range(len(bounds) - 1)):
+            lo, hi, r0, r1 = bounds[b], bounds[b + 1], ptr[b], ptr[b + 1]
+            backup = np.bincount(rows[r0:r1] - lo * A, weights=weights[r0:r1] * V[cols[r0:r1]],
+                                 minlength=(hi - lo) * A)
+            new_v = (expected_rewards[lo:hi] + gamma * backup.reshape(-1, A)).max(axis=1)
+            delta = max(delta, float(np.abs(new_v - V[lo:hi]).max()))
+            V[lo:hi] = new_v
+        if delta < tol:
+            break
+    backup = np.bincount(rows, weights=weights * V[cols], minlength=num_expanded * A)
+    Q = expected_rewards + gamma * backup.reshape(num_expanded, A)
+    return Q, sweep, delta
+
+
+def solve_thief(layout=None, guard_policy=None, num_starts=None, seed=None, gamma=0.99,
+                tol=1e-4, max_iters=10000, max_states=None, init_agent=None, verbose=False):
+    """
+    Best-response thief against a fixed guard policy by value iteration.
+
+    With init_agent (a ThiefAgent for the same layout) its Q-values bootstrap
+    the unexpanded frontier and its Q-table is kept for states the solver did
+    not reach. Returns (agent, info): a greedy ThiefAgent and a dict of
+    model/solver statistics.
+    """
+    model = ThiefModel(layout, guard_policy)
+    starts = model.start_keys(num_starts, seed)
+    keys, expanded, expected, rows, cols, probs = model.build(starts, max_states, verbose=verbose)
+    frontier_values = None
+    if init_agent is not None:
+        if vars(init_agent.encoder) != vars(model.encoder):
+            raise ValueError("init_agent was trained on a different layout")
+        frontier_values = lookup_values(init_agent.q_table, keys[expanded:])
+    Q, sweeps, delta = value_iteration(expected, rows, cols, probs, len(keys),
+                                           gamma, tol, max_iters, frontier_values)
+
+    agent = ThiefAgent(model.env.ACTIONS, gamma=gamma, epsilon=0.0, encoder=model.encoder)
+    if init_agent is not None:
+        table = init_agent.q_table
+        table = table.to_array_table() if hasattr(table, 'to_array_table') else copy.deepcopy(table)
+    else:
+        table = ArrayQTable(model.num_actions, capacity=max(expanded, 1))
+    rows_out = np.fromiter((table.row(int(key)) for key in keys[:expanded]), dtype=np.int64,
+                           count=expanded)
+    table.values[rows_out] = Q
+    agent.q_table = table
+    info = {
+        'starts': len(starts),
+        'states': expanded,
+        'frontier': len(keys) - expanded,
+        'transitions': len(rows),
+        'sweeps': sweeps,
+        'residual': delta,
+        'start_value': float(Q[:len(starts)].max(axis=1).mean()) if expanded else 0.0,
+    }
+    return agent, info
@@ -0,0 +1,155 @@
+import heapq
+from array import array
+
+END = -1  # end of a linked list; also the next row of a terminal transition
+
+
+class PrioritizedSweeping:
+    """
+    Dyna-Q planning with prioritized sweeping on a tabular agent's Q-table.
+
+    Every real transition is applied with the agent's own update and
+    counted in a model of observed outcomes: one entry per distinct
+    (row, action, next row) with its visit count and reward sum, so
+    planning backs up the expected target over the successors seen so far
+    rather than the last sample (transitions against the opponent are
+    stochastic). Entries live in flat typed arrays chained into two linked
+    lists, the successors of each (row, action) cell and the entries leading
+    into each row, so no per-transition Python objects are kept.
+
+    Each real step then runs up to planning_steps backups, always of the
+    queued cell with the largest expected TD error, and queues the cells
+    leading into the backed-up state whose error exceeds theta. Whenever
+    the queue reaches twice queue_capacity it is cut back to the
+    queue_capacity highest priorities.
+    """
+    def __init__(self, agent, planning_steps, theta=1e-4, queue_capacity=10000):
+        self.agent = agent
+        self.planning_steps = planning_steps
+        self.theta = theta
+        self.queue_capacity = queue_capacity
+        self.num_actions = len(agent.action_space)
+        self.successors = array('i')  # cell -> first entry
+        self.incoming = array('i')  # row -> first entry leading into it
+        # entries
+        self.cell = array('q')
+        self.next_row = array('i')
+        self.count = array('i')
+        self.reward_sum = array('d')
+        self.next_successor = array('i')
+        self.next_incoming = array('i')
+        self.queue = []  # (-priority, cell) heap
+        self.queued = {}  # cell -> priority it is queued with
+        self.backups = 0
+        self.real_steps = 0
+
+    def __len__(self):
+        return len(self.cell)
+
+    def _record(self, cell, reward, next_row):
+        successors = self.successors
+        if cell >= len(successors):
+            successors.extend([END] * (cell + 1 - len(successors)))
+        entry = successors[cell]
+        while entry != END and self.next_row[entry] != next_row:
+            entry = self.next_successor[entry]
+        if entry == END:
+            entry = len(self.cell)
+            self.cell.append(cell)
+            self.next_row.append(next_row)
+            self.count.append(0)
+            self.reward_sum.append(0.0)
+            self.next_successor.append(successors[cell])
+            successors[cell] = entry
+            if next_row == END:
+                self.next_incoming.append(END)
+            else:
+                incoming = self.incoming
+                if next_row >= len(incoming):
+                    incoming.extend([END] * (next_row + 1 - len(incoming)))
+                self.next_incoming.append(incoming[next_row])
+                incoming[next_row] = entry
+        self.count[entry] += 1
+        self.reward_sum[entry] += reward
+
+    def _td(self, q, cell):
+        """
+        Expected TD error of cell under the model.
+        """
+        visits = 0
+        total = 0.0
+        bootstrap = 0.0
+        entry = self.successors[cell]
+        while entry != END:
+            n = self.count[entry]
+            visits += n
+            total += self.reward_sum[entry]
+            next_row = self.next_row[entry]
+            if next_row != END:
+                bootstrap += n * float(q[next_row].max())
+            entry = self.next_successor[entry]
+        row, action = divmod(cell, self.num_actions)
+        return (total + self.agent.gamma * bootstrap) / visits - float(q[row, action])
+
+    def _push(self, cell, priority):
+        if priority <= self.theta or self.queued.get(cell, 0.0) >= priority:
+            return
+        self.queued[cell] = priority
+        heapq.heappush(self.queue, (-priority, cell))
+        if len(self.queue) > 2 * self.queue_capacity:
+            # keep the highest priorities; superseded duplicates go first
+            kept = {}
+            for neg, c in sorted(self.queue):
+                if c not in kept and self.queued.get(c) == -neg:
+                    kept[c] = -neg
+                    if len(kept) == self.queue_capacity:
+                        break
+            self.queued = kept
+            self.queue = [(-p, c) for c, p in kept.items()]
+            heapq.heapify(self.queue)
+
+    def _pop(self):
+        while self.queue:
+            neg, cell = heapq.heappop(self.queue)
+            if self.queued.get(cell) == -neg:
+                del self.queued[cell]
+                return cell
+        return None
+
+    def _queue_predecessors(self, q, row):
+        if row >= len(self.incoming):
+            return
+        entry = self.incoming[row]
+        while entry != END:
+            cell = self.cell[entry]
+            self._push(cell, abs(self._td(q, cell)))
+            entry = self.next_incoming[entry]
+
+    def update(self, state, action, reward, next_state, done):
+        agent = self.agent
+        td_delta = agent.update(state, action, reward, next_state, done)
+        self.real_steps += 1
+        row = agent._row(state)
+        self._record(row * self.num_actions + action, reward, END if done else agent._row(next_state))
+        q = agent.q_table.values
+        self._queue_predecessors(q, row)
+
+        alpha = agent.alpha
+        for _ in range(self.planning_steps):
+            cell = self._pop()
+            if cell is None:
+                break
+            plan_row, plan_action = divmod(cell, self.num_actions)
+            q[plan_row, plan_action] += alpha * self._td(q, cell)
+            self.backups += 1
+            self._queue_predecessors(q, plan_row)
+        return td_delta
+
+    def stats(self):
+        return {
+            'real_steps': self.real_steps,
+            'planning_backups': self.backups,
+            'backups_per_real_step': round(self.backups / max(self.real_steps, 1), 2),
+            'model_entries': len(self.cell),
+            'queued': len(self.queued),
+        }
@@ -0,0 +1,83 @@
+import copy
+import random
+
+import numpy as np
+
+
+class FrozenPolicy:
+    """
+    Read-only greedy policy compiled from a trained ThiefAgent/GuardAgent.
+
+    Each known state key maps straight to the tuple of its greedy actions;
+    states with identical tie sets share one tuple, so the common single-
+    best-action case costs a dict lookup and no scan of the Q-values.
+    Unlike the agent, selecting an action never inserts rows: unseen states
+    get the fallback ('random' for a uniform action, which is what the
+    agent's all-zero new row amounts to, or a fixed action).
+
+    With tie_break='random' and the agent's epsilon, actions follow the same
+    distribution as agent.select_action (though not the same `random` draws:
+    single greedy actions skip random.choice). Draws come from the global
+    `random` unless rng, a random.Random, is set.
+    """
+    def __init__(self, encoder, action_space, lookup, epsilon=0.0, fallback='random', rng=None):
+        if fallback != 'random' and fallback not in action_space:
+            raise ValueError(f"fallback must be 'random' or an action, got {fallback!r}")
+        self.encoder = encoder
+        self.action_space = action_space
+        self.lookup = lookup
+        self.epsilon = epsilon
+        self.fallback = fallback
+        self.rng = random if rng is None else rng
+
+    @classmethod
+    def compile(cls, agent, epsilon=0.0, tie_break='random', fallback='random'):
+        """
+        Precompute the greedy action set of every state in agent's Q-table.
+        tie_break='first' keeps only the lowest tied action, making the
+        policy deterministic on known states.
+
+        Agents without a Q-table (linear agents) have nothing to compile
+        and never grow while acting, so they come back as a copy with the
+        given epsilon.
+        """
+        if tie_break not in ('random', 'first'):
+            raise ValueError(f"tie_break must be 'random' or 'first', got {tie_break!r}")
+        if getattr(agent, 'q_table', None) is None:
+            frozen = copy.copy(agent)
+            frozen.epsilon = epsilon
+            return frozen
+        keys, values = agent.q_table.sorted_arrays()
+        num_actions = values.shape[1]
+        best = values == values.max(axis=1, keepdims=True)
+        if tie_break == 'first':
+            best = np.arange(num_actions) == best.argmax(axis=1)[:, None]
+        masks = (best.astype(np.int64) << np.arange(num_actions)).sum(axis=1)
+        unique, inverse = np.unique(masks, return_inverse=True)
+        choices = [tuple(int(a) for a in np.nonzero((int(m) >> np.arange(num_actions)) & 1)[0])
+                   for m in unique]
+        lookup = dict(zip(keys.tolist(), [choices[i] for i in inverse.tolist()]))
+        return cls(agent.encoder, agent.action_space, lookup, epsilon, fallback)
+
+    def __len__(self):
+        return len(self.lookup)
+
+    def greedy_actions(self, state):
+        """
+        Tied greedy actions for state (a state tuple or its encoder key),
+        or None if the state is unseen.
+        """
+        return self.lookup.get(state if type(state) is int else self.encoder.encode(state))
+
+    def select_action(self, state):
+        actions = self.lookup.get(state if type(state) is int else self.encoder.encode(state))
+        rng = self.rng
+        if self.epsilon and rng.random() < self.epsilon:
+            return rng.choice(self.action_space)
+        if actions is None:
+            if self.fallback == 'random':
+                return rng.choice(self.action_space)
+            return self.fallback
+        if len(actions) == 1:
+            return actions[0]
+        return rng.choice(actions)
@@ -1,53 +1,84 @@
 import random
 import pickle
+
+import numpy as np
+
 from agents.base_agent import BaseAgent
+from agents.q_table import ArrayQTable, StateEncoder, convert_q_table
 
 class GuardAgent(BaseAgent):
     """
     Tabular Q-learning agent for the Guard in HeistEnv.
     Uses epsilon-greedy action selection and maintains a Q-table.
     """
-    def __init__(self, action_space, alpha=0.1, gamma=0.99, epsilon=0.1):
+    __slots__ = ('alpha', 'gamma', 'epsilon', 'encoder', 'q_table')
+    role = 'guard'
+
+    def __init__(self, action_space, alpha=0.1, gamma=0.99, epsilon=0.1, encoder=None):
         super().__init__(action_space)
         # Hyperparameters
         self.alpha = alpha      # learning rate
         self.gamma = gamma      # discount factor
         self.epsilon = epsilon  # exploration rate
-        # Q-table stored as a dict: {state: [Q(a0), Q(a1), ...]}
-        self.q_table = {}
+        # Q-table stored as a float32 matrix with one row per encoded state
+        self.encoder = encoder or StateEncoder()
+        self.q_table = ArrayQTable(len(action_space))
 
-    def _ensure_state(self, state):
+    def __setstate__(self, state):
         """
-        Ensure the state is in the Q-table.
+        Upgrade agents pickled with a dict Q-table to the array format.
         """
-        if state not in self.q_table:
-            self.q_table[state] = [0.0 for _ in range(len(self.action_space))]
+        super().__setstate__(state)
+        if 'encoder' not in state:
+            self.encoder = StateEncoder()
+        if isinstance(self.q_table, dict):
+            self.q_table = convert_q_table(self.q_table, self.encoder, len(self.action_space))
+
+    def _row(self, state):
+        """
+        Row of the state in the Q-table (allocated on first visit); state
+        may also be its encoder key (see HeistEnv.observe_keys).
+        """
+        key = state if type(state) is int else self.encoder.encode(state)
+        return self.q_table.row(key)
 
     def select_action(self, state):
         """
         Epsilon-greedy action selection.
         """
-        self._ensure_state(state)
+        row = self._row(state)
         # Explore
         if random.random() < self.epsilon:
             return random.choice(self.action_space)
         # Exploit
-        q_values = self.q_table[state]
-        max_q = max(q_values)
-        best_actions = [i for i, q in enumerate(q_values) if q == max_q]
-        return random.choice(best_actions)
+        q_values = self.q_table.values[row]
+        best_actions = (q_values == q_values.max()).nonzero()[0]
+        return int(random.choice(best_actions))
 
     def update(self, state, action, reward, next_state, done):
         """
-        Q-learning update for a single transition.
+        Q-learning update for a single transition; returns the TD error.
         """
-        self._ensure_state(state)
-        self._ensure_state(next_state)
-        q_current = self.q_table[state][action]
-        q_next_max = max(self.q_table[next_state]) if not done else 0.0
+        row = self._row(state)
+        next_row = self._row(next_state)
+        q = self.q_table.values
+        q_current = q[row, action]
+        q_next_max = q[next_row].max() if not done else 0.0
         td_target = reward + self.gamma * q_next_max
         td_delta = td_target - q_current
-        self.q_table[state][action] += self.alpha * td_delta
+        q[row, action] += self.alpha * td_delta
+        return td_delta
+
+    def update_batch(self, rows, actions, rewards, next_rows, dones):
+        """
+        Vectorised Q-learning update for a mini-batch given as Q-table rows
+        (see ReplayBuffer); returns the TD errors.
+        """
+        q = self.q_table.values
+        q_next_max = np.where(dones, 0.0, q[next_rows].max(axis=1))
+        td_delta = rewards + self.gamma * q_next_max - q[rows, actions]
+        np.add.at(q, (rows, actions), self.alpha * td_delta)
+        return td_delta
 
     def save_q_table(self, filepath):
         """
@@ -61,4 +92,7 @@ class GuardAgent(BaseAgent):
         Load Q-table from file.
         """
         with open(filepath, 'rb') as f:
-            self.q_table = pickle.load(f)
+            q_table = pickle.load(f)
+        if isinstance(q_table, dict):
+            q_table = convert_q_table(q_table, self.encoder, len(self.action_space))
+        self.q_table = q_table
@@ -0,0 +1,204 @@
+import random
+
+import numpy as np
+
+from agents.base_agent import BaseAgent
+from env.layouts import DEFAULT_LAYOUT
+from utils import get_path_table
+
+# (dx, dy) of actions 0-5; action 5 stays put (the guard places a trap)
+DELTAS = ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1), (0, 0))
+MAX_DISTANCE = 6  # distance tiles: 0, 1, ..., MAX_DISTANCE - 1, and "further"
+
+
+class TileFeatures:
+    """
+    Sparse binary features of (state, action) pairs for one layout.
+
+    Every action's features are one active tile in each of a few groups, so
+    Q(s, a) is the sum of one weight per group and the weight vector has a
+    fixed size independent of the layout and of how many states are seen.
+    Groups cross the action with the alarm flag and the agent's phase, and
+    encode BFS distances after the move (to the goal, to the opponent) with
+    their change (-1/0/+1), plus trap and alarm tiles underfoot. Distances
+    are tiled up to MAX_DISTANCE, so large layouts need no extra weights.
+    """
+    def __init__(self, layout=None, role='thief', num_actions=6):
+        self.layout = layout or DEFAULT_LAYOUT
+        self.role = role
+        self.num_actions = num_actions
+        H, W = self.layout.height, self.layout.width
+        self.width = W
+        self.num_cells = H * W
+        walls = self.layout.walls
+        self.next_cell = np.empty((self.num_cells, num_actions), dtype=np.int64)
+        for x in range(H):
+            for y in range(W):
+                for a, (dx, dy) in enumerate(DELTAS[:num_actions]):
+                    nx, ny = x + dx, y + dy
+                    valid = 0 <= nx < H and 0 <= ny < W and (nx, ny) not in walls
+                    self.next_cell[x * W + y, a] = nx * W + ny if valid else x * W + y
+        self.alarm_cells = np.zeros(self.num_cells, dtype=bool)
+        for x, y in self.layout.alarms:
+            self.alarm_cells[x * W + y] = True
+        D = MAX_DISTANCE + 1
+        A = num_actions
+        # [action x visible/phase x alarm] [goal d x delta x phase] [opponent d x delta] [hazards]
+        self.sizes = [A * 4, D * 3 * 2, (D + 1) * 3, 4 * A]
+        self.offsets = np.cumsum([0] + self.sizes[:-1])
+        self.num_features = sum(self.sizes)
+        self.actions = np.arange(A)
+        self._distances = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_distances'] = {}
+        return state
+
+    def _cell(self, pos):
+        return pos[0] * self.width + pos[1]
+
+    def distances(self, source):
+        """
+        BFS distance from source to every cell (num_cells where unreachable).
+        """
+        row = self._distances.get(source)
+        if row is None:
+            if len(self._distances) >= 4096:
+                self._distances.clear()
+            table = get_path_table(self.layout.walls, self.layout.width, self.layout.height)
+            row = np.full(self.num_cells, self.num_cells, dtype=np.int64)
+            for pos, d in table.distances(source).items():
+                row[self._cell(pos)] = d
+            self._distances[source] = row
+        return row
+
+    def active(self, state):
+        """
+        [num_actions, 4] indices of the active feature of each group.
+        """
+        me_pos, opponent_pos, gems, traps, alarm, exit_pos = self._view(state)
+        me = self._cell(me_pos)
+        nxt = self.next_cell[me]
+        D = MAX_DISTANCE
+        A = self.num_actions
+        alarm = int(alarm)
+
+        # goal: thief -> nearest gem (then the exit); guard -> the gem/exit
+        # the thief is heading for, approximated the same way from the guard
+        targets = gems or (exit_pos,)
+        rows = [self.distances(t) for t in targets]
+        goal = rows[int(np.argmin([r[me] for r in rows]))]
+        phase = 0 if gems else 1
+        d_goal = goal[nxt]
+        goal_tile = (np.minimum(d_goal, D) * 3 + np.sign(d_goal - goal[me]) + 1) * 2 + phase
+
+        if opponent_pos is None:
+            opp_tile = np.full(A, (D + 1) * 3)  # the extra "out of sight" tile
+            visible = 0
+        else:
+            opp = self.distances(opponent_pos)
+            d_opp = opp[nxt]
+            opp_tile = np.minimum(d_opp, D) * 3 + np.sign(d_opp - opp[me]) + 1
+            visible = 1
+        bias_tile = self.actions * 4 + (visible if self.role == 'guard' else phase) * 2 + alarm
+
+        trap_cells = [self._cell(t) for t in traps]
+        on_trap = np.isin(nxt, trap_cells) if trap_cells else np.zeros(A, dtype=bool)
+        if self.role == 'guard':
+            # the guard's own trap tile: a trap already there, or traps left to place
+            on_trap = on_trap | (self.actions == 5) & (len(traps) < self.layout.max_traps)
+        hazard_tile = self.actions * 4 + on_trap * 2 + self.alarm_cells[nxt]
+
+        return np.stack([bias_tile, goal_tile, opp_tile, hazard_tile], axis=1) + self.offsets
+
+    def _view(self, state):
+        thief_pos, guard_pos, gems, traps, alarm, exit_pos = state
+        if self.role == 'thief':
+            return thief_pos, guard_pos, gems, traps, alarm, exit_pos
+        return guard_pos, thief_pos, gems, traps, alarm, exit_pos
+
+
+class LinearQAgent(BaseAgent):
+    """
+    Semi-gradient Q-learning with a linear function of TileFeatures.
+
+    The weights are one float32 vector of fixed size, so memory does not
+    grow with the number of states visited, and similar situations share
+    weights. alpha is the step size of Q itself: it is split evenly across
+    the active features. Subclasses pick the role.
+    """
+    __slots__ = ('alpha', 'gamma', 'epsilon', 'features', 'weights', '_active', 'rng')
+
+    def __init__(self, action_space, layout=None, alpha=0.1, gamma=0.99, epsilon=0.1):
+        BaseAgent.__init__(self, action_space)
+        self.alpha = alpha
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.features = TileFeatures(layout, self.role, len(action_space))
+        self.weights = np.zeros(self.features.num_features, dtype=np.float32)
+        self._active = {}
+        # the global `random` unless replaced by a random.Random (see FrozenPolicy)
+        self.rng = random
+
+    def __setstate__(self, state):
+        BaseAgent.__setstate__(self, state)
+        self._active = {}
+        self.rng = random
+
+    def __getstate__(self):
+        state = BaseAgent.__getstate__(self)
+        state.pop('_active', None)
+        state.pop('rng', None)
+        return state
+
+    def _features(self, state):
+        # select_action, update and the next select_action see each state
+        # up to three times in a row, so keep the last few
+        active = self._active.get(state)
+        if active is None:
+            if len(self._active) >= 4:
+                self._active.clear()
+            active = self._active[state] = self.features.active(state)
+        return active
+
+    def q_values(self, state):
+        return self.weights[self._features(state)].sum(axis=1)
+
+    def select_action(self, state):
+        """
+        Epsilon-greedy action selection.
+        """
+        q_values = self.q_values(state)
+        if self.rng.random() < self.epsilon:
+            return self.rng.choice(self.action_space)
+        best_actions = (q_values == q_values.max()).nonzero()[0]
+        return int(self.rng.choice(best_actions))
+
+    def update(self, state, action, reward, next_state, done):
+        """
+        Semi-gradient Q-learning update; returns the TD error.
+        """
+        active = self._features(state)[action]
+        q_current = self.weights[active].sum()
+        q_next_max = self.q_values(next_state).max() if not done else 0.0
+        td_delta = reward + self.gamma * q_next_max - q_current
+        self.weights[active] += self.alpha / len(active) * td_delta
+        return td_delta
+
+
+class LinearThiefAgent(LinearQAgent):
+    """
+    Linear Q-learning thief.
+    """
+    __slots__ = ()
+    role = 'thief'
+
+
+class LinearGuardAgent(LinearQAgent):
+    """
+    Linear Q-learning guard working from the masked guard view (the thief
+    position is None when out of sight).
+    """
+    __slots__ = ()
+    role = 'guard'
@@ -0,0 +1,202 @@
+import os
+import json
+import struct
+
+import numpy as np
+
+from agents.q_table import ArrayQTable, StateEncoder
+
+FORMAT_NAME = 'heist-qtable'
+FORMAT_VERSION = 2  # v2 adds the sidecar 'dtype' (v1 files are float32)
+READ_VERSIONS = (1, 2)
+MAGIC = b'HEISTQT\x00'
+HEADER = struct.Struct('<8sIIQ')  # magic, version, num_actions, num_states
+ALIGN = 64
+EXTENSIONS = ('.qt', '.pkl')
+
+
+def sidecar_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def resolve_model_path(model_dir, stem):
+    """
+    Path of the saved model called stem, preferring the compact format
+    over a legacy pickle. Returns None if neither exists.
+    """
+    for ext in EXTENSIONS:
+        path = os.path.join(model_dir, stem + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+class MappedQTable:
+    """
+    Read-only Q-table backed by a memory-mapped .qt file.
+
+    Keys are stored sorted, so lookups are a binary search and nothing is
+    deserialized at load time; pages are shared between processes mapping
+    the same file. Unseen states resolve to a trailing all-zero row instead
+    of growing the table. Call to_array_table() to get a writable copy.
+    """
+    def __init__(self, path, num_states, num_actions, keys_offset, values_offset, dtype='float32'):
+        self.path = path
+        self.num_states = num_states
+        self.num_actions = num_actions
+        self.keys_offset = keys_offset
+        self.values_offset = values_offset
+        self.dtype = dtype
+        self._open()
+
+    def _open(self):
+        self.keys = np.memmap(self.path, dtype=np.int64, mode='r',
+                              offset=self.keys_offset, shape=(self.num_states,))
+        self._values = np.memmap(self.path, dtype=self.dtype, mode='r',
+                                 offset=self.values_offset,
+                                 shape=(self.num_states + 1, self.num_actions))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['keys'], state['_values']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def __len__(self):
+        return self.num_states
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    @property
+    def values(self):
+        return self._values
+
+    def _find(self, key):
+        i = int(np.searchsorted(self.keys, key))
+        if i < self.num_states and self.keys[i] == key:
+            return i
+        return None
+
+    def row(self, key):
+        i = self._find(key)
+        return self.num_states if i is None else i
+
+    def get(self, key, default=None):
+        i = self._find(key)
+        return default if i is None else self._values[i]
+
+    def items(self):
+        for i in range(self.num_states):
+            yield int(self.keys[i]), self._values[i]
+
+    def sorted_arrays(self):
+        return self.keys, self._values[:self.num_states]
+
+    def to_array_table(self):
+        table = ArrayQTable(self.num_actions, capacity=max(self.num_states, 1), dtype=self.dtype)
+        table.index = {int(k): i for i, k in enumerate(self.keys)}
+        table._values[:self.num_states] = self._values[:self.num_states]
+        return table
+
+
+def _agent_classes():
+    from agents.thief_agent import ThiefAgent
+    from agents.guard_agent import GuardAgent
+    return {cls.__name__: cls for cls in (ThiefAgent, GuardAgent)}
+
+
+def save_compact(agent, path, metadata=None):
+    """
+    Write agent as a .qt file (header, sorted int64 keys, float32 Q-values
+    plus one zero row) and a JSON sidecar with hyperparameters and metadata.
+    float16 tables (see compact_q_table) keep their dtype.
+    """
+    if getattr(agent, 'q_table', None) is None:
+        raise ValueError(f"{type(agent).__name__} has no Q-table; save it as .pkl")
+    keys, values = agent.q_table.sorted_arrays()
+    dtype = np.float16 if values.dtype == np.float16 else np.float32
+    num_states, num_actions = len(keys), len(agent.action_space)
+    keys_offset = _align(HEADER.size)
+    values_offset = _align(keys_offset + 8 * num_states)
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, num_actions, num_states))
+        f.seek(keys_offset)
+        f.write(np.ascontiguousarray(keys, dtype=np.int64).tobytes())
+        f.seek(values_offset)
+        f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        f.write(np.zeros(num_actions, dtype=dtype).tobytes())
+
+    encoder = agent.encoder
+    sidecar = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'agent_class': type(agent).__name__,
+        'action_space': list(agent.action_space),
+        'hyperparameters': {
+            'alpha': agent.alpha, 'gamma': agent.gamma, 'epsilon': agent.epsilon,
+        },
+        'encoder': {
+            'height': encoder.height, 'width': encoder.width,
+            'max_items': encoder.max_items,
+        },
+        'num_states': num_states,
+        'num_actions': num_actions,
+        'dtype': np.dtype(dtype).name,
+        'keys_offset': keys_offset,
+        'values_offset': values_offset,
+        'metadata': metadata or {},
+    }
+    with open(sidecar_path(path), 'w') as f:
+        json.dump(sidecar, f, indent=2, default=str)
+
+
+def _read_sidecar(path):
+    with open(sidecar_path(path)) as f:
+        sidecar = json.load(f)
+    if sidecar.get('format') != FORMAT_NAME or sidecar.get('version') not in READ_VERSIONS:
+        raise ValueError(f"{path}: unsupported model format "
+                         f"{sidecar.get('format')} v{sidecar.get('version')}")
+    return sidecar
+
+
+def compact_agent_class(path):
+    """
+    Agent class of a .qt model, read from its sidecar without opening the
+    Q-table.
+    """
+    name = _read_sidecar(path)['agent_class']
+    classes = _agent_classes()
+    if name not in classes:
+        raise ValueError(f"{path}: unknown agent class {name!r}")
+    return classes[name]
+
+
+def load_compact(path):
+    """
+    Open a .qt model lazily. Returns (agent, metadata); the agent's Q-table
+    is a MappedQTable.
+    """
+    sidecar = _read_sidecar(path)
+    with open(path, 'rb') as f:
+        magic, version, num_actions, num_states = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version not in READ_VERSIONS:
+        raise ValueError(f"{path}: not a version {'/'.join(map(str, READ_VERSIONS))} .qt file")
+
+    cls = _agent_classes()[sidecar['agent_class']]
+    agent = cls(sidecar['action_space'], encoder=StateEncoder(**sidecar['encoder']),
+                **sidecar['hyperparameters'])
+    agent.q_table = MappedQTable(path, num_states, num_actions, sidecar['keys_offset'],
+                                 sidecar['values_offset'], sidecar.get('dtype', 'float32'))
+    return agent, sidecar['metadata']
@@ -0,0 +1,162 @@
+import math
+from collections import deque
+
+import numpy as np
+
+
+class NStepQ:
+    """
+    n-step Q-learning on a tabular agent's Q-table.
+
+    Each (state, action) is updated once n rewards later toward
+    r_t + ... + gamma^(n-1) r_(t+n-1) + gamma^n max_a Q(s_(t+n), a), so a
+    terminal reward reaches n states back in one visit. Like the common
+    uncorrected variant, the intermediate actions are not importance-
+    weighted. update() returns the TD error of the transition it completed,
+    or None while the first n steps of an episode are pending.
+    """
+    def __init__(self, agent, n):
+        if n < 1:
+            raise ValueError(f"n must be at least 1, got {n}")
+        self.agent = agent
+        self.n = n
+        self.discounts = agent.gamma ** np.arange(n + 1)
+        self.pending = deque()  # (row, action) awaiting their n rewards
+        self.rewards = deque()
+        self.last_row = None
+
+    def _apply(self, bootstrap_row):
+        """
+        Update the oldest pending transition from the rewards collected
+        since, bootstrapping from bootstrap_row unless it is None.
+        """
+        row, action = self.pending.popleft()
+        k = len(self.rewards)
+        q = self.agent.q_table.values
+        target = float(np.dot(self.discounts[:k], self.rewards))
+        if bootstrap_row is not None:
+            target += self.discounts[k] * q[bootstrap_row].max()
+        td_delta = target - q[row, action]
+        q[row, action] += self.agent.alpha * td_delta
+        self.rewards.popleft()
+        return td_delta
+
+    def update(self, state, action, reward, next_state, done):
+        agent = self.agent
+        self.pending.append((agent._row(state), action))
+        self.rewards.append(reward)
+        next_row = agent._row(next_state)
+        td_delta = None
+        if done:
+            while self.pending:
+                td_delta = self._apply(None)
+            self.last_row = None
+        else:
+            if len(self.pending) == self.n:
+                td_delta = self._apply(next_row)
+            self.last_row = next_row
+        return td_delta
+
+    def end_episode(self):
+        """
+        Flush an episode cut off by max_steps: the remaining transitions
+        bootstrap from the last state reached.
+        """
+        while self.pending:
+            self._apply(self.last_row)
+        self.last_row = None
+
+
+class WatkinsQLambda:
+    """
+    Watkins's Q(lambda) with replacing eligibility traces on a tabular
+    agent's Q-table.
+
+    Only (row, action) cells visited since the last exploratory action are
+    traced, in small arrays rather than a trace per Q-table entry: with
+    replacing traces a cell's trace is (gamma * lambda) ** (steps since its
+    last visit), so the store keeps visit stamps and each update is one
+    vectorized add over the live cells. Cells older than the age at which
+    the trace falls below min_trace contribute nothing and are dropped when
+    the store fills (traces are capped at MAX_AGE steps). A non-greedy
+    action cuts all traces, as Watkins's method requires; lam=0 is one-step
+    Q-learning.
+    """
+    MAX_AGE = 4096
+
+    def __init__(self, agent, lam, min_trace=1e-3, capacity=256):
+        if not 0.0 <= lam <= 1.0:
+            raise ValueError(f"lambda must be in [0, 1], got {lam}")
+        self.agent = agent
+        self.lam = lam
+        decay = agent.gamma * lam
+        if decay <= min_trace:
+            max_age = 0
+        elif decay >= 1.0:
+            max_age = self.MAX_AGE
+        else:
+            max_age = min(int(math.log(min_trace) / math.log(decay)), self.MAX_AGE)
+        self.max_age = max_age
+        # trace by age, with a trailing zero for every age past max_age
+        self.powers = np.append(decay ** np.arange(max_age + 1), 0.0)
+        self.cells = np.empty(capacity, dtype=np.int64)
+        self.stamps = np.empty(capacity, dtype=np.int64)
+        self.slots = {}
+        self.size = 0
+        self.clock = 0
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        self.slots.clear()
+        self.size = 0
+
+    def _visit(self, cell):
+        slot = self.slots.get(cell)
+        if slot is None:
+            if self.size == len(self.cells):
+                self._compact()
+            slot = self.slots[cell] = self.size
+            self.cells[slot] = cell
+            self.size += 1
+        self.stamps[slot] = self.clock
+
+    def _compact(self):
+        """
+        Drop expired cells; grow the arrays if every traced cell is live.
+        """
+        n = self.size
+        live = np.nonzero(self.clock - self.stamps[:n] <= self.max_age)[0]
+        if len(live) > n // 2:
+            self.cells = np.resize(self.cells, 2 * len(self.cells))
+            self.stamps = np.resize(self.stamps, 2 * len(self.stamps))
+        k = len(live)
+        self.cells[:k] = self.cells[live]
+        self.stamps[:k] = self.stamps[live]
+        self.size = k
+        self.slots = dict(zip(self.cells[:k].tolist(), range(k)))
+
+    def update(self, state, action, reward, next_state, done):
+        agent = self.agent
+        row = agent._row(state)
+        next_row = agent._row(next_state)
+        q = agent.q_table.values
+        if self.size and q[row, action] < q[row].max():
+            # exploratory action: earlier cells no longer follow the greedy policy
+            self.clear()
+        self.clock += 1
+        self._visit(row * q.shape[1] + action)
+
+        q_next_max = q[next_row].max() if not done else 0.0
+        td_delta = reward + agent.gamma * q_next_max - q[row, action]
+        n = self.size
+        ages = np.minimum(self.clock - self.stamps[:n], len(self.powers) - 1)
+        flat = q.reshape(-1)
+        flat[self.cells[:n]] += agent.alpha * td_delta * self.powers[ages]
+        if done:
+            self.clear()
+        return td_delta
+
+    def end_episode(self):
+        self.clear()
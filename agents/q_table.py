@@ -0,0 +1,220 @@
+import numpy as np
+
+
+class StateEncoder:
+    """
+    Maps HeistEnv state tuples to compact integer keys and back.
+
+    Each tile is encoded as its cell index ``x * width + y``; ``None`` (the
+    guard's masked thief position) and gem/trap padding use the extra code
+    ``width * height``. The key is a mixed-radix number over
+    (thief, guard, gems, traps, alarm, exit).
+    """
+    def __init__(self, height=6, width=6, max_items=2):
+        self.height = height
+        self.width = width
+        self.max_items = max_items
+        self.num_cells = height * width
+        self.pos_radix = self.num_cells + 1
+
+    @classmethod
+    def for_env(cls, env):
+        """
+        Encoder for env's grid and item counts. Keys are stored as int64
+        (Q-table indices, checkpoints, .qt files, shared tables), so grids
+        whose key space does not fit are rejected.
+        """
+        encoder = cls(env.height, env.width, max(env.num_gems, env.max_traps))
+        if encoder.num_keys >= 2 ** 63:
+            raise ValueError(f"a {env.height}x{env.width} grid with {encoder.max_items} gems/traps "
+                             f"has {encoder.num_keys:.2e} state keys, too many for int64 keys")
+        return encoder
+
+    @property
+    def num_keys(self):
+        """
+        Size of the key space (upper bound on distinct states).
+        """
+        item_radix = self.pos_radix ** (2 * self.max_items)
+        return self.pos_radix ** 2 * item_radix * 2 * self.num_cells
+
+    def _cell(self, pos):
+        if pos is None:
+            return self.num_cells
+        return pos[0] * self.width + pos[1]
+
+    def _pos(self, cell):
+        if cell == self.num_cells:
+            return None
+        return (cell // self.width, cell % self.width)
+
+    def encode(self, state):
+        thief_pos, guard_pos, gems, traps, alarm, exit_pos = state
+        R = self.pos_radix
+        key = self._cell(thief_pos) * R + self._cell(guard_pos)
+        for items in (gems, traps):
+            if len(items) > self.max_items:
+                raise ValueError(f"at most {self.max_items} gems/traps can be encoded")
+            for tile in items:
+                key = key * R + tile[0] * self.width + tile[1]
+            for _ in range(self.max_items - len(items)):
+                key = key * R + self.num_cells
+        key = key * 2 + (1 if alarm else 0)
+        return key * self.num_cells + exit_pos[0] * self.width + exit_pos[1]
+
+    def decode(self, key):
+        R = self.pos_radix
+        key, exit_cell = divmod(key, self.num_cells)
+        key, alarm = divmod(key, 2)
+        groups = []
+        for _ in range(2):
+            cells = []
+            for _ in range(self.max_items):
+                key, cell = divmod(key, R)
+                cells.append(cell)
+            groups.append(tuple(self._pos(c) for c in reversed(cells) if c != self.num_cells))
+        traps, gems = groups
+        thief_cell, guard_cell = divmod(key, R)
+        return (self._pos(thief_cell), self._pos(guard_cell), gems, traps,
+                bool(alarm), self._pos(exit_cell))
+
+
+class ArrayQTable:
+    """
+    Q-table stored as a float32 matrix of shape [num_states, num_actions].
+
+    Integer state keys map to dense row indices; rows are allocated (zeroed)
+    on first use and the matrix grows by doubling. Compacted tables (see
+    compact_q_table) store float16 instead.
+    """
+    def __init__(self, num_actions, capacity=1024, dtype=np.float32):
+        self.num_actions = num_actions
+        self.index = {}
+        self._values = np.zeros((capacity, num_actions), dtype=dtype)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    @property
+    def values(self):
+        return self._values[:len(self.index)]
+
+    def row(self, key):
+        """
+        Row index for key, allocating a zero row if the key is new.
+        """
+        idx = self.index.get(key)
+        if idx is None:
+            idx = len(self.index)
+            if idx == len(self._values):
+                grown = np.zeros((2 * idx, self.num_actions), dtype=self._values.dtype)
+                grown[:idx] = self._values
+                self._values = grown
+            self.index[key] = idx
+        return idx
+
+    def get(self, key, default=None):
+        idx = self.index.get(key)
+        return default if idx is None else self._values[idx]
+
+    def keys(self):
+        return self.index.keys()
+
+    def items(self):
+        values = self._values
+        for key, idx in self.index.items():
+            yield key, values[idx]
+
+    def sorted_arrays(self):
+        """
+        (keys, values) with keys in ascending order, as stored on disk.
+        """
+        keys = np.fromiter(self.index.keys(), dtype=np.int64, count=len(self.index))
+        rows = np.fromiter(self.index.values(), dtype=np.int64, count=len(self.index))
+        order = np.argsort(keys)
+        return keys[order], self._values[rows[order]]
+
+    def __getstate__(self):
+        return {'num_actions': self.num_actions, 'index': self.index,
+                'values': self.values.copy()}
+
+    def __setstate__(self, state):
+        self.num_actions = state['num_actions']
+        self.index = state['index']
+        self._values = state['values']
+        if len(self._values) == 0:
+            self._values = np.zeros((1, self.num_actions), dtype=self._values.dtype)
+
+
+def convert_q_table(q_table, encoder, num_actions=None):
+    """
+    Migrate a legacy {state_tuple: [Q(a0), ...]} dict into an ArrayQTable.
+    """
+    if num_actions is None:
+        num_actions = len(next(iter(q_table.values()))) if q_table else 6
+    table = ArrayQTable(num_actions, capacity=max(len(q_table), 1))
+    for state, q_values in q_table.items():
+        table._values[table.row(encoder.encode(state))] = q_values
+    return table
+
+
+def compact_q_table(table, dtype=np.float16, min_abs=0.0):
+    """
+    Shrink a Q-table without changing its greedy policy where possible.
+
+    Rows whose largest |Q| is <= min_abs are dropped; with the default 0
+    these are exactly the all-zero rows allocated for states that were
+    only ever seen as next_state, which behave like unseen states anyway
+    (every action ties). The remaining values are cast to dtype. Rounding
+    can make a non-greedy action tie with or beat the greedy ones, so for
+    those rows the greedy actions are nudged one ulp above the runner-up,
+    which keeps every row's set of greedy actions intact.
+
+    Returns (ArrayQTable, report). report['at_risk'] bounds how many kept
+    rows rounding could affect (top-two gap within the rounding error),
+    'repaired' is how many it actually did, and 'pruned_changed' counts
+    dropped rows that had a strict greedy action (0 unless min_abs > 0).
+    """
+    keys, values = table.sorted_arrays()
+    values = np.asarray(values, dtype=np.float32)
+    dtype = np.dtype(dtype)
+    num_actions = values.shape[1]
+    peak = np.abs(values).max(axis=1) if len(values) else np.zeros(0, dtype=np.float32)
+    if len(values) and peak.max() > np.finfo(dtype).max:
+        raise ValueError(f"Q-values up to {peak.max():g} overflow {dtype.name}")
+    best = values == values.max(axis=1, keepdims=True)
+    keep = peak > min_abs
+    pruned_changed = int((~keep & ~best.all(axis=1)).sum())
+    keys, values, best = keys[keep], values[keep], best[keep]
+
+    q = values.astype(dtype)
+    error = np.abs(q.astype(np.float32) - values)
+    greedy = np.where(best, values, -np.inf).max(axis=1)
+    runner_up = np.where(best, -np.inf, values).max(axis=1)
+    at_risk = int((greedy - runner_up <= 2 * error.max(axis=1)).sum())
+    q_greedy = np.where(best, q, -np.inf).max(axis=1).astype(dtype)
+    q_runner_up = np.where(best, -np.inf, q).max(axis=1).astype(dtype)
+    changed = q_greedy <= q_runner_up
+    if changed.any():
+        nudged = np.nextafter(q_runner_up[changed], np.array(np.inf, dtype=dtype))
+        q[changed] = np.where(best[changed], nudged[:, None], q[changed])
+    shift = np.abs(q.astype(np.float32) - values)
+
+    compact = ArrayQTable(num_actions, capacity=max(len(keys), 1), dtype=dtype)
+    compact.index = dict(zip(keys.tolist(), range(len(keys))))
+    compact._values[:len(keys)] = q
+    report = {
+        'rows': len(keep),
+        'kept': len(keys),
+        'pruned': int((~keep).sum()),
+        'pruned_changed': pruned_changed,
+        'dtype': dtype.name,
+        'max_error': float(error.max()) if len(keys) else 0.0,
+        'at_risk': at_risk,
+        'repaired': int(changed.sum()),
+        'max_shift': float(shift.max()) if len(keys) else 0.0,
+    }
+    return compact, report
@@ -0,0 +1,50 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    Fixed-capacity ring buffer of transitions in preallocated NumPy arrays.
+
+    States are stored as Q-table row indices (ArrayQTable rows never move),
+    so a sampled batch can be applied directly with an agent's update_batch().
+    Once full, new transitions overwrite the oldest.
+    """
+    def __init__(self, capacity, seed=None):
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.count = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def push(self, state_row, action, reward, next_row, done):
+        i = self.count % self.capacity
+        self.states[i] = state_row
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_row
+        self.dones[i] = done
+        self.count += 1
+
+    def sample(self, batch_size):
+        """
+        Uniformly sampled (with replacement) batch of stored transitions.
+        """
+        idx = self.rng.integers(len(self), size=batch_size)
+        return (self.states[idx], self.actions[idx], self.rewards[idx],
+                self.next_states[idx], self.dones[idx])
+
+    def replay(self, agent, batch_size, num_batches=1):
+        """
+        Apply num_batches sampled mini-batches to agent; returns the mean
+        absolute TD error of the last batch.
+        """
+        td = None
+        for _ in range(num_batches):
+            td = agent.update_batch(*self.sample(batch_size))
+        return float(np.abs(td).mean()) if td is not None else None
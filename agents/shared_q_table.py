@@ -0,0 +1,119 @@
+import multiprocessing as mp
+
+import numpy as np
+
+from agents.q_table import ArrayQTable
+
+
+class SharedQTable:
+    """
+    Fixed-capacity Q-table in shared memory for parallel actors.
+
+    Keys live in an open-addressing hash table (linear probing, no deletion)
+    so a key's row never moves once inserted; each process caches the rows
+    it has resolved. Inserts are serialized by one lock and value updates are
+    guarded by striped locks chosen by row (see lock_for). Exposes the same
+    row()/values interface as ArrayQTable so ThiefAgent/GuardAgent can use it
+    unchanged.
+    """
+    def __init__(self, num_actions, capacity=2 ** 22, num_locks=64):
+        if capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self.num_actions = num_actions
+        self.capacity = capacity
+        self._raw_keys = mp.RawArray('q', capacity)
+        self._raw_values = mp.RawArray('f', capacity * num_actions)
+        self._size = mp.RawValue('q', 0)
+        self._insert_lock = mp.Lock()
+        self._locks = [mp.Lock() for _ in range(num_locks)]
+        self._attach()
+
+    def _attach(self):
+        self._keys = np.frombuffer(self._raw_keys, dtype=np.int64)
+        self._values = np.frombuffer(self._raw_values, dtype=np.float32).reshape(
+            self.capacity, self.num_actions)
+        self._mask = self.capacity - 1
+        self._rows = {}
+
+    def __getstate__(self):
+        # Only the shared buffers and locks travel to child processes.
+        state = self.__dict__.copy()
+        for name in ('_keys', '_values', '_mask', '_rows'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
+
+    def __len__(self):
+        return self._size.value
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    @property
+    def values(self):
+        return self._values
+
+    def lock_for(self, row):
+        return self._locks[row % len(self._locks)]
+
+    def _slot(self, key):
+        return ((key * 0x9E3779B97F4A7C15) >> 17) & self._mask
+
+    def _find(self, key):
+        stored = key + 1
+        i = self._slot(key)
+        while True:
+            k = self._keys[i]
+            if k == stored:
+                return i
+            if k == 0:
+                return None
+            i = (i + 1) & self._mask
+
+    def row(self, key):
+        """
+        Row index for key, inserting a zero row if the key is new.
+        """
+        idx = self._rows.get(key)
+        if idx is not None:
+            return idx
+        idx = self._find(key)
+        if idx is None:
+            with self._insert_lock:
+                # another process may have inserted the key meanwhile
+                stored = key + 1
+                idx = self._slot(key)
+                while self._keys[idx] != 0 and self._keys[idx] != stored:
+                    idx = (idx + 1) & self._mask
+                if self._keys[idx] == 0:
+                    if self._size.value >= self.capacity * 3 // 4:
+                        raise RuntimeError("SharedQTable is full; increase its capacity")
+                    self._values[idx] = 0.0
+                    self._keys[idx] = stored
+                    self._size.value += 1
+        self._rows[key] = idx
+        return idx
+
+    def items(self):
+        for i in np.flatnonzero(self._keys):
+            yield int(self._keys[i]) - 1, self._values[i]
+
+    def sorted_arrays(self):
+        occupied = np.flatnonzero(self._keys)
+        keys = self._keys[occupied] - 1
+        order = np.argsort(keys)
+        return keys[order], self._values[occupied[order]]
+
+    def to_array_table(self):
+        """
+        Copy the occupied rows into a regular ArrayQTable for saving.
+        """
+        occupied = np.flatnonzero(self._keys)
+        table = ArrayQTable(self.num_actions, capacity=max(len(occupied), 1))
+        for key in self._keys[occupied]:
+            table.row(int(key) - 1)
+        table._values[:len(occupied)] = self._values[occupied]
+        return table
@@ -0,0 +1,74 @@
+import os
+import random
+import tempfile
+
+import numpy as np
+
+from env.heist_env import HeistEnv
+from agents.thief_agent import ThiefAgent
+from agents.q_table import ArrayQTable
+from benchmarks.common import benchmark, rate
+
+_cache = {}
+
+
+def _big_agent(quick):
+    """
+    ThiefAgent whose Q-table holds `size` random states (built once per run).
+    """
+    size = 200000 if quick else 2000000
+    if size not in _cache:
+        agent = ThiefAgent(HeistEnv.ACTIONS, epsilon=0.0)
+        encoder = agent.encoder
+        rng = np.random.default_rng(0)
+        keys = np.unique(rng.integers(0, encoder.num_keys, size=size * 2))[:size]
+        rng.shuffle(keys)
+        # the benchmarked states must round-trip so lookups hit existing rows
+        states = [encoder.decode(int(k)) for k in keys[:10000]]
+        keys[:10000] = [encoder.encode(s) for s in states]
+        table = ArrayQTable(len(agent.action_space), capacity=size)
+        table.index = {int(k): i for i, k in enumerate(keys)}
+        table._values[:size] = rng.standard_normal((size, table.num_actions))
+        agent.q_table = table
+        _cache[size] = (agent, states)
+    return _cache[size]
+
+
+@benchmark('agent.select_action', 'calls/s')
+def select_action(quick):
+    agent, states = _big_agent(quick)
+
+    def run(n):
+        for i in range(n):
+            agent.select_action(states[i % len(states)])
+    return rate(run, 20000 if quick else 200000)
+
+
+@benchmark('agent.update', 'calls/s')
+def update(quick):
+    agent, states = _big_agent(quick)
+    random.seed(0)
+
+    def run(n):
+        for i in range(n):
+            agent.update(states[i % len(states)], i % 6, 0.1, states[(i + 1) % len(states)], False)
+    return rate(run, 20000 if quick else 200000)
+
+
+def _load_time(agent, ext):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'thief_agent' + ext)
+        agent.save(path)
+        return 1000.0 / rate(lambda n: ThiefAgent.load(path), 1)
+
+
+@benchmark('model.load.qt', 'ms', higher_is_better=False)
+def load_qt(quick):
+    agent, _ = _big_agent(quick)
+    return _load_time(agent, '.qt')
+
+
+@benchmark('model.load.pkl', 'ms', higher_is_better=False)
+def load_pkl(quick):
+    agent, _ = _big_agent(quick)
+    return _load_time(agent, '.pkl')
@@ -0,0 +1,149 @@
+import random
+
+import utils
+from env.heist_env import HeistEnv
+from env.vec_heist_env import VecHeistEnv
+from agents.q_table import StateEncoder
+from benchmarks.common import benchmark, rate, latency_us
+
+
+def _random_states(env, count):
+    """
+    Snapshot `count` mid-episode envs reached by random play.
+    """
+    random.seed(0)
+    snapshots = []
+    env.reset()
+    while len(snapshots) < count:
+        _, _, done, _ = env.step(random.randrange(6), random.randrange(5))
+        snapshots.append((env.thief_pos, set(env.gems), list(env.collected), env.exit, set(env.traps)))
+        if done:
+            env.reset()
+    return snapshots
+
+
+@benchmark('env.step', 'steps/s')
+def env_step(quick):
+    env = HeistEnv()
+    random.seed(0)
+    actions = [(random.randrange(6), random.randrange(6)) for _ in range(1000)]
+
+    def run(n):
+        env.reset()
+        for i in range(n):
+            a_thief, a_guard = actions[i % 1000]
+            _, _, done, _ = env.step(a_thief, a_guard)
+            if done:
+                env.reset()
+    return rate(run, 20000 if quick else 200000)
+
+
+@benchmark('env.reset', 'resets/s')
+def env_reset(quick):
+    env = HeistEnv()
+
+    def run(n):
+        for _ in range(n):
+            env.reset()
+    return rate(run, 20000 if quick else 200000)
+
+
+def _observation_run(observe):
+    """
+    Both agents' state keys for 2000 states reached by random play: each
+    state is set on one env, interned as step() would (_get_state), then
+    observe(env) builds the keys.
+    """
+    env = HeistEnv()
+    random.seed(0)
+    snapshots = []
+    env.reset()
+    while len(snapshots) < 2000:
+        _, _, done, _ = env.step(random.randrange(6), random.randrange(6))
+        snapshots.append((env.thief_pos, env.guard_pos, env.gem_bits, env.trap_bits,
+                          env.alarm_triggered, env.exit))
+        if done:
+            env.reset()
+
+    def run(n):
+        for i in range(n):
+            (env.thief_pos, env.guard_pos, env.gem_bits, env.trap_bits,
+             env.alarm_triggered, env.exit) = snapshots[i % 2000]
+            env._get_state()
+            observe(env)
+    return run
+
+
+@benchmark('env.observe+encode', 'us/call', higher_is_better=False)
+def observe_encode(quick):
+    encoder = StateEncoder()
+
+    def observe(env):
+        thief, guard = env.observe()
+        return encoder.encode(thief), encoder.encode(guard)
+    return latency_us(_observation_run(observe), 20000 if quick else 200000)
+
+
+@benchmark('env.observe_keys', 'us/call', higher_is_better=False)
+def observe_keys(quick):
+    encoder = StateEncoder()
+    return latency_us(_observation_run(lambda env: env.observe_keys(encoder)),
+                      20000 if quick else 200000)
+
+
+@benchmark('vec_env.step', 'steps/s')
+def vec_env_step(quick):
+    num_envs = 1024
+    env = VecHeistEnv(num_envs, max_steps=50, seed=0)
+
+    def run(n):
+        for _ in range(n // num_envs):
+            thief = env.rng.integers(6, size=num_envs)
+            guard = env.rng.integers(6, size=num_envs)
+            env.step(thief, guard)
+    return rate(run, num_envs * (50 if quick else 500))
+
+
+@benchmark('utils.astar', 'us/call', higher_is_better=False)
+def astar_latency(quick):
+    env = HeistEnv()
+    open_tiles = [(x, y) for x in range(env.height) for y in range(env.width)
+                  if (x, y) not in env.walls]
+    random.seed(0)
+    pairs = [tuple(random.sample(open_tiles, 2)) for _ in range(1000)]
+
+    def run(n):
+        for i in range(n):
+            start, goal = pairs[i % 1000]
+            utils.astar(start, goal, env.walls, env.width, env.height)
+    return latency_us(run, 5000 if quick else 50000)
+
+
+def _trap_tile_run(env, snapshots):
+    def run(n):
+        for i in range(n):
+            env.thief_pos, env.gems, env.collected, env.exit, env.traps = snapshots[i % len(snapshots)]
+            utils.compute_best_trap_tile(env)
+    return run
+
+
+@benchmark('utils.compute_best_trap_tile.cold', 'us/call', higher_is_better=False)
+def trap_tile_cold(quick):
+    env = HeistEnv()
+    snapshots = _random_states(env, 2000)
+    run = _trap_tile_run(env, snapshots)
+
+    def cold(n):
+        utils._best_trap_tile.cache_clear()
+        utils._path_table.cache_clear()
+        run(n)
+    return latency_us(cold, len(snapshots))
+
+
+@benchmark('utils.compute_best_trap_tile.warm', 'us/call', higher_is_better=False)
+def trap_tile_warm(quick):
+    env = HeistEnv()
+    snapshots = _random_states(env, 2000)
+    run = _trap_tile_run(env, snapshots)
+    run(len(snapshots))
+    return latency_us(run, 20000 if quick else 200000)
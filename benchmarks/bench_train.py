@@ -0,0 +1,16 @@
+import io
+import tempfile
+import contextlib
+
+import train
+from benchmarks.common import benchmark, rate
+
+
+@benchmark('train.episodes', 'episodes/s')
+def train_episodes(quick):
+    episodes = 500 if quick else 5000
+
+    def run(n):
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            train.train(train.parse_args(['--episodes', str(n), '--save_dir', tmp, '--seed', '0']))
+    return rate(run, episodes, repeat=1)
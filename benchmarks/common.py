@@ -0,0 +1,34 @@
+import time
+
+# name -> (function, unit, higher_is_better)
+BENCHMARKS = {}
+
+
+def benchmark(name, unit, higher_is_better=True):
+    """
+    Register a benchmark. The function takes a `quick` flag and returns a
+    single number in `unit`.
+    """
+    def register(fn):
+        BENCHMARKS[name] = (fn, unit, higher_is_better)
+        return fn
+    return register
+
+
+def rate(fn, n, repeat=3):
+    """
+    Best-of-`repeat` throughput of calling fn(n), which performs n operations.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(n)
+        best = min(best, time.perf_counter() - start)
+    return n / best
+
+
+def latency_us(fn, n, repeat=3):
+    """
+    Best-of-`repeat` mean latency in microseconds of one operation of fn(n).
+    """
+    return 1e6 / rate(fn, n, repeat)
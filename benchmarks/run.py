@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+import platform
+import subprocess
+
+from benchmarks.common import BENCHMARKS
+import benchmarks.bench_env  # noqa: F401  (registers benchmarks)
+import benchmarks.bench_agents  # noqa: F401
+import benchmarks.bench_train  # noqa: F401
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.jsonl')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run the HeistEnv benchmark suite or compare recorded runs."
+    )
+    parser.add_argument(
+        '--history', type=str, default=DEFAULT_HISTORY,
+        help='JSONL file that run appends to and compare reads from'
+    )
+    sub = parser.add_subparsers(dest='command')
+    run = sub.add_parser('run', help='Run benchmarks and append the results to the history')
+    run.add_argument(
+        '--only', type=str, default='*',
+        help="Glob over benchmark names, e.g. 'env.*'"
+    )
+    run.add_argument(
+        '--quick', action='store_true',
+        help='Smaller workloads for a fast smoke run'
+    )
+    run.add_argument(
+        '--label', type=str, default='',
+        help='Free-form label stored with the record'
+    )
+    compare = sub.add_parser('compare', help='Compare two recorded runs')
+    compare.add_argument(
+        '--baseline', type=int, default=-2,
+        help='History index of the baseline run (default: the one before the latest)'
+    )
+    compare.add_argument(
+        '--candidate', type=int, default=-1,
+        help='History index of the candidate run (default: the latest)'
+    )
+    compare.add_argument(
+        '--threshold', type=float, default=0.10,
+        help='Relative slowdown that counts as a regression (0.10 = 10%%)'
+    )
+    sub.add_parser('list', help='List available benchmarks')
+    args = parser.parse_args()
+    if args.command is None:
+        parser.error("choose a command: run, compare or list")
+    return args
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(pattern, quick):
+    results = {}
+    for name, (fn, unit, higher_is_better) in BENCHMARKS.items():
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        value = fn(quick)
+        results[name] = {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+        print(f"{name:<40} {value:>14.2f} {unit}")
+    return results
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(baseline, candidate, threshold):
+    """
+    Per-benchmark relative change (positive = faster) and the names that
+    regressed by more than threshold.
+    """
+    rows, regressions = [], []
+    for name, new in candidate['results'].items():
+        old = baseline['results'].get(name)
+        if old is None or old['value'] == 0:
+            continue
+        change = (new['value'] - old['value']) / old['value']
+        if not new['higher_is_better']:
+            change = -change
+        rows.append((name, old['value'], new['value'], new['unit'], change))
+        if change < -threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    args = parse_args()
+    if args.command == 'list':
+        for name, (_, unit, _) in BENCHMARKS.items():
+            print(f"{name:<40} {unit}")
+        return 0
+
+    if args.command == 'run':
+        results = run_benchmarks(args.only, args.quick)
+        record = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'label': args.label,
+            'quick': args.quick,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"Recorded {len(results)} results in {args.history}")
+        return 0
+
+    history = load_history(args.history)
+    try:
+        baseline, candidate = history[args.baseline], history[args.candidate]
+    except IndexError:
+        print(f"Need at least two runs in {args.history} to compare")
+        return 2
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"baseline  {baseline['timestamp']} {baseline.get('revision')}")
+    print(f"candidate {candidate['timestamp']} {candidate.get('revision')}")
+    for name, old, new, unit, change in rows:
+        flag = '  REGRESSION' if name in regressions else ''
+        print(f"{name:<40} {old:>12.2f} -> {new:>12.2f} {unit:<10} {change:+7.1%}{flag}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
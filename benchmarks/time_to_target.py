@@ -0,0 +1,175 @@
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+
+import train
+from env.observation import key_encoder
+from agents.frozen_policy import FrozenPolicy
+from evaluate import run_episodes
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Episodes and training seconds each update rule needs to reach a win rate "
+                    "against the random agent."
+    )
+    parser.add_argument(
+        '--methods', nargs='+', default=['one_step', 'n_step:4', 'lambda:0.8'],
+        help="Update rules: 'one_step', 'n_step:N', 'lambda:LAMBDA' (Watkins's Q(lambda)) "
+             "or 'dyna:K' (K prioritized-sweeping backups per real step)"
+    )
+    parser.add_argument(
+        '--role', choices=['thief', 'guard'], default='guard',
+        help='Role trained and evaluated; the opponent plays randomly in both'
+    )
+    parser.add_argument(
+        '--target', type=float, default=0.6,
+        help='Greedy win rate against the random agent that counts as reached'
+    )
+    parser.add_argument(
+        '--seeds', type=int, nargs='+', default=[0, 1, 2],
+        help='Training seeds per method'
+    )
+    parser.add_argument(
+        '--max_episodes', type=int, default=30000,
+        help='Training budget per run'
+    )
+    parser.add_argument(
+        '--eval_every', type=int, default=1000,
+        help='Training episodes between evaluations'
+    )
+    parser.add_argument(
+        '--eval_episodes', type=int, default=500,
+        help='Greedy episodes per evaluation (not timed)'
+    )
+    parser.add_argument(
+        '--max_steps', type=int, default=50,
+        help='Max steps per episode'
+    )
+    parser.add_argument(
+        '--layout', type=str, default='default',
+        help="Map layout: 'default', 'open:SIZE' or 'random:SIZE[:GEMS[:SEED]]'"
+    )
+    parser.add_argument(
+        '--out', type=str, default=None,
+        help='Also write per-run results to this JSON file'
+    )
+    return parser.parse_args()
+
+
+def method_flags(method):
+    name, _, value = method.partition(':')
+    if name == 'one_step':
+        return []
+    if name == 'n_step':
+        return ['--n_step', value]
+    if name == 'lambda':
+        return ['--q_lambda', value]
+    if name == 'dyna':
+        return ['--planning_steps', value]
+    raise SystemExit(f"unknown method {method!r}")
+
+
+def evaluate_greedy(env, agent, role, episodes, max_steps, seed):
+    """
+    Greedy win rate against the random agent on a fixed episode stream,
+    without disturbing the training run's random state.
+    """
+    state = random.getstate()
+    random.seed(seed)
+    policy = FrozenPolicy.compile(agent)
+    stats = run_episodes(env, policy, policy, role, episodes, max_steps)
+    random.setstate(state)
+    return stats[f'{role}_wins'] / episodes
+
+
+def time_to_target(method, args, seed):
+    """
+    Train role against the random agent with method until its greedy win
+    rate reaches args.target; returns (episodes, real env steps, training
+    seconds), with episodes None if the budget runs out. Evaluation is not
+    timed.
+    """
+    targs = train.parse_args(['--role', args.role, '--seed', str(seed), '--layout', args.layout,
+                              '--max_steps', str(args.max_steps)] + method_flags(method))
+    random.seed(seed)
+    env = train.make_env(targs)
+    eval_env = train.make_env(targs)
+    thief_agent, guard_agent = train.make_agents(targs, env)
+    agent = thief_agent if args.role == 'thief' else guard_agent
+    learner = train.make_learner(targs, agent)
+    opponent = train.make_random_agent(env.ACTIONS)
+    thief, guard = (agent, opponent) if args.role == 'thief' else (opponent, agent)
+    index = 0 if args.role == 'thief' else 1
+    encoder = key_encoder(env, (agent,))
+
+    elapsed = 0.0
+    real_steps = 0
+    for ep in range(1, args.max_episodes + 1):
+        start = time.perf_counter()
+        env.reset()
+        states = env.observe_keys(encoder) if encoder else env.observe()
+        done = False
+        step = 0
+        while not done and step < args.max_steps:
+            a_thief = thief.select_action(states[0])
+            a_guard = guard.select_action(states[1])
+            _, rewards, done, _ = env.step(a_thief, a_guard)
+            next_states = env.observe_keys(encoder) if encoder else env.observe()
+            learner.update(states[index], (a_thief, a_guard)[index], rewards[index],
+                           next_states[index], done)
+            states = next_states
+            step += 1
+        if hasattr(learner, 'end_episode'):
+            learner.end_episode()
+        elapsed += time.perf_counter() - start
+        real_steps += step
+        if ep % args.eval_every == 0:
+            rate = evaluate_greedy(eval_env, agent, args.role, args.eval_episodes, args.max_steps,
+                                   seed + 1_000_000)
+            if rate >= args.target:
+                return ep, real_steps, elapsed
+    return None, real_steps, elapsed
+
+
+def main():
+    args = parse_args()
+    runs = []
+    print(f"{args.role} to a {args.target:.0%} greedy win rate against the random agent "
+          f"(budget {args.max_episodes} episodes, evaluated every {args.eval_every})")
+    summary = {}
+    for method in args.methods:
+        results = []
+        for seed in args.seeds:
+            episodes, steps, seconds = time_to_target(method, args, seed)
+            results.append((episodes, steps, seconds))
+            runs.append({'method': method, 'seed': seed, 'episodes': episodes, 'real_steps': steps,
+                         'seconds': seconds})
+            reached = f"{episodes} episodes, {steps} real steps" if episodes else "not reached"
+            print(f"  {method:<12} seed {seed}: {reached} in {seconds:.1f}s")
+        reached = [r for r in results if r[0] is not None]
+        summary[method] = (len(reached),) + tuple(
+            statistics.median(r[i] for r in reached) if reached else None for i in range(3))
+
+    print(f"\n{'method':<12} {'reached':>8} {'episodes':>10} {'real steps':>11} {'seconds':>9} "
+          f"{'steps saved':>12} {'speedup':>8}")
+    _, _, base_steps, base_seconds = summary[args.methods[0]]
+    for method, (count, episodes, steps, seconds) in summary.items():
+        if episodes is None:
+            print(f"{method:<12} {count:>4}/{len(args.seeds):<3} {'-':>10} {'-':>11} {'-':>9} {'-':>12} {'-':>8}")
+            continue
+        saved = f"{1 - steps / base_steps:.0%}" if base_steps else '-'
+        speedup = f"{base_seconds / seconds:.2f}x" if base_seconds else '-'
+        print(f"{method:<12} {count:>4}/{len(args.seeds):<3} {episodes:>10.0f} {steps:>11.0f} "
+              f"{seconds:>9.1f} {saved:>12} {speedup:>8}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'config': vars(args), 'runs': runs}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import sys
+import random
+import argparse
+
+import numpy as np
+
+from env.heist_env import HeistEnv
+from env.vec_heist_env import VecHeistEnv
+from env.layouts import parse_layout
+from env.observation import split_state
+from agents.q_table import StateEncoder
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Consistency checks between the environment implementations; exits "
+                    "with status 1 on any mismatch."
+    )
+    parser.add_argument(
+        '--checks', nargs='+', choices=['vec', 'observe'], default=['vec', 'observe'],
+        help="'vec': VecHeistEnv against HeistEnv; 'observe': HeistEnv.observe() and "
+             "observe_keys() against split_state and StateEncoder.encode"
+    )
+    parser.add_argument(
+        '--layouts', nargs='+', default=['default', 'open:5', 'random:8:3:1', 'random:9:3:2'],
+        help='Layouts to check (the vec check skips layouts over 64 tiles)'
+    )
+    parser.add_argument(
+        '--betas', nargs='+', default=['0.05,0.15', '0.2,0.0', '0.0,0.4'],
+        help="Shaping weights to check, as 'BETA_T,BETA_G'"
+    )
+    parser.add_argument(
+        '--episodes', type=int, default=200,
+        help='Random-play episodes per layout and weight pair'
+    )
+    parser.add_argument(
+        '--max_steps', type=int, default=50,
+        help='Max steps per episode'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Random seed'
+    )
+    return parser.parse_args()
+
+
+def load_episode(vec, env):
+    """
+    Copy env's current episode into slot 0 of vec.
+    """
+    cell = vec._cell
+    vec.thief_pos[0] = cell(env.thief_pos)
+    vec.guard_pos[0] = cell(env.guard_pos)
+    vec.exit[0] = cell(env.exit)
+    vec.gems[0] = env.gem_bits
+    vec.initial_gems[0] = env.gem_bits | env._to_bits(env.collected)
+    vec.traps[0] = env.trap_bits
+    vec.trap_timers[0] = 0
+    for pos, ttl in env.trap_timers.items():
+        vec.trap_timers[0, cell(pos)] = ttl
+    vec.num_collected[0] = len(env.collected)
+    vec.alarm_triggered[0] = env.alarm_triggered
+    vec.alarm_timer[0] = env.alarm_timer
+    vec.guard_visited[0] = env.visited_bits
+    vec.last_guard_pos[0] = -1 if env.last_guard_pos is None else cell(env.last_guard_pos)
+    vec.guard_idle_steps[0] = env.guard_idle_steps
+    vec.global_step_count[0] = env.global_step_count
+
+
+def vec_state(vec, obs):
+    """
+    Slot 0 of a batched observation as a HeistEnv state tuple.
+    """
+    thief, guard, gems, traps, alarm, exit_cell = (x[0] for x in obs)
+    return (vec._pos(thief), vec._pos(guard), vec._mask_to_tiles(gems),
+            vec._mask_to_tiles(traps), bool(alarm), vec._pos(exit_cell))
+
+
+def check_vec_lockstep(layout, beta_t, beta_g, episodes, max_steps):
+    """
+    Step HeistEnv and a one-slot VecHeistEnv from the same state with the
+    same random actions and compare next state, rewards and termination.
+    Each step starts from HeistEnv's state, so one mismatch does not spread.
+    Steps on which the two envs relocated the exit to different corners
+    (each draws from its own generator) are skipped. Returns (mismatches,
+    steps compared).
+    """
+    env = HeistEnv(layout, beta_t, beta_g)
+    vec = VecHeistEnv(1, layout=layout, beta_t=beta_t, beta_g=beta_g,
+                      seed=random.randrange(2 ** 32))
+    mismatches = compared = 0
+    for _ in range(episodes):
+        env.reset()
+        for _ in range(max_steps):
+            load_episode(vec, env)
+            a_thief = random.randrange(6)
+            # trap placement (action 5) is weighted up so the trap logic gets exercised
+            a_guard = random.choices(env.ACTIONS, [1, 1, 1, 1, 1, 3])[0]
+            state, (r_thief, r_guard), done, _ = env.step(a_thief, a_guard)
+            _, (v_thief, v_guard), v_done, info = vec.step(np.array([a_thief]), np.array([a_guard]))
+            v_state = vec_state(vec, info['final_obs'])
+            if v_state[5] != state[5]:
+                if done:
+                    break
+                continue
+            compared += 1
+            if (abs(r_thief - v_thief[0]) > 1e-9 or abs(r_guard - v_guard[0]) > 1e-9
+                    or done != bool(v_done[0]) or v_state != state):
+                mismatches += 1
+                if mismatches <= 3:
+                    print(f"  mismatch: {state} {(r_thief, r_guard, done)} vs "
+                          f"{v_state} {(float(v_thief[0]), float(v_guard[0]), bool(v_done[0]))}")
+            if done:
+                break
+    return mismatches, compared
+
+
+def check_observations(layout, episodes, max_steps):
+    """
+    Play random episodes and compare HeistEnv.observe() with split_state of
+    the returned state, and observe_keys() with the encoder keys of those
+    views. Returns (mismatches, steps compared).
+    """
+    env = HeistEnv(layout)
+    encoder = StateEncoder.for_env(env)
+    mismatches = compared = 0
+    for _ in range(episodes):
+        state = env.reset()
+        for step in range(max_steps + 1):
+            views = env.observe()
+            keys = env.observe_keys(encoder)
+            compared += 1
+            if (views[0] is not state or views != split_state(state)
+                    or keys != tuple(encoder.encode(view) for view in views)):
+                mismatches += 1
+                if mismatches <= 3:
+                    print(f"  mismatch: {state} observed as {views}, keys {keys}")
+            if step == max_steps:
+                break
+            state, _, done, _ = env.step(random.randrange(6), random.randrange(6))
+            if done:
+                break
+    return mismatches, compared
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    failed = False
+    for spec in args.layouts:
+        layout = parse_layout(spec)
+        if 'observe' in args.checks:
+            mismatches, compared = check_observations(layout, args.episodes * 5, args.max_steps)
+            print(f"observe {spec}: {mismatches} mismatches in {compared} steps")
+            failed |= mismatches > 0
+        if 'vec' not in args.checks or layout.height * layout.width > 64:
+            continue
+        for betas in args.betas:
+            beta_t, beta_g = (float(b) for b in betas.split(','))
+            mismatches, compared = check_vec_lockstep(layout, beta_t, beta_g, args.episodes,
+                                                      args.max_steps)
+            print(f"vec lockstep {spec} beta_t={beta_t} beta_g={beta_g}: "
+                  f"{mismatches} mismatches in {compared} steps")
+            failed |= mismatches > 0
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import os
+import json
+import itertools
+import queue
+import random
+import threading
+
+import numpy as np
+
+from agents.q_table import ArrayQTable
+
+MANIFEST = 'manifest.json'
+
+
+def _atomic_json(path, obj):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def _snapshot_agent(agent):
+    """
+    Detached copy of agent whose Q-table (or weights) the training loop
+    can't mutate.
+    """
+    snapshot = object.__new__(type(agent))
+    snapshot.__setstate__(agent.__getstate__())
+    table = getattr(agent, 'q_table', None)
+    if table is None:
+        snapshot.weights = agent.weights.copy()
+        return snapshot
+    snapshot.q_table = ArrayQTable(table.num_actions, capacity=max(len(table), 1))
+    snapshot.q_table.index = dict(table.index)
+    snapshot.q_table._values[:len(table)] = table.values
+    return snapshot
+
+
+class CheckpointWriter(threading.Thread):
+    """
+    Background thread doing checkpoint I/O, so training only pays for
+    copying the changed rows. Jobs are callables; a full queue blocks the
+    producer until the disk catches up.
+    """
+    def __init__(self, max_pending=2):
+        super().__init__(daemon=True)
+        self.jobs = queue.Queue(max_pending)
+        self.error = None
+        self.start()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            try:
+                job()
+            except Exception as exc:  # surfaced to the training loop by submit()/close()
+                self.error = exc
+
+    def submit(self, job):
+        if self.error is not None:
+            raise RuntimeError("checkpoint writer failed") from self.error
+        self.jobs.put(job)
+
+    def close(self):
+        self.jobs.put(None)
+        self.join()
+        if self.error is not None:
+            raise RuntimeError("checkpoint writer failed") from self.error
+
+
+class Checkpointer:
+    """
+    Incremental checkpoints of the trained agents' Q-tables.
+
+    The first checkpoint (and every `full_every`-th after it) stores every
+    row as a new base (a linear agent's weight vector counts as rows keyed
+    by feature index); the others store only rows added or changed since the
+    previous checkpoint, found by diffing against a shadow copy of the
+    values. Each segment is one .npz per role; manifest.json lists the
+    segments to replay plus the episode and real-step counters and the
+    `random` state, and is replaced atomically after the segment files are
+    on disk.
+    """
+    def __init__(self, directory, agents, full_every=10, extra=None):
+        self.directory = directory
+        self.agents = agents
+        self.full_every = full_every
+        self.extra = extra or {}
+        os.makedirs(directory, exist_ok=True)
+        self.writer = CheckpointWriter()
+        self.segments = []
+        self.seq = 0
+        self.shadow = {}
+        self.keys = {}
+        self.best = {}
+
+    def resume_from(self, manifest):
+        """
+        Continue the segment chain of a checkpoint restored with restore().
+        """
+        self.segments = list(manifest['segments'])
+        self.seq = manifest['segments'][-1]['seq'] + 1 if manifest['segments'] else 0
+        self.best = dict(manifest.get('best', {}))
+        for role, agent in self.agents.items():
+            self.shadow[role] = _rows(agent).copy()
+
+    def _row_keys(self, role, table):
+        """
+        Key of every table row; rows are allocated in insertion order, so only
+        keys added since the last call need converting.
+        """
+        if table is None:
+            return np.arange(len(self.shadow[role]) if role in self.shadow else 0)
+        keys = self.keys.get(role, np.empty(0, dtype=np.int64))
+        new = len(table) - len(keys)
+        if new > 0:
+            tail = itertools.islice(table.index.keys(), len(keys), None)
+            keys = np.concatenate([keys, np.fromiter(tail, dtype=np.int64, count=new)])
+            self.keys[role] = keys
+        return keys
+
+    def _delta(self, role, agent, full):
+        table = getattr(agent, 'q_table', None)
+        values = _rows(agent)
+        shadow = self.shadow.get(role)
+        if full or shadow is None:
+            rows = np.arange(len(values))
+        else:
+            old = len(shadow)
+            changed = np.nonzero((values[:old] != shadow).any(axis=1))[0]
+            rows = np.concatenate([changed, np.arange(old, len(values))])
+        self.shadow[role] = values.copy()
+        keys = self._row_keys(role, table)[rows]
+        return keys, values[rows].copy()
+
+    def save(self, episode, real_steps=0):
+        full = not self.segments or len(self.segments) - 1 >= self.full_every
+        seq = self.seq
+        self.seq += 1
+        kind = 'base' if full else 'delta'
+        files, arrays = {}, {}
+        for role, agent in self.agents.items():
+            files[role] = f'{role}_{seq:06d}.npz'
+            arrays[role] = self._delta(role, agent, full)
+        segment = {'seq': seq, 'kind': kind, 'episode': episode, 'files': files,
+                   'rows': {role: len(keys) for role, (keys, _) in arrays.items()}}
+        self.segments = ([] if full else self.segments) + [segment]
+        manifest = {
+            'episode': episode,
+            'real_steps': real_steps,
+            'random_state': _state_to_json(random.getstate()),
+            'segments': list(self.segments),
+            'best': dict(self.best),
+        }
+        manifest.update(self.extra)
+        directory = self.directory
+
+        def write():
+            for role, (keys, values) in arrays.items():
+                np.savez(os.path.join(directory, files[role]), keys=keys, values=values)
+            _atomic_json(os.path.join(directory, MANIFEST), manifest)
+            if full:
+                _remove_stale(directory, {f for s in manifest['segments'] for f in s['files'].values()})
+        self.writer.submit(write)
+        return segment
+
+    def update_best(self, role, score, episode, path, real_steps=0):
+        """
+        Snapshot role's agent to path when score beats the best seen so far.
+        """
+        best = self.best.get(role)
+        if best is not None and score <= best['score']:
+            return False
+        self.best[role] = {'score': score, 'episode': episode, 'real_steps': real_steps,
+                           'path': path}
+        agent = _snapshot_agent(self.agents[role])
+        self.writer.submit(lambda: agent.save(path))
+        return True
+
+    def close(self):
+        self.writer.close()
+
+
+def _rows(agent):
+    """
+    The agent's learnt values as a [rows, columns] array view.
+    """
+    table = getattr(agent, 'q_table', None)
+    if table is None:
+        return agent.weights.reshape(len(agent.weights), -1)
+    return table.values
+
+
+def _state_to_json(state):
+    version, internal, gauss = state
+    return [version, list(internal), gauss]
+
+
+def _state_from_json(state):
+    version, internal, gauss = state
+    return (version, tuple(internal), gauss)
+
+
+def _remove_stale(directory, keep):
+    for name in os.listdir(directory):
+        if name.endswith('.npz') and name not in keep:
+            os.remove(os.path.join(directory, name))
+
+
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def restore(directory, agents):
+    """
+    Rebuild agents' Q-tables from the base and delta segments in directory
+    and restore the `random` state. Returns the manifest (its 'episode' is
+    the last completed episode), or None if there is no checkpoint. Replay
+    buffers and Dyna models are not checkpointed.
+    """
+    manifest = load_manifest(directory)
+    if manifest is None:
+        return None
+    for segment in manifest['segments']:
+        for role, name in segment['files'].items():
+            if role not in agents:
+                continue
+            with np.load(os.path.join(directory, name)) as data:
+                keys, values = data['keys'], data['values']
+            table = getattr(agents[role], 'q_table', None)
+            if table is None:
+                _rows(agents[role])[keys] = values
+                continue
+            rows = np.fromiter((table.row(int(k)) for k in keys), dtype=np.int64, count=len(keys))
+            table.values[rows] = values
+    random.setstate(_state_from_json(manifest['random_state']))
+    return manifest
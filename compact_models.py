@@ -0,0 +1,78 @@
+import os
+import glob
+import argparse
+
+from agents.agent_bundle import AgentBundle
+from agents.base_agent import BaseAgent
+from agents.q_table import compact_q_table
+from agents.model_format import sidecar_path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Prune and quantize saved agents' Q-tables, keeping their greedy policies."
+    )
+    parser.add_argument(
+        '--model_dir', type=str, default='models',
+        help='Directory containing the .pkl/.qt models to compact'
+    )
+    parser.add_argument(
+        '--out_dir', type=str, default=None,
+        help='Where to write compacted models (default: MODEL_DIR/compact)'
+    )
+    parser.add_argument(
+        '--dtype', choices=['float16', 'float32'], default='float16',
+        help='Storage type of the compacted Q-values'
+    )
+    parser.add_argument(
+        '--min_abs', type=float, default=0.0,
+        help="Drop rows whose largest |Q| is at most this; 0 drops only never-updated all-zero rows "
+             "(no policy change), larger values also drop barely-updated ones"
+    )
+    parser.add_argument(
+        '--format', choices=['qt', 'pkl'], default='qt',
+        help='Output format'
+    )
+    return parser.parse_args()
+
+
+def disk_size(path):
+    size = os.path.getsize(path)
+    if path.endswith('.qt'):
+        size += os.path.getsize(sidecar_path(path))
+    return size
+
+
+def main():
+    args = parse_args()
+    out_dir = args.out_dir or os.path.join(args.model_dir, 'compact')
+    os.makedirs(out_dir, exist_ok=True)
+    for src in sorted(glob.glob(os.path.join(args.model_dir, '*.pkl')) +
+                      glob.glob(os.path.join(args.model_dir, '*.qt'))):
+        try:
+            bundle = AgentBundle.load(src)
+        except Exception as e:
+            print(f"Skipped {src}: {e}")
+            continue
+        agent = bundle.get_agent()
+        if not isinstance(agent, BaseAgent) or not hasattr(agent, 'q_table'):
+            print(f"Skipped {src}: no Q-learning agent found")
+            continue
+        agent.q_table, report = compact_q_table(agent.q_table, args.dtype, args.min_abs)
+        metadata = dict(bundle.get_metadata() or {})
+        metadata['compaction'] = {'dtype': args.dtype, 'min_abs': args.min_abs, **report}
+
+        stem = os.path.splitext(os.path.basename(src))[0]
+        dst = os.path.join(out_dir, f'{stem}.{args.format}')
+        AgentBundle(agent, metadata).save(dst)
+        before, after = disk_size(src), disk_size(dst)
+        print(f"{src} -> {dst}: {report['kept']}/{report['rows']} rows kept, "
+              f"{before / 1e6:.2f} MB -> {after / 1e6:.2f} MB ({before / after:.1f}x)")
+        print(f"  {report['dtype']} max error {report['max_error']:.2e}; "
+              f"{report['at_risk']} rows within rounding of a greedy flip, {report['repaired']} repaired "
+              f"(max shift {report['max_shift']:.2e}); pruned rows with a greedy action: "
+              f"{report['pruned_changed']}")
+
+
+if __name__ == '__main__':
+    main()
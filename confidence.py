@@ -0,0 +1,65 @@
+import math
+from statistics import NormalDist
+
+
+def z_value(confidence):
+    """
+    Two-sided standard-normal quantile, e.g. 1.96 for 0.95.
+    """
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def wilson_interval(successes, n, z):
+    """
+    Wilson score interval for a binomial proportion; unlike the normal
+    approximation it stays inside [0, 1] and behaves for rates near 0.
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+class RunningStats:
+    """
+    Streaming mean and variance (Welford's algorithm).
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def push(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def var(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else float('inf')
+
+    def half_width(self, z):
+        """
+        Half-width of the normal confidence interval on the mean.
+        """
+        return z * math.sqrt(self.var / self.count) if self.count > 1 else float('inf')
+
+
+def difference_interval(a, b, z, paired=None):
+    """
+    Normal confidence interval on mean(a) - mean(b). With paired, a
+    RunningStats of per-episode differences under common random numbers,
+    the correlation between the two runs is taken into account.
+    """
+    diff = a.mean - b.mean
+    if paired is not None:
+        half = paired.half_width(z)
+    elif a.count > 1 and b.count > 1:
+        half = z * math.sqrt(a.var / a.count + b.var / b.count)
+    else:
+        half = float('inf')
+    return diff - half, diff + half
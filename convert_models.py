@@ -0,0 +1,60 @@
+import os
+import glob
+import argparse
+import pickle
+
+from agents.base_agent import BaseAgent
+from agents.model_format import save_compact
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Migrate legacy agent pickles to the array-backed Q-table or compact .qt format."
+    )
+    parser.add_argument(
+        '--model_dir', type=str, default='models',
+        help='Directory containing the .pkl models to convert'
+    )
+    parser.add_argument(
+        '--out_dir', type=str, default=None,
+        help='Where to write converted models (default: overwrite in place)'
+    )
+    parser.add_argument(
+        '--format', choices=['pkl', 'qt'], default='pkl',
+        help="'pkl' re-pickles with array Q-tables; 'qt' writes memory-mappable .qt + .json"
+    )
+    return parser.parse_args()
+
+
+def convert_file(src, dst, fmt='pkl'):
+    # Unpickling runs the agents' __setstate__, which converts dict Q-tables.
+    with open(src, 'rb') as f:
+        obj = pickle.load(f)
+    agent = obj.get('agent_state') if isinstance(obj, dict) else obj
+    if not isinstance(agent, BaseAgent):
+        return None
+    if fmt == 'qt':
+        metadata = obj.get('metadata') if isinstance(obj, dict) else None
+        save_compact(agent, dst, metadata)
+        return agent
+    with open(dst, 'wb') as f:
+        pickle.dump(obj, f)
+    return agent
+
+
+def main():
+    args = parse_args()
+    out_dir = args.out_dir or args.model_dir
+    os.makedirs(out_dir, exist_ok=True)
+    for src in sorted(glob.glob(os.path.join(args.model_dir, '*.pkl'))):
+        stem = os.path.splitext(os.path.basename(src))[0]
+        dst = os.path.join(out_dir, f'{stem}.{args.format}')
+        agent = convert_file(src, dst, args.format)
+        if agent is None:
+            print(f"Skipped {src}: no agent found")
+        else:
+            print(f"Converted {src} -> {dst} ({len(agent.q_table)} states)")
+
+
+if __name__ == '__main__':
+    main()
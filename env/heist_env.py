@@ -1,35 +1,127 @@
 import random
 
+from env.layouts import DEFAULT_LAYOUT
+from env.observation import guard_sees
+
+# Interning pools shared by every env of the same grid width in a process:
+# one (x, y) tuple per cell, one tile tuple per gem/trap bitboard, and one
+# (state, guard view) pair per distinct state. Each of the last two is
+# cleared when it fills up.
+_POOLS = {}
+TILE_POOL_SIZE = 1 << 16
+STATE_POOL_SIZE = 1 << 18
+
+
+def _pools(height, width):
+    pools = _POOLS.get((height, width))
+    if pools is None:
+        cells = tuple((x, y) for x in range(height) for y in range(width))
+        pools = _POOLS[(height, width)] = (cells, {0: ()}, {})
+    return pools
+
+
 class HeistEnv:
     ACTIONS = list(range(6))
 
-    def __init__(self):
-        self.height, self.width = 6, 6
-        self._corners = [(0, 0), (0, 5), (5, 0), (5, 5)]
-        self.walls = {(1, 2), (2, 3), (3, 1), (4, 4)}
-        self.alarms = {(2, 2), (3, 3)}
+    def __init__(self, layout=None, beta_t=0.05, beta_g=0.15, rng=None):
+        self.layout = layout or DEFAULT_LAYOUT
+        # source of exits and gem tiles: the global `random` unless a
+        # random.Random is given (the env server seeds one per session)
+        self.rng = random if rng is None else rng
+        # potential-based shaping weights (thief toward its goal, guard toward the thief)
+        self.beta_t = beta_t
+        self.beta_g = beta_g
+        self.height, self.width = self.layout.height, self.layout.width
+        self._corners = list(self.layout.exits)
+        self.walls = set(self.layout.walls)
+        self.alarms = set(self.layout.alarms)
+        self.num_gems = self.layout.num_gems
+        self.max_traps = self.layout.max_traps
+        # Bitboards: tile (x, y) is bit x * width + y
+        self.wall_bits = self._to_bits(self.walls)
+        self.alarm_bits = self._to_bits(self.alarms)
         self.TRAP_TTL = 10
         self.EXIT_CHANGE_INTERVAL = 20
+        self._cells, self._tile_pool, self._state_pool = _pools(self.height, self.width)
+        self._corners = [self._cell(c) for c in self._corners]
         self.reset()
 
+    def _cell(self, pos):
+        return self._cells[pos[0] * self.width + pos[1]]
+
+    def _to_bits(self, tiles):
+        bits = 0
+        for x, y in tiles:
+            bits |= 1 << (x * self.width + y)
+        return bits
+
+    def _from_bits(self, bits):
+        """
+        Tiles of a bitboard in (x, y) order; the tuple is built once per
+        distinct bitboard and shared from then on.
+        """
+        tiles = self._tile_pool.get(bits)
+        if tiles is None:
+            cells = self._cells
+            tiles = []
+            rest = bits
+            while rest:
+                low = rest & -rest
+                tiles.append(cells[low.bit_length() - 1])
+                rest ^= low
+            pool = self._tile_pool
+            if len(pool) >= TILE_POOL_SIZE:
+                pool.clear()
+                pool[0] = ()
+            tiles = pool[bits] = tuple(tiles)
+        return tiles
+
+    @property
+    def gems(self):
+        return self._from_bits(self.gem_bits)
+
+    @gems.setter
+    def gems(self, tiles):
+        self.gem_bits = self._to_bits(tiles)
+
+    @property
+    def traps(self):
+        return self._from_bits(self.trap_bits)
+
+    @traps.setter
+    def traps(self, tiles):
+        self.trap_bits = self._to_bits(tiles)
+
+    @property
+    def guard_visited(self):
+        # visited bitboards rarely repeat, so don't grow the tile pool with them
+        cells = self._cells
+        tiles = set()
+        bits = self.visited_bits
+        while bits:
+            low = bits & -bits
+            tiles.add(cells[low.bit_length() - 1])
+            bits ^= low
+        return tiles
+
     def reset(self):
         self.global_step_count = 0
         # Agent start positions
-        self.thief_pos = (0, 0)
-        self.guard_pos = (5, 5)
-        possible_exits = [c for c in self._corners if c not in [(0, 0), (5, 5)]]
-        self.exit = random.choice(possible_exits)
-        forbidden = set(self.walls) | set(self.alarms) | {(0, 0), (5, 5), self.exit}
+        self.thief_pos = self._cell(self.layout.thief_start)
+        self.guard_pos = self._cell(self.layout.guard_start)
+        possible_exits = [c for c in self._corners if c not in [self.thief_pos, self.guard_pos]]
+        self.exit = self.rng.choice(possible_exits)
+        forbidden = set(self.walls) | set(self.alarms) | {self.thief_pos, self.guard_pos, self.exit}
         empties = [(x, y) for x in range(self.height) for y in range(self.width)
                    if (x, y) not in forbidden]
-        self.gems = set(random.sample(empties, 2))
-        self.traps = set()
+        self.gem_bits = self._to_bits(self.rng.sample(empties, self.num_gems))
+        self.trap_bits = 0
         self.trap_timers = {}
         self.collected = []
         self.alarm_triggered = False
         self.alarm_timer = 0
         self.done = False
-        self.guard_visited = {self.guard_pos}
+        self.visited_bits = self._to_bits([self.guard_pos])
         self.last_guard_pos = None
         self.guard_idle_steps = 0
         return self._get_state()
@@ -40,39 +132,38 @@ class HeistEnv:
         self.global_step_count += 1
         if self.global_step_count % self.EXIT_CHANGE_INTERVAL == 0:
             candidates = [c for c in self._corners if c != self.exit]
-            self.exit = random.choice(candidates)
+            self.exit = self.rng.choice(candidates)
         r_thief, r_guard = 0.0, 0.0
         old_thief = self.thief_pos
         old_guard = self.guard_pos
+        width = self.width
         for pos in list(self.trap_timers):
             self.trap_timers[pos] -= 1
             if self.trap_timers[pos] <= 0:
                 del self.trap_timers[pos]
-                if pos in self.traps:
-                    self.traps.remove(pos)
+                self.trap_bits &= ~(1 << (pos[0] * width + pos[1]))
                 r_guard -= 0.5
         self._apply_action('thief', thief_action)
         if self.thief_pos == old_thief:
             r_thief -= 0.1
         from utils import manhattan_distance
-        if self.gems:
+        if self.gem_bits:
             goal = min(self.gems, key=lambda g: manhattan_distance(old_thief, g))
         else:
             goal = self.exit
         d_old = manhattan_distance(old_thief, goal)
         d_new = manhattan_distance(self.thief_pos, goal)
-        beta_t = 0.05
-        r_thief += beta_t * (d_old - d_new)
+        r_thief += self.beta_t * (d_old - d_new)
         self._apply_action('guard', guard_action)
-        if self.guard_pos == old_guard and self.guard_pos in self.gems:
+        guard_bit = 1 << (self.guard_pos[0] * width + self.guard_pos[1])
+        if self.guard_pos == old_guard and self.gem_bits & guard_bit:
             r_guard -= 0.2
         d_old_g = manhattan_distance(old_guard, self.thief_pos)
         d_new_g = manhattan_distance(self.guard_pos, self.thief_pos)
-        beta_g = 0.15
-        r_guard += beta_g * (d_old_g - d_new_g)
-        if self.guard_pos not in self.guard_visited:
+        r_guard += self.beta_g * (d_old_g - d_new_g)
+        if not self.visited_bits & guard_bit:
             r_guard += 0.1
-            self.guard_visited.add(self.guard_pos)
+            self.visited_bits |= guard_bit
         if self.last_guard_pos == self.guard_pos:
             self.guard_idle_steps += 1
         else:
@@ -80,17 +171,18 @@ class HeistEnv:
         self.last_guard_pos = self.guard_pos
         if self.guard_idle_steps > 3:
             r_guard -= 0.1
-        if self.thief_pos in self.alarms:
+        thief_bit = 1 << (self.thief_pos[0] * width + self.thief_pos[1])
+        if self.alarm_bits & thief_bit:
             self.alarm_triggered = True
             self.alarm_timer = 3
             r_thief -= 1.0
             r_guard += 1.0
-        if self.thief_pos in self.gems:
-            self.gems.remove(self.thief_pos)
+        if self.gem_bits & thief_bit:
+            self.gem_bits ^= thief_bit
             self.collected.append(self.thief_pos)
             r_thief += 1.0
-        if self.thief_pos in self.traps:
-            self.traps.remove(self.thief_pos)
+        if self.trap_bits & thief_bit:
+            self.trap_bits ^= thief_bit
             if self.thief_pos in self.trap_timers:
                 del self.trap_timers[self.thief_pos]
             r_thief -= 2.0
@@ -101,7 +193,7 @@ class HeistEnv:
             r_guard += 5.0
             self.done = True
             result = 'guard'
-        elif len(self.collected) == 2 and self.thief_pos == self.exit:
+        elif len(self.collected) == self.num_gems and self.thief_pos == self.exit:
             r_thief += 5.0
             r_guard -= 5.0
             self.done = True
@@ -122,37 +214,95 @@ class HeistEnv:
             dx, dy = deltas.get(action, (0, 0))
             new_pos = (self.thief_pos[0] + dx, self.thief_pos[1] + dy)
             if self._is_valid(new_pos):
-                self.thief_pos = new_pos
+                self.thief_pos = self._cell(new_pos)
         else:
             if action == 5:
-                if len(self.traps) < 2:
+                if len(self.trap_timers) < self.max_traps:
                     from utils import compute_best_trap_tile
                     target = compute_best_trap_tile(self) or self.guard_pos
-                    self.traps.add(target)
+                    self.trap_bits |= 1 << (target[0] * self.width + target[1])
                     self.trap_timers[target] = self.TRAP_TTL
                 return
             dx, dy = deltas.get(action, (0, 0))
             new_pos = (self.guard_pos[0] + dx, self.guard_pos[1] + dy)
             if self._is_valid(new_pos):
-                self.guard_pos = new_pos
+                self.guard_pos = self._cell(new_pos)
 
     def _is_valid(self, pos):
         x, y = pos
         if not (0 <= x < self.height and 0 <= y < self.width):
             return False
-        if pos in self.walls:
+        if self.wall_bits >> (x * self.width + y) & 1:
             return False
         return True
 
     def _get_state(self):
-        return (
-            self.thief_pos,
-            self.guard_pos,
-            tuple(sorted(self.gems)),
-            tuple(sorted(self.traps)),
-            self.alarm_triggered,
-            self.exit,
-        )
+        # bitboard iteration yields tiles in (x, y) order, i.e. already sorted;
+        # positions and tile tuples are interned, so a repeated state is
+        # returned as the same object, and its guard view is built only once
+        thief_pos = self.thief_pos
+        guard_pos = self.guard_pos
+        gems = self._from_bits(self.gem_bits)
+        traps = self._from_bits(self.trap_bits)
+        alarm = self.alarm_triggered
+        state = (thief_pos, guard_pos, gems, traps, alarm, self.exit)
+        pool = self._state_pool
+        views = pool.get(state)
+        if views is None:
+            if len(pool) >= STATE_POOL_SIZE:
+                pool.clear()
+            if guard_sees(thief_pos, guard_pos, alarm):
+                views = (state, state)
+            else:
+                views = (state, (None, guard_pos, gems, traps, alarm, self.exit))
+            pool[state] = views
+        self._views = views
+        return views[0]
+
+    def observe(self):
+        """
+        (thief observation, guard observation) of the current state: the
+        full state tuple and the guard's view of it, in which the thief's
+        position is None unless the alarm is on or the thief is within
+        GUARD_SIGHT of the guard. Both are interned like the state returned
+        by reset() and step().
+        """
+        return self._views
+
+    def observe_keys(self, encoder):
+        """
+        StateEncoder keys of observe(), computed straight from the
+        bitboards: the same integers as encoder.encode() of each view.
+        """
+        if encoder.width != self.width or encoder.num_cells != self.height * self.width:
+            raise ValueError(f"encoder is for a {encoder.height}x{encoder.width} grid, "
+                             f"env is {self.height}x{self.width}")
+        width = self.width
+        num_cells = encoder.num_cells
+        R = encoder.pos_radix
+        max_items = encoder.max_items
+        items = 0
+        for bits in (self.gem_bits, self.trap_bits):
+            count = 0
+            while bits:
+                low = bits & -bits
+                items = items * R + low.bit_length() - 1
+                bits ^= low
+                count += 1
+            if count > max_items:
+                raise ValueError(f"at most {max_items} gems/traps can be encoded")
+            for _ in range(max_items - count):
+                items = items * R + num_cells
+        thief_pos = self.thief_pos
+        guard_pos = self.guard_pos
+        guard_cell = guard_pos[0] * width + guard_pos[1]
+        alarm = self.alarm_triggered
+        tail = (items * 2 + (1 if alarm else 0)) * num_cells + self.exit[0] * width + self.exit[1]
+        scale = R ** (2 * max_items) * 2 * num_cells
+        thief_key = ((thief_pos[0] * width + thief_pos[1]) * R + guard_cell) * scale + tail
+        if guard_sees(thief_pos, guard_pos, alarm):
+            return thief_key, thief_key
+        return thief_key, (num_cells * R + guard_cell) * scale + tail
 
     def render_ascii(self):
         grid = [['.' for _ in range(self.width)] for _ in range(self.height)]
@@ -0,0 +1,98 @@
+import random
+from collections import deque
+
+
+class Layout:
+    """
+    Static description of a heist map: grid size, walls, alarms, candidate
+    exits, start tiles and how many gems/traps an episode uses.
+    """
+    def __init__(self, height, width, walls=(), alarms=(), exits=None,
+                 thief_start=(0, 0), guard_start=None, num_gems=2, max_traps=2):
+        self.height = height
+        self.width = width
+        self.walls = frozenset(walls)
+        self.alarms = frozenset(alarms)
+        corners = [(0, 0), (0, width - 1), (height - 1, 0), (height - 1, width - 1)]
+        self.exits = list(exits) if exits is not None else corners
+        self.thief_start = thief_start
+        self.guard_start = guard_start if guard_start is not None else (height - 1, width - 1)
+        self.num_gems = num_gems
+        self.max_traps = max_traps
+        self._validate()
+
+    def _validate(self):
+        reserved = {self.thief_start, self.guard_start} | set(self.exits)
+        for pos in reserved | self.alarms:
+            x, y = pos
+            if not (0 <= x < self.height and 0 <= y < self.width) or pos in self.walls:
+                raise ValueError(f"tile {pos} must be inside the grid and not a wall")
+        if not [e for e in self.exits if e not in (self.thief_start, self.guard_start)]:
+            raise ValueError("layout needs an exit other than the start tiles")
+        free = self.height * self.width - len(self.walls | self.alarms | reserved)
+        if free < self.num_gems:
+            raise ValueError("not enough free tiles for the requested number of gems")
+
+    def __repr__(self):
+        return (f"Layout({self.height}x{self.width}, walls={len(self.walls)}, "
+                f"alarms={len(self.alarms)}, gems={self.num_gems}, traps={self.max_traps})")
+
+    @classmethod
+    def random(cls, size, wall_density=0.15, num_alarms=None, num_gems=2, max_traps=2, seed=None):
+        """
+        Random size x size map whose open tiles are all connected; exits are
+        the four corners, as in the default layout.
+        """
+        rng = random.Random(seed)
+        corners = {(0, 0), (0, size - 1), (size - 1, 0), (size - 1, size - 1)}
+        tiles = [(x, y) for x in range(size) for y in range(size) if (x, y) not in corners]
+        walls = set()
+        for tile in rng.sample(tiles, int(wall_density * len(tiles))):
+            walls.add(tile)
+            if not _connected(size, size, walls):
+                walls.discard(tile)
+        if num_alarms is None:
+            num_alarms = max(2, size * size // 18)
+        open_tiles = [t for t in tiles if t not in walls]
+        alarms = rng.sample(open_tiles, num_alarms)
+        return cls(size, size, walls, alarms, num_gems=num_gems, max_traps=max_traps)
+
+
+def _connected(height, width, walls):
+    open_tiles = [(x, y) for x in range(height) for y in range(width) if (x, y) not in walls]
+    seen = {open_tiles[0]}
+    queue = deque([open_tiles[0]])
+    while queue:
+        x, y = queue.popleft()
+        for nxt in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if (0 <= nxt[0] < height and 0 <= nxt[1] < width
+                    and nxt not in walls and nxt not in seen):
+                seen.add(nxt)
+                queue.append(nxt)
+    return len(seen) == len(open_tiles)
+
+
+DEFAULT_LAYOUT = Layout(
+    6, 6,
+    walls={(1, 2), (2, 3), (3, 1), (4, 4)},
+    alarms={(2, 2), (3, 3)},
+)
+
+
+def parse_layout(spec):
+    """
+    Layout from a command-line spec: 'default', 'open:SIZE' or
+    'random:SIZE[:GEMS[:SEED]]'.
+    """
+    parts = spec.split(':')
+    kind = parts[0]
+    if kind == 'default':
+        return DEFAULT_LAYOUT
+    if kind == 'open' and len(parts) == 2:
+        return Layout(int(parts[1]), int(parts[1]))
+    if kind == 'random' and 2 <= len(parts) <= 4:
+        size = int(parts[1])
+        num_gems = int(parts[2]) if len(parts) > 2 else 2
+        seed = int(parts[3]) if len(parts) > 3 else 0
+        return Layout.random(size, num_gems=num_gems, seed=seed)
+    raise ValueError(f"unknown layout spec '{spec}'")
@@ -0,0 +1,73 @@
+# What each agent observes of a HeistEnv state tuple. The thief sees the
+# full state; the guard sees the thief only while the alarm is on or the
+# thief is within GUARD_SIGHT (Manhattan distance), otherwise its thief
+# position is None. HeistEnv.observe() builds both views in one pass (and
+# observe_keys() their StateEncoder keys); the functions below apply the
+# same rule to state tuples from elsewhere.
+GUARD_SIGHT = 2
+
+
+def guard_sees(thief_pos, guard_pos, alarm):
+    return alarm or abs(thief_pos[0] - guard_pos[0]) + abs(thief_pos[1] - guard_pos[1]) <= GUARD_SIGHT
+
+
+def mask_guard_state(tuple_state):
+    """
+    The guard's view of a full state tuple (the tuple itself when the
+    thief is in sight).
+    """
+    thief_pos, guard_pos, gems, traps, alarm, exit_pos = tuple_state
+    if guard_sees(thief_pos, guard_pos, alarm):
+        return tuple_state
+    return (None, guard_pos, gems, traps, alarm, exit_pos)
+
+
+def split_state(global_state):
+    """
+    (thief observation, guard observation) of an observation that is either
+    a full state tuple or a {'thief': ..., 'guard': ...} dict.
+    """
+    if isinstance(global_state, dict):
+        return global_state['thief'], global_state['guard']
+    return global_state, mask_guard_state(global_state)
+
+
+def check_geometry(agent, grid):
+    """
+    Raise ValueError unless agent, if it encodes states (tabular agents,
+    frozen policies) or computes features (linear agents), was built for
+    the grid and gem/trap counts of grid (a Layout or a HeistEnv). A
+    mismatched encoder would map distinct states onto the same keys.
+    """
+    items = max(grid.num_gems, grid.max_traps)
+    encoder = getattr(agent, 'encoder', None)
+    features = getattr(agent, 'features', None)
+    if encoder is not None:
+        shape, fits = (encoder.height, encoder.width), encoder.max_items >= items
+    elif features is not None:
+        layout = features.layout
+        shape, fits = (layout.height, layout.width), True
+    else:
+        return
+    if shape != (grid.height, grid.width) or not fits:
+        raise ValueError(f"{type(agent).__name__} was built for a {shape[0]}x{shape[1]} grid, not "
+                         f"the {grid.height}x{grid.width} layout with {grid.num_gems} gems and "
+                         f"{grid.max_traps} traps")
+
+
+def key_encoder(env, agents):
+    """
+    The StateEncoder shared by agents, if every one of them encodes states
+    with the same encoder geometry for env's grid (so they can be handed
+    env.observe_keys() instead of state tuples); otherwise None.
+    """
+    shared = None
+    for agent in agents:
+        encoder = getattr(agent, 'encoder', None)
+        if encoder is None or (encoder.height, encoder.width) != (env.height, env.width):
+            return None
+        if shared is None:
+            shared = encoder
+        elif encoder.max_items != shared.max_items:
+            return None
+    return shared
@@ -0,0 +1,218 @@
+import struct
+
+import numpy as np
+
+# Every message is one frame: <u32 body length><u8 type><body>, little-endian.
+HELLO, WELCOME, OBS, ACT, SUMMARY, ERROR = range(1, 7)
+
+ROLES = ('thief', 'guard')
+ROLE_BITS = {'thief': 1, 'guard': 2}
+
+# OBS row flags: FIRST starts an episode (no transition into it), DONE ends
+# one (no action is read back), TERMINAL marks a DONE that the environment
+# ended rather than max_steps, i.e. one not to bootstrap from.
+FIRST, DONE, TERMINAL = 1, 2, 4
+RESULTS = (None, 'thief', 'guard')
+
+_FRAME = struct.Struct('<IB')
+_HELLO = struct.Struct('<BIIIq')  # role bits, envs, episodes, max_steps, seed (-1: unseeded); then layout spec
+_WELCOME = struct.Struct('<HHBBB')  # height, width, num_gems, max_traps, num_actions
+_BATCH = struct.Struct('<BI')  # role index, rows
+_SUMMARY = struct.Struct('<IIIQQd')  # thief wins, guard wins, draws, steps, ticks, seconds
+
+# bodies longer than this are refused before being read (callers that know
+# a tighter bound pass it to read_message/expect)
+MAX_BODY = 1 << 26
+MAX_LAYOUT_SPEC = 1024
+MAX_HELLO = _HELLO.size + MAX_LAYOUT_SPEC
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def _unpack(fmt, body, kind, exact=False):
+    """
+    fmt's fields at the start of a `kind` message body (the whole body if
+    exact); a malformed body raises ProtocolError rather than struct.error.
+    """
+    if len(body) < fmt.size or (exact and len(body) != fmt.size):
+        raise ProtocolError(f"{kind} body is {len(body)} bytes, expected "
+                            f"{'' if exact else 'at least '}{fmt.size}")
+    return fmt.unpack_from(body)
+
+
+def _role(index):
+    if index >= len(ROLES):
+        raise ProtocolError(f"unknown role index {index}")
+    return ROLES[index]
+
+
+async def read_message(reader, max_length=MAX_BODY):
+    """
+    Next (type, body) frame from an asyncio StreamReader; a body announced
+    as longer than max_length raises ProtocolError without being read.
+    """
+    length, kind = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    if length > max_length:
+        raise ProtocolError(f"message of {length} bytes exceeds the {max_length}-byte limit")
+    return kind, await reader.readexactly(length)
+
+
+def write_message(writer, kind, body=b''):
+    writer.write(_FRAME.pack(len(body), kind) + body)
+
+
+async def expect(reader, kind, max_length=MAX_BODY):
+    """
+    Body of the next message, which must be of the given type; an ERROR
+    from the peer is raised as ProtocolError.
+    """
+    got, body = await read_message(reader, max_length)
+    if got == ERROR:
+        raise ProtocolError(body.decode('utf-8', 'replace'))
+    if got != kind:
+        raise ProtocolError(f"expected message type {kind}, got {got}")
+    return body
+
+
+def pack_hello(roles, num_envs, episodes, max_steps, layout='default', seed=None):
+    bits = sum(ROLE_BITS[r] for r in roles)
+    return _HELLO.pack(bits, num_envs, episodes, max_steps, -1 if seed is None else seed) + layout.encode()
+
+
+def unpack_hello(body):
+    bits, num_envs, episodes, max_steps, seed = _unpack(_HELLO, body, 'HELLO')
+    try:
+        layout = body[_HELLO.size:].decode()
+    except UnicodeDecodeError:
+        raise ProtocolError("HELLO layout spec is not UTF-8") from None
+    return {
+        'roles': tuple(r for r in ROLES if bits & ROLE_BITS[r]),
+        'num_envs': num_envs,
+        'episodes': episodes,
+        'max_steps': max_steps,
+        'seed': None if seed < 0 else seed,
+        'layout': layout,
+    }
+
+
+def pack_welcome(codec, num_actions):
+    return _WELCOME.pack(codec.height, codec.width, codec.num_gems, codec.max_traps, num_actions)
+
+
+def unpack_welcome(body):
+    height, width, num_gems, max_traps, num_actions = _unpack(_WELCOME, body, 'WELCOME', exact=True)
+    return StateCodec(height, width, num_gems, max_traps), num_actions
+
+
+def pack_summary(thief_wins, guard_wins, draws, steps, ticks, seconds):
+    return _SUMMARY.pack(thief_wins, guard_wins, draws, steps, ticks, seconds)
+
+
+def unpack_summary(body):
+    return dict(zip(('thief_wins', 'guard_wins', 'draws', 'steps', 'ticks', 'seconds'),
+                    _unpack(_SUMMARY, body, 'SUMMARY', exact=True)))
+
+
+class StateCodec:
+    """
+    Fixed-width int16 rows for HeistEnv state tuples:
+    [thief, guard, exit, alarm, gems..., traps...], with tiles as cell
+    indices x * width + y and -1 for absent ones (fewer gems or traps than
+    the maximum, or a thief the guard cannot see). Decoding yields tuples
+    equal to the environment's, so agents' state keys are unchanged.
+    """
+    def __init__(self, height, width, num_gems, max_traps):
+        self.height, self.width = height, width
+        self.num_gems, self.max_traps = num_gems, max_traps
+        self.columns = 4 + num_gems + max_traps
+        self.cells = tuple((x, y) for x in range(height) for y in range(width))
+
+    def encode(self, states):
+        rows = np.full((len(states), self.columns), -1, dtype=np.int16)
+        W = self.width
+        gem_col, trap_col = 4, 4 + self.num_gems
+        for row, (thief, guard, gems, traps, alarm, exit_pos) in zip(rows, states):
+            if thief is not None:
+                row[0] = thief[0] * W + thief[1]
+            row[1] = guard[0] * W + guard[1]
+            row[2] = exit_pos[0] * W + exit_pos[1]
+            row[3] = alarm
+            for i, (x, y) in enumerate(gems):
+                row[gem_col + i] = x * W + y
+            for i, (x, y) in enumerate(traps):
+                row[trap_col + i] = x * W + y
+        return rows
+
+    def decode(self, rows):
+        cells = self.cells
+        gem_end = 4 + self.num_gems
+        states = []
+        for row in rows.tolist():
+            thief, guard, exit_cell, alarm = row[:4]
+            states.append((
+                cells[thief] if thief >= 0 else None,
+                cells[guard],
+                tuple(cells[c] for c in row[4:gem_end] if c >= 0),
+                tuple(cells[c] for c in row[gem_end:] if c >= 0),
+                bool(alarm),
+                cells[exit_cell],
+            ))
+        return states
+
+
+def pack_obs(role, codec, env_ids, flags, results, rewards, states):
+    """
+    One role's observations for a tick: per row the episode slot, flags,
+    result code, reward of the step that led here, and the state.
+    """
+    n = len(env_ids)
+    return b''.join((
+        _BATCH.pack(ROLES.index(role), n),
+        np.asarray(env_ids, dtype=np.uint32).tobytes(),
+        np.asarray(flags, dtype=np.uint8).tobytes(),
+        np.asarray(results, dtype=np.uint8).tobytes(),
+        np.asarray(rewards, dtype=np.float64).tobytes(),
+        codec.encode(states).tobytes(),
+    ))
+
+
+def unpack_obs(body, codec):
+    """
+    (role, env_ids, flags, results, rewards, int16 state rows) views of an
+    OBS body.
+    """
+    role, n = _unpack(_BATCH, body, 'OBS')
+    offset = _BATCH.size
+    arrays = []
+    for dtype, width in ((np.uint32, 1), (np.uint8, 1), (np.uint8, 1), (np.float64, 1),
+                         (np.int16, codec.columns)):
+        if offset + n * width * np.dtype(dtype).itemsize > len(body):
+            raise ProtocolError(f"OBS body of {len(body)} bytes is too short for {n} rows")
+        array = np.frombuffer(body, dtype=dtype, count=n * width, offset=offset)
+        offset += array.nbytes
+        arrays.append(array)
+    if offset != len(body):
+        raise ProtocolError(f"OBS body is {len(body)} bytes, expected {offset}")
+    env_ids, flags, results, rewards, rows = arrays
+    return _role(role), env_ids, flags, results, rewards, rows.reshape(n, codec.columns)
+
+
+def act_size(rows):
+    """
+    Body size of an ACT message with the given number of rows.
+    """
+    return _BATCH.size + rows
+
+
+def pack_act(role, actions):
+    return _BATCH.pack(ROLES.index(role), len(actions)) + np.asarray(actions, dtype=np.uint8).tobytes()
+
+
+def unpack_act(body):
+    role, n = _unpack(_BATCH, body, 'ACT')
+    actions = np.frombuffer(body, dtype=np.uint8, offset=_BATCH.size)
+    if len(actions) != n:
+        raise ProtocolError(f"ACT announces {n} actions but carries {len(actions)}")
+    return _role(role), actions
@@ -0,0 +1,291 @@
+import numpy as np
+
+from env.heist_env import HeistEnv
+from utils import get_path_table
+
+RESULT_NONE, RESULT_THIEF, RESULT_GUARD = 0, 1, 2
+
+
+class VecHeistEnv:
+    """
+    Batched HeistEnv: N episodes stored in NumPy arrays and stepped together.
+
+    Tiles are addressed by cell index ``x * width + y``; gems, traps and the
+    guard's visited tiles are uint64 bitmasks over those cells. Finished
+    episodes (and episodes reaching ``max_steps``) are reset automatically at
+    the end of ``step``.
+
+    Rewards and termination follow ``HeistEnv.step`` term for term, including
+    tie-breaking (equidistant gems and equal-score trap tiles both resolve to
+    the lowest cell index). Layouts are limited to 64 tiles.
+    """
+    ACTIONS = HeistEnv.ACTIONS
+
+    def __init__(self, num_envs, max_steps=None, seed=None, layout=None, beta_t=0.05, beta_g=0.15):
+        template = HeistEnv(layout, beta_t, beta_g)
+        self.beta_t, self.beta_g = beta_t, beta_g
+        self.num_envs = num_envs
+        self.max_steps = max_steps
+        self.height, self.width = template.height, template.width
+        self.num_cells = self.height * self.width
+        if self.num_cells > 64:
+            raise ValueError("VecHeistEnv bitmasks support at most 64 cells")
+        self.num_gems = template.num_gems
+        self.max_traps = template.max_traps
+        self.TRAP_TTL = template.TRAP_TTL
+        self.EXIT_CHANGE_INTERVAL = template.EXIT_CHANGE_INTERVAL
+        self.rng = np.random.default_rng(seed)
+        self._build_tables(template)
+        self._allocate()
+        self.reset()
+
+    # ---- static layout tables ----
+
+    def _cell(self, pos):
+        return pos[0] * self.width + pos[1]
+
+    def _pos(self, cell):
+        return (int(cell) // self.width, int(cell) % self.width)
+
+    def _build_tables(self, template):
+        C = self.num_cells
+        cells = [self._pos(c) for c in range(C)]
+        self.bit = np.left_shift(np.uint64(1), np.arange(C, dtype=np.uint64))
+        self.wall_cells = np.zeros(C, dtype=bool)
+        for pos in template.walls:
+            self.wall_cells[self._cell(pos)] = True
+        self.alarm_cells = np.zeros(C, dtype=bool)
+        for pos in template.alarms:
+            self.alarm_cells[self._cell(pos)] = True
+
+        # next_cell[c, a]: cell reached by taking action a from c (5 = stay)
+        deltas = {0: (0, 0), 1: (-1, 0), 2: (1, 0), 3: (0, -1), 4: (0, 1), 5: (0, 0)}
+        self.next_cell = np.zeros((C, len(self.ACTIONS)), dtype=np.int64)
+        for c, (x, y) in enumerate(cells):
+            for a, (dx, dy) in deltas.items():
+                new_pos = (x + dx, y + dy)
+                self.next_cell[c, a] = self._cell(new_pos) if template._is_valid(new_pos) else c
+
+        xs = np.array([p[0] for p in cells])
+        ys = np.array([p[1] for p in cells])
+        self.manhattan = (np.abs(xs[:, None] - xs[None, :]) +
+                          np.abs(ys[:, None] - ys[None, :])).astype(np.int64)
+
+        # on_path[s, g, t]: tile t lies on astar(s, g)[1:]
+        self.on_path = np.zeros((C, C, C), dtype=np.int64)
+        paths = get_path_table(template.walls, self.width, self.height)
+        open_cells = [c for c in range(C) if not self.wall_cells[c]]
+        for s in open_cells:
+            for g in open_cells:
+                for tile in paths.path(cells[s], cells[g])[1:]:
+                    self.on_path[s, g, self._cell(tile)] = 1
+        self.to_exit = np.ascontiguousarray(self.on_path.transpose(1, 0, 2))
+
+        self.corners = np.array([self._cell(c) for c in template._corners], dtype=np.int64)
+        self.corner_index = np.full(C, -1, dtype=np.int64)
+        self.corner_index[self.corners] = np.arange(len(self.corners))
+        self.other_corners = np.array(
+            [[c for c in self.corners if c != e] for e in self.corners], dtype=np.int64)
+
+        self.thief_start = self._cell(template.layout.thief_start)
+        self.guard_start = self._cell(template.layout.guard_start)
+        self.initial_exits = np.array(
+            [c for c in self.corners if c not in (self.thief_start, self.guard_start)],
+            dtype=np.int64)
+        # gem_allowed[e]: tiles a gem may spawn on when the episode starts at exit e
+        blocked = self.wall_cells | self.alarm_cells
+        blocked[[self.thief_start, self.guard_start]] = True
+        self.gem_allowed = np.repeat(~blocked[None, :], C, axis=0)
+        self.gem_allowed[np.arange(C), np.arange(C)] = False
+
+    def _allocate(self):
+        n, C = self.num_envs, self.num_cells
+        self.thief_pos = np.zeros(n, dtype=np.int64)
+        self.guard_pos = np.zeros(n, dtype=np.int64)
+        self.exit = np.zeros(n, dtype=np.int64)
+        self.gems = np.zeros(n, dtype=np.uint64)
+        self.initial_gems = np.zeros(n, dtype=np.uint64)
+        self.traps = np.zeros(n, dtype=np.uint64)
+        self.trap_timers = np.zeros((n, C), dtype=np.int16)
+        self.num_collected = np.zeros(n, dtype=np.int64)
+        self.alarm_triggered = np.zeros(n, dtype=bool)
+        self.alarm_timer = np.zeros(n, dtype=np.int64)
+        self.guard_visited = np.zeros(n, dtype=np.uint64)
+        self.last_guard_pos = np.full(n, -1, dtype=np.int64)
+        self.guard_idle_steps = np.zeros(n, dtype=np.int64)
+        self.global_step_count = np.zeros(n, dtype=np.int64)
+
+    # ---- episode control ----
+
+    def reset(self, indices=None):
+        if indices is None:
+            indices = np.arange(self.num_envs)
+        self._reset_envs(np.asarray(indices, dtype=np.int64))
+        return self.observe()
+
+    def _reset_envs(self, idx):
+        k = len(idx)
+        if k == 0:
+            return
+        self.global_step_count[idx] = 0
+        self.thief_pos[idx] = self.thief_start
+        self.guard_pos[idx] = self.guard_start
+        exits = self.initial_exits[self.rng.integers(len(self.initial_exits), size=k)]
+        self.exit[idx] = exits
+        keys = self.rng.random((k, self.num_cells))
+        keys[~self.gem_allowed[exits]] = np.inf
+        picks = np.argpartition(keys, self.num_gems - 1, axis=1)[:, :self.num_gems]
+        gems = np.bitwise_or.reduce(self.bit[picks], axis=1)
+        self.gems[idx] = gems
+        self.initial_gems[idx] = gems
+        self.traps[idx] = 0
+        self.trap_timers[idx] = 0
+        self.num_collected[idx] = 0
+        self.alarm_triggered[idx] = False
+        self.alarm_timer[idx] = 0
+        self.guard_visited[idx] = self.bit[self.guard_start]
+        self.last_guard_pos[idx] = -1
+        self.guard_idle_steps[idx] = 0
+
+    def observe(self):
+        """
+        Batched observation in HeistEnv._get_state order:
+        (thief cell, guard cell, gem mask, trap mask, alarm flag, exit cell).
+        """
+        return (self.thief_pos.copy(), self.guard_pos.copy(), self.gems.copy(),
+                self.traps.copy(), self.alarm_triggered.copy(), self.exit.copy())
+
+    def get_state(self, i):
+        """
+        Tuple state of episode i, identical in layout to HeistEnv._get_state.
+        """
+        return (
+            self._pos(self.thief_pos[i]),
+            self._pos(self.guard_pos[i]),
+            self._mask_to_tiles(self.gems[i]),
+            self._mask_to_tiles(self.traps[i]),
+            bool(self.alarm_triggered[i]),
+            self._pos(self.exit[i]),
+        )
+
+    def _mask_to_tiles(self, mask):
+        return tuple(self._pos(c) for c in np.flatnonzero(mask & self.bit))
+
+    def _has(self, masks, cells):
+        return (masks & self.bit[cells]) != 0
+
+    # ---- dynamics ----
+
+    def step(self, thief_actions, guard_actions):
+        thief_actions = self._sanitize(thief_actions)
+        guard_actions = self._sanitize(guard_actions)
+        n = self.num_envs
+        r_thief = np.zeros(n, dtype=np.float64)
+        r_guard = np.zeros(n, dtype=np.float64)
+
+        self.global_step_count += 1
+        relocate = np.flatnonzero(self.global_step_count % self.EXIT_CHANGE_INTERVAL == 0)
+        if len(relocate):
+            choice = self.rng.integers(self.other_corners.shape[1], size=len(relocate))
+            self.exit[relocate] = self.other_corners[
+                self.corner_index[self.exit[relocate]], choice]
+
+        old_thief = self.thief_pos.copy()
+        old_guard = self.guard_pos.copy()
+
+        # trap expiry
+        active = self.trap_timers > 0
+        self.trap_timers -= active
+        expired = active & (self.trap_timers <= 0)
+        r_guard -= 0.5 * expired.sum(axis=1)
+        self.traps &= ~(expired.astype(np.uint64) * self.bit).sum(axis=1, dtype=np.uint64)
+
+        # thief move and shaping towards nearest gem (or the exit)
+        self.thief_pos = self.next_cell[old_thief, thief_actions]
+        r_thief -= 0.1 * (self.thief_pos == old_thief)
+        gem_cells = (self.gems[:, None] & self.bit[None, :]) != 0
+        dist = np.where(gem_cells, self.manhattan[old_thief], np.iinfo(np.int64).max)
+        goal = np.where(self.gems != 0, dist.argmin(axis=1), self.exit)
+        d_old = self.manhattan[old_thief, goal]
+        d_new = self.manhattan[self.thief_pos, goal]
+        r_thief += self.beta_t * (d_old - d_new)
+
+        # guard move or trap placement
+        place = guard_actions == 5
+        self.guard_pos = np.where(
+            place, old_guard, self.next_cell[old_guard, guard_actions])
+        trap_envs = np.flatnonzero(place & ((self.trap_timers > 0).sum(axis=1) < self.max_traps))
+        if len(trap_envs):
+            target = self._best_trap_tiles(trap_envs, gem_cells[trap_envs])
+            self.traps[trap_envs] |= self.bit[target]
+            self.trap_timers[trap_envs, target] = self.TRAP_TTL
+
+        r_guard -= 0.2 * ((self.guard_pos == old_guard) & self._has(self.gems, self.guard_pos))
+        d_old_g = self.manhattan[old_guard, self.thief_pos]
+        d_new_g = self.manhattan[self.guard_pos, self.thief_pos]
+        r_guard += self.beta_g * (d_old_g - d_new_g)
+        new_tile = ~self._has(self.guard_visited, self.guard_pos)
+        r_guard += 0.1 * new_tile
+        self.guard_visited |= self.bit[self.guard_pos]
+        idle = self.last_guard_pos == self.guard_pos
+        self.guard_idle_steps = np.where(idle, self.guard_idle_steps + 1, 0)
+        self.last_guard_pos = self.guard_pos.copy()
+        r_guard -= 0.1 * (self.guard_idle_steps > 3)
+
+        # thief tile events
+        on_alarm = self.alarm_cells[self.thief_pos]
+        self.alarm_triggered |= on_alarm
+        self.alarm_timer[on_alarm] = 3
+        r_thief -= 1.0 * on_alarm
+        r_guard += 1.0 * on_alarm
+
+        on_gem = self._has(self.gems, self.thief_pos)
+        self.gems &= ~np.where(on_gem, self.bit[self.thief_pos], np.uint64(0))
+        self.num_collected += on_gem
+        r_thief += 1.0 * on_gem
+
+        on_trap = self._has(self.traps, self.thief_pos)
+        self.traps &= ~np.where(on_trap, self.bit[self.thief_pos], np.uint64(0))
+        sprung = np.flatnonzero(on_trap)
+        self.trap_timers[sprung, self.thief_pos[sprung]] = 0
+        r_thief -= 2.0 * on_trap
+        r_guard += 2.0 * on_trap
+
+        # termination
+        caught = self.thief_pos == self.guard_pos
+        escaped = ~caught & (self.num_collected == self.num_gems) & (self.thief_pos == self.exit)
+        r_thief += 5.0 * escaped - 5.0 * caught
+        r_guard += 5.0 * caught - 5.0 * escaped
+        result = np.where(caught, RESULT_GUARD, np.where(escaped, RESULT_THIEF, RESULT_NONE))
+        dones = caught | escaped
+
+        ticking = self.alarm_timer > 0
+        self.alarm_timer -= ticking
+        self.alarm_triggered &= ~(ticking & (self.alarm_timer == 0))
+
+        truncated = np.zeros(n, dtype=bool)
+        if self.max_steps is not None:
+            truncated = ~dones & (self.global_step_count >= self.max_steps)
+        final_obs = self.observe()
+        self._reset_envs(np.flatnonzero(dones | truncated))
+        info = {'result': result, 'truncated': truncated, 'final_obs': final_obs}
+        return self.observe(), (r_thief, r_guard), dones, info
+
+    def _sanitize(self, actions):
+        # unknown actions behave like 0 (stay), as in HeistEnv._apply_action
+        actions = np.asarray(actions, dtype=np.int64)
+        return np.where((actions < 0) | (actions >= len(self.ACTIONS)), 0, actions)
+
+    def _best_trap_tiles(self, envs, gem_cells):
+        """
+        Batched compute_best_trap_tile: tiles on the thief->gem paths score 1,
+        tiles on every gem->exit path score 2; falls back to the guard's tile.
+        """
+        score = (gem_cells[:, :, None] * self.on_path[self.thief_pos[envs]]).sum(axis=1)
+        all_gems = (self.initial_gems[envs, None] & self.bit[None, :]) != 0
+        score += 2 * (all_gems[:, :, None] * self.to_exit[self.exit[envs]]).sum(axis=1)
+        trapped = (self.traps[envs, None] & self.bit[None, :]) != 0
+        blocked = self.wall_cells | self.alarm_cells
+        score = np.where(blocked[None, :] | trapped, 0, score)
+        best = score.argmax(axis=1)
+        return np.where(score[np.arange(len(envs)), best] > 0, best, self.guard_pos[envs])
@@ -0,0 +1,173 @@
+import os
+import time
+import random
+import asyncio
+import argparse
+
+from env.heist_env import HeistEnv
+from env.layouts import parse_layout
+from env import protocol
+from env.protocol import FIRST, DONE, TERMINAL
+from evaluate import load_agent
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Reference client for env_server.py: plays its batched episodes with saved agents."
+    )
+    parser.add_argument(
+        '--host', type=str, default='127.0.0.1',
+        help='Server TCP address'
+    )
+    parser.add_argument(
+        '--port', type=int, default=8765,
+        help='Server TCP port'
+    )
+    parser.add_argument(
+        '--unix', type=str, default=None,
+        help='Connect to this Unix socket path instead of TCP'
+    )
+    parser.add_argument(
+        '--role', choices=['thief', 'guard', 'both'], default='both',
+        help='Roles played by this client; the server plays the other one'
+    )
+    parser.add_argument(
+        '--model_dir', type=str, default='models',
+        help='Directory containing thief_agent/guard_agent (.qt or .pkl); random if missing'
+    )
+    parser.add_argument(
+        '--num_envs', type=int, default=256,
+        help='Episodes the server runs concurrently for this client'
+    )
+    parser.add_argument(
+        '--episodes', type=int, default=1000,
+        help='Total episodes to play'
+    )
+    parser.add_argument(
+        '--max_steps', type=int, default=50,
+        help='Max steps per episode'
+    )
+    parser.add_argument(
+        '--layout', type=str, default='default',
+        help="Map layout: 'default', 'open:SIZE' or 'random:SIZE[:GEMS[:SEED]]'"
+    )
+    parser.add_argument(
+        '--seed', type=int, default=None,
+        help="Seed of the server-side episodes (and of this client's own agents)"
+    )
+    parser.add_argument(
+        '--learn', action='store_true',
+        help='Update the agents from the served transitions (otherwise they play frozen)'
+    )
+    parser.add_argument(
+        '--save_dir', type=str, default=None,
+        help='With --learn, where to save the updated agents'
+    )
+    return parser.parse_args()
+
+
+class BatchPlayer:
+    """
+    Answers one role's OBS batches with a local agent. Every row not
+    flagged FIRST completes the transition from the slot's previous state
+    and action, which --learn feeds to agent.update (bootstrapping unless
+    the row is TERMINAL).
+    """
+    def __init__(self, agent, learn=False):
+        self.agent = agent
+        self.learn = learn
+        self.last = {}
+
+    def act(self, codec, env_ids, flags, rewards, rows):
+        agent = self.agent
+        actions = []
+        for slot, flag, reward, state in zip(env_ids.tolist(), flags.tolist(), rewards.tolist(),
+                                             codec.decode(rows)):
+            if not flag & FIRST and self.learn:
+                prev_state, prev_action = self.last[slot]
+                agent.update(prev_state, prev_action, reward, state, bool(flag & TERMINAL))
+            if flag & DONE:
+                del self.last[slot]
+                actions.append(0)
+                continue
+            action = agent.select_action(state)
+            self.last[slot] = (state, action)
+            actions.append(action)
+        return actions
+
+
+async def play(reader, writer, players, num_envs, episodes, max_steps, layout='default', seed=None):
+    """
+    Play a full session against the server with players {role: BatchPlayer};
+    returns the server's summary plus the client-side wall time.
+    """
+    start = time.perf_counter()
+    protocol.write_message(writer, protocol.HELLO, protocol.pack_hello(
+        list(players), num_envs, episodes, max_steps, layout, seed))
+    codec, _ = protocol.unpack_welcome(await protocol.expect(reader, protocol.WELCOME))
+    while True:
+        kind, body = await protocol.read_message(reader)
+        if kind == protocol.SUMMARY:
+            summary = protocol.unpack_summary(body)
+            summary['client_seconds'] = time.perf_counter() - start
+            return summary
+        if kind == protocol.ERROR:
+            raise protocol.ProtocolError(body.decode('utf-8', 'replace'))
+        if kind != protocol.OBS:
+            raise protocol.ProtocolError(f"unexpected message type {kind}")
+        role, env_ids, flags, _, rewards, rows = protocol.unpack_obs(body, codec)
+        actions = players[role].act(codec, env_ids, flags, rewards, rows)
+        # a batch of only DONE rows closes the session and takes no reply
+        if not (flags & DONE).all():
+            protocol.write_message(writer, protocol.ACT, protocol.pack_act(role, actions))
+            await writer.drain()
+
+
+async def main_async(args):
+    roles = ['thief', 'guard'] if args.role == 'both' else [args.role]
+    if args.seed is not None:
+        random.seed(args.seed)
+    layout = parse_layout(args.layout)
+    agents = {role: load_agent(role, HeistEnv.ACTIONS, args.model_dir, frozen=not args.learn,
+                               layout=layout)
+              for role in roles}
+    if args.learn:
+        for agent in agents.values():
+            table = getattr(agent, 'q_table', None)
+            if hasattr(table, 'to_array_table'):
+                # memory-mapped .qt tables are read-only
+                agent.q_table = table.to_array_table()
+    players = {role: BatchPlayer(agent, args.learn) for role, agent in agents.items()}
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        summary = await play(reader, writer, players, args.num_envs, args.episodes, args.max_steps,
+                             args.layout, args.seed)
+    finally:
+        writer.close()
+
+    n = summary['thief_wins'] + summary['guard_wins'] + summary['draws']
+    print("=== Served Episodes ===")
+    print(f"Thief wins: {summary['thief_wins']}/{n} ({summary['thief_wins'] / n:.1%})")
+    print(f"Guard wins: {summary['guard_wins']}/{n} ({summary['guard_wins'] / n:.1%})")
+    print(f"Draws     : {summary['draws']}/{n} ({summary['draws'] / n:.1%})")
+    print(f"Steps     : {summary['steps']} in {summary['ticks']} ticks "
+          f"({summary['steps'] / max(summary['ticks'], 1):.1f} episode steps per round-trip)")
+    print(f"Throughput: {summary['steps'] / summary['client_seconds']:.0f} steps/s")
+
+    if args.learn and args.save_dir:
+        os.makedirs(args.save_dir, exist_ok=True)
+        for role, agent in agents.items():
+            if hasattr(agent, 'save'):
+                agent.save(os.path.join(args.save_dir, f'{role}_agent.pkl'))
+        print(f"Agents saved to '{args.save_dir}'.")
+
+
+def main():
+    asyncio.run(main_async(parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+import copy
+import time
+import random
+import asyncio
+import argparse
+
+from env.heist_env import HeistEnv
+from env.layouts import parse_layout
+from env.observation import check_geometry
+from env import protocol
+from env.protocol import FIRST, DONE, TERMINAL, RESULTS, StateCodec
+from evaluate import load_agent
+
+# sessions with at least this many episodes step in a worker thread
+OFFLOAD_ENVS = 8
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Serve HeistEnv episodes to external agents over a local socket."
+    )
+    parser.add_argument(
+        '--host', type=str, default='127.0.0.1',
+        help='TCP address to listen on'
+    )
+    parser.add_argument(
+        '--port', type=int, default=8765,
+        help='TCP port to listen on'
+    )
+    parser.add_argument(
+        '--unix', type=str, default=None,
+        help='Listen on this Unix socket path instead of TCP'
+    )
+    parser.add_argument(
+        '--opponent_dir', type=str, default='models',
+        help='Models playing (frozen) whichever role a client does not control; random if missing'
+    )
+    parser.add_argument(
+        '--max_envs', type=int, default=4096,
+        help='Largest number of concurrent episodes one client may ask for'
+    )
+    return parser.parse_args()
+
+
+class Session:
+    """
+    One client's batch of episodes: num_envs HeistEnvs stepped in lockstep
+    until `episodes` have finished. Each tick every controlled role gets a
+    single OBS message covering all slots and answers with a single ACT, so
+    one round-trip is shared by every running episode. A finished slot
+    reports its terminal row and, if episodes remain, the next episode's
+    FIRST row in the same tick.
+
+    The session's envs and its copies of the opponents draw from one
+    random.Random seeded by the HELLO seed, so concurrent sessions never
+    touch each other's random streams.
+    """
+    def __init__(self, hello, opponents):
+        self.roles = hello['roles']
+        self.max_steps = hello['max_steps']
+        self.episodes = hello['episodes']
+        self.rng = random.Random(hello['seed'])
+        layout = parse_layout(hello['layout'])
+        self.envs = [HeistEnv(layout, rng=self.rng)
+                     for _ in range(min(hello['num_envs'], self.episodes))]
+        self.codec = StateCodec(layout.height, layout.width, layout.num_gems, layout.max_traps)
+        self.opponents = {}
+        for role, agent in opponents.items():
+            if role in self.roles:
+                continue
+            check_geometry(agent, layout)
+            self.opponents[role] = agent = copy.copy(agent)
+            agent.rng = self.rng
+        self.started = 0
+        self.steps = [0] * len(self.envs)
+        self.states = [None] * len(self.envs)
+        self.counts = {'thief': 0, 'guard': 0, None: 0}
+        self.total_steps = 0
+        self.ticks = 0
+
+    def _rows(self):
+        return {role: ([], [], [], [], []) for role in protocol.ROLES}
+
+    def _emit(self, rows, slot, flags, result, rewards, views):
+        for role, state, reward in zip(protocol.ROLES, views, rewards):
+            ids, fl, res, rew, states = rows[role]
+            ids.append(slot)
+            fl.append(flags)
+            res.append(RESULTS.index(result))
+            rew.append(reward)
+            states.append(state)
+
+    def _start(self, rows, slot):
+        self.started += 1
+        self.steps[slot] = 0
+        self.envs[slot].reset()
+        self.states[slot] = self.envs[slot].observe()
+        self._emit(rows, slot, FIRST, None, (0.0, 0.0), self.states[slot])
+
+    def first_rows(self):
+        rows = self._rows()
+        for slot in range(len(self.envs)):
+            self._start(rows, slot)
+        return rows
+
+    def step(self, actions):
+        """
+        Step every running slot with actions {role: {slot: action}}; returns
+        the next tick's rows.
+        """
+        rows = self._rows()
+        for slot, env in enumerate(self.envs):
+            if self.states[slot] is None:
+                continue
+            _, rewards, done, info = env.step(actions['thief'][slot], actions['guard'][slot])
+            self.steps[slot] += 1
+            self.total_steps += 1
+            views = env.observe()
+            if done or self.steps[slot] >= self.max_steps:
+                self._emit(rows, slot, DONE | (TERMINAL if done else 0), info['result'], rewards, views)
+                self.counts[info['result']] += 1
+                self.states[slot] = None
+                if self.started < self.episodes:
+                    self._start(rows, slot)
+            else:
+                self._emit(rows, slot, 0, None, rewards, views)
+                self.states[slot] = views
+        return rows
+
+    def tick(self, actions):
+        """
+        Add the opponents' actions to the client's {role: {slot: action}}
+        and step; returns the next tick's rows.
+        """
+        for role in self.opponents:
+            actions[role] = self.local_actions(role)
+        self.ticks += 1
+        return self.step(actions)
+
+    def local_actions(self, role):
+        agent = self.opponents[role]
+        index = protocol.ROLES.index(role)
+        return {slot: agent.select_action(states[index])
+                for slot, states in enumerate(self.states) if states is not None}
+
+    @property
+    def running(self):
+        return any(state is not None for state in self.states)
+
+
+async def serve_session(reader, writer, opponents, max_envs):
+    hello = protocol.unpack_hello(await protocol.expect(reader, protocol.HELLO, protocol.MAX_HELLO))
+    if not hello['roles']:
+        raise protocol.ProtocolError("HELLO controls no role")
+    if not 1 <= hello['num_envs'] <= max_envs:
+        raise protocol.ProtocolError(f"num_envs must be between 1 and {max_envs}")
+    if hello['episodes'] < 1 or hello['max_steps'] < 1:
+        raise protocol.ProtocolError("episodes and max_steps must be positive")
+    # env stepping and opponent moves run in the default thread pool, so a
+    # large session does not hold up other clients' I/O while it computes;
+    # ticks of small sessions are too short to be worth the thread hop
+    loop = asyncio.get_running_loop()
+    session = await loop.run_in_executor(None, Session, hello, opponents)
+    offload = len(session.envs) >= OFFLOAD_ENVS
+
+    async def compute(fn, *args):
+        if offload:
+            return await loop.run_in_executor(None, fn, *args)
+        return fn(*args)
+    protocol.write_message(writer, protocol.WELCOME, protocol.pack_welcome(session.codec, len(HeistEnv.ACTIONS)))
+
+    start = time.perf_counter()
+    rows = await compute(session.first_rows)
+    while True:
+        for role in session.roles:
+            protocol.write_message(writer, protocol.OBS, protocol.pack_obs(role, session.codec, *rows[role]))
+        await writer.drain()
+        if not session.running:
+            break
+        actions = {}
+        for _ in session.roles:
+            # a slot can send a DONE and a FIRST row in one tick
+            body = await protocol.expect(reader, protocol.ACT, protocol.act_size(2 * len(session.envs)))
+            role, acts = protocol.unpack_act(body)
+            ids, flags = rows[role][0], rows[role][1]
+            if role not in session.roles or role in actions or len(acts) != len(ids):
+                raise protocol.ProtocolError(f"unexpected ACT for {role} with {len(acts)} rows")
+            # a DONE row's action is ignored; the slot's FIRST row follows it
+            actions[role] = {slot: int(a) for slot, f, a in zip(ids, flags, acts.tolist()) if not f & DONE}
+        rows = await compute(session.tick, actions)
+
+    counts = session.counts
+    protocol.write_message(writer, protocol.SUMMARY, protocol.pack_summary(
+        counts['thief'], counts['guard'], counts[None], session.total_steps, session.ticks,
+        time.perf_counter() - start))
+    await writer.drain()
+
+
+async def handle_client(reader, writer, opponents, max_envs):
+    peer = writer.get_extra_info('peername') or 'unix socket'
+    try:
+        await serve_session(reader, writer, opponents, max_envs)
+    except (protocol.ProtocolError, ValueError) as e:
+        # ValueError: a layout spec parse_layout rejects, or opponents
+        # trained on another grid
+        print(f"{peer}: {e}")
+        protocol.write_message(writer, protocol.ERROR, str(e).encode())
+    except (asyncio.IncompleteReadError, ConnectionError):
+        print(f"{peer}: disconnected")
+    finally:
+        writer.close()
+
+
+async def main_async(args):
+    opponents = {role: load_agent(role, HeistEnv.ACTIONS, args.opponent_dir, frozen=True)
+                 for role in protocol.ROLES}
+
+    def handler(reader, writer):
+        return handle_client(reader, writer, opponents, args.max_envs)
+
+    if args.unix:
+        server = await asyncio.start_unix_server(handler, path=args.unix)
+        print(f"Serving HeistEnv on unix socket {args.unix}")
+    else:
+        server = await asyncio.start_server(handler, args.host, args.port)
+        print(f"Serving HeistEnv on {args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    args = parse_args()
+    try:
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,18 @@
 # file: evaluate.py
 import os
+import time
 import argparse
 import random
+from multiprocessing import Pool
 
 from env.heist_env import HeistEnv
-from agents.thief_agent import ThiefAgent
-from agents.guard_agent import GuardAgent
-from utils import manhattan_distance
+from env.layouts import parse_layout
+from env.observation import check_geometry, key_encoder
+from agents.base_agent import BaseAgent
+from agents.frozen_policy import FrozenPolicy
+from agents.model_format import resolve_model_path
+from telemetry import Telemetry
+from confidence import RunningStats, difference_interval, wilson_interval, z_value
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -18,7 +24,7 @@ def parse_args():
     )
     parser.add_argument(
         '--episodes', type=int, default=1000,
-        help='Number of evaluation episodes'
+        help='Number of evaluation episodes (the upper bound with --adaptive)'
     )
     parser.add_argument(
         '--max_steps', type=int, default=50,
@@ -28,78 +34,136 @@ def parse_args():
         '--model_dir', type=str, default='models',
         help='Directory where trained agents are saved'
     )
+    parser.add_argument(
+        '--layout', type=str, default='default',
+        help="Map layout: 'default', 'open:SIZE' or 'random:SIZE[:GEMS[:SEED]]'"
+    )
+    parser.add_argument(
+        '--frozen', action='store_true',
+        help='Play compiled greedy policies (epsilon 0) that never modify the loaded models'
+    )
     parser.add_argument(
         '--render', action='store_true',
         help='Render each episode in ASCII'
     )
-    return parser.parse_args()
-
-def mask_guard_state(tuple_state):
-    thief_pos, guard_pos, gems, traps, alarm, exit_pos = tuple_state
-    if not alarm and manhattan_distance(thief_pos, guard_pos) > 2:
-        thief_view = None
-    else:
-        thief_view = thief_pos
-    return (thief_view, guard_pos, gems, traps, alarm, exit_pos)
-
-def split_state(global_state):
-    if isinstance(global_state, dict):
-        return global_state['thief'], global_state['guard']
-    else:
-        return global_state, mask_guard_state(global_state)
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Number of worker processes to shard episodes across'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=None,
+        help='Base random seed; results are reproducible for a given seed and worker count'
+    )
+    parser.add_argument(
+        '--telemetry', type=str, default=None,
+        help='Write telemetry snapshots to this file (.jsonl, .csv or .prom); --workers 1 only'
+    )
+    parser.add_argument(
+        '--telemetry_interval', type=int, default=1000,
+        help='Episodes between telemetry snapshots'
+    )
+    parser.add_argument(
+        '--adaptive', action='store_true',
+        help='Stop as soon as the confidence intervals reach --precision/--step_precision '
+             '(or, with --compare_dir, the two models differ significantly); --workers 1 only'
+    )
+    parser.add_argument(
+        '--confidence', type=float, default=0.95,
+        help='Confidence level of the reported intervals'
+    )
+    parser.add_argument(
+        '--precision', type=float, default=0.02,
+        help='Target half-width of the Wilson intervals on the thief and guard win rates'
+    )
+    parser.add_argument(
+        '--step_precision', type=float, default=0.5,
+        help='Target half-width of the interval on mean episode length'
+    )
+    parser.add_argument(
+        '--min_episodes', type=int, default=200,
+        help='Episodes played before --adaptive may stop'
+    )
+    parser.add_argument(
+        '--check_every', type=int, default=100,
+        help='Episodes between --adaptive stopping checks'
+    )
+    parser.add_argument(
+        '--compare_dir', type=str, default=None,
+        help='With --adaptive, also evaluate the models in this directory and test for a difference'
+    )
+    parser.add_argument(
+        '--metric', choices=['thief', 'guard'], default=None,
+        help="Win rate compared with --compare_dir (default: the evaluated role; 'thief' for both)"
+    )
+    parser.add_argument(
+        '--crn', action='store_true',
+        help='Common random numbers: both models play episode i with the same seed'
+    )
+    args = parser.parse_args()
+    if args.metric is None:
+        args.metric = 'guard' if args.role == 'guard' else 'thief'
+    return args
 
 def make_random_agent(action_space):
     class RandomAgent:
         def __init__(self, action_space):
             self.action_space = action_space
+            self.rng = random
         def select_action(self, state):
-            return random.choice(self.action_space)
+            return self.rng.choice(self.action_space)
     return RandomAgent(action_space)
 
-def load_agent(role, action_space, model_dir):
-    if role == 'thief':
-        path = os.path.join(model_dir, 'thief_agent.pkl')
-        if os.path.exists(path):
-            return ThiefAgent.load(path)
-    elif role == 'guard':
-        path = os.path.join(model_dir, 'guard_agent.pkl')
-        if os.path.exists(path):
-            return GuardAgent.load(path)
-    return make_random_agent(action_space)
+def load_agent(role, action_space, model_dir, frozen=False, layout=None):
+    path = resolve_model_path(model_dir, f'{role}_agent')
+    if path is None:
+        return make_random_agent(action_space)
+    agent = BaseAgent.load(path, role=role)
+    if layout is not None:
+        check_geometry(agent, layout)
+    return FrozenPolicy.compile(agent) if frozen else agent
 
-def evaluate():
-    args = parse_args()
-    env = HeistEnv()
+def run_episodes(env, thief_agent, guard_agent, role, episodes, max_steps, render=False,
+                 first_episode=1, telemetry=None):
     action_space = env.ACTIONS
-
-    thief_agent = load_agent('thief', action_space, args.model_dir)
-    guard_agent = load_agent('guard', action_space, args.model_dir)
-
+    perf_counter = time.perf_counter
     stats = {'thief_wins': 0, 'guard_wins': 0, 'draws': 0, 'steps': []}
+    # tabular agents and frozen policies sharing one encoder act on integer
+    # keys straight from the env instead of encoding state tuples themselves
+    acting = [agent for agent, name in ((thief_agent, 'thief'), (guard_agent, 'guard'))
+              if role in (name, 'both')]
+    for agent in acting:
+        check_geometry(agent, env)
+    encoder = key_encoder(env, acting)
 
-    for ep in range(1, args.episodes + 1):
-        obs = env.reset()
-        state_thief, state_guard = split_state(obs)
+    for ep in range(first_episode, first_episode + episodes):
+        env.reset()
+        state_thief, state_guard = env.observe_keys(encoder) if encoder else env.observe()
         done = False
         step = 0
 
-        if args.render:
+        if render:
             print(f"\nEpisode {ep}")
             env.render_ascii()
             print()
 
-        while not done and step < args.max_steps:
+        while not done and step < max_steps:
+            t0 = perf_counter() if telemetry else 0.0
             # Select actions
-            a_thief = thief_agent.select_action(state_thief) if args.role in ('thief','both') \
+            a_thief = thief_agent.select_action(state_thief) if role in ('thief','both') \
                       else random.choice(action_space)
-            a_guard = guard_agent.select_action(state_guard) if args.role in ('guard','both') \
+            a_guard = guard_agent.select_action(state_guard) if role in ('guard','both') \
                       else random.choice(action_space)
 
-            obs, (r_thief, r_guard), done, info = env.step(a_thief, a_guard)
-            next_thief, next_guard = split_state(obs)
+            if telemetry:
+                t1 = perf_counter()
+                telemetry.add_time('select_action', t1 - t0)
+            _, (r_thief, r_guard), done, info = env.step(a_thief, a_guard)
+            next_thief, next_guard = env.observe_keys(encoder) if encoder else env.observe()
             step += 1
+            if telemetry:
+                telemetry.add_time('env_step', perf_counter() - t1)
 
-            if args.render:
+            if render:
                 env.render_ascii()
                 print()
             state_thief, state_guard = next_thief, next_guard
@@ -112,6 +176,201 @@ def evaluate():
         else:
             stats['draws'] += 1
         stats['steps'].append(step)
+        if telemetry:
+            telemetry.end_episode(result, step)
+    return stats
+
+def merge_stats(parts):
+    stats = {'thief_wins': 0, 'guard_wins': 0, 'draws': 0, 'steps': []}
+    for part in parts:
+        stats['thief_wins'] += part['thief_wins']
+        stats['guard_wins'] += part['guard_wins']
+        stats['draws'] += part['draws']
+        stats['steps'].extend(part['steps'])
+    return stats
+
+# Per-process state for parallel evaluation: agents are loaded once per worker.
+_worker = {}
+
+def _init_worker(role, model_dir, max_steps, layout, frozen=False):
+    env = HeistEnv(parse_layout(layout))
+    _worker['env'] = env
+    _worker['role'] = role
+    _worker['max_steps'] = max_steps
+    _worker['thief'] = load_agent('thief', env.ACTIONS, model_dir, frozen, env.layout)
+    _worker['guard'] = load_agent('guard', env.ACTIONS, model_dir, frozen, env.layout)
+
+def _run_shard(task):
+    seed, first_episode, episodes = task
+    random.seed(seed)
+    return run_episodes(_worker['env'], _worker['thief'], _worker['guard'], _worker['role'],
+                        episodes, _worker['max_steps'], first_episode=first_episode)
+
+def make_shards(episodes, workers, base_seed, shards_per_worker=4):
+    """
+    Split episodes into contiguous shards, each with its own seed drawn from
+    base_seed. Shards depend only on (episodes, workers, base_seed), so the
+    merged result does not depend on which process runs which shard.
+    """
+    num_shards = min(episodes, workers * shards_per_worker) or 1
+    seed_rng = random.Random(base_seed)
+    shards = []
+    first = 1
+    for i in range(num_shards):
+        size = episodes // num_shards + (1 if i < episodes % num_shards else 0)
+        shards.append((seed_rng.randrange(2**63), first, size))
+        first += size
+    return shards
+
+class SequentialStats:
+    """
+    Per-episode outcomes of one model pairing, streamed into counts and
+    running moments for confidence intervals.
+    """
+    def __init__(self, label):
+        self.label = label
+        self.wins = {'thief': 0, 'guard': 0}
+        self.steps = RunningStats()
+        self.n = 0
+
+    def push(self, result, steps):
+        self.n += 1
+        if result in self.wins:
+            self.wins[result] += 1
+        self.steps.push(steps)
+
+    def rate_interval(self, role, z):
+        return wilson_interval(self.wins[role], self.n, z)
+
+    def precise(self, args, z):
+        for role in ('thief', 'guard'):
+            lo, hi = self.rate_interval(role, z)
+            if (hi - lo) / 2 > args.precision:
+                return False
+        return self.steps.half_width(z) <= args.step_precision
+
+    def report(self, z):
+        n = self.n
+        lines = [f"[{self.label}]"]
+        for role in ('thief', 'guard'):
+            lo, hi = self.rate_interval(role, z)
+            w = self.wins[role]
+            lines.append(f"{role.capitalize()} wins: {w}/{n} ({w/n*100:.1f}%, CI {lo*100:.1f}-{hi*100:.1f}%)")
+        d = n - self.wins['thief'] - self.wins['guard']
+        lines.append(f"Draws     : {d}/{n} ({d/n*100:.1f}%)")
+        lines.append(f"Avg steps : {self.steps.mean:.1f} +/- {self.steps.half_width(z):.1f}")
+        return '\n'.join(lines)
+
+
+def evaluate_adaptive(args, base_seed):
+    """
+    Sequential evaluation: play one episode per model at a time and stop at
+    the first check where the intervals are tight enough or the compared
+    models' --metric win rates differ significantly. Episode i of each model
+    is seeded separately, from a shared stream under --crn.
+    """
+    env = HeistEnv(parse_layout(args.layout))
+    action_space = env.ACTIONS
+    dirs = [args.model_dir] + ([args.compare_dir] if args.compare_dir else [])
+    models = [(load_agent('thief', action_space, d, args.frozen, env.layout),
+               load_agent('guard', action_space, d, args.frozen, env.layout), SequentialStats(d))
+              for d in dirs]
+    seed_rngs = [random.Random(base_seed * 2 + (0 if args.crn else k)) for k in range(len(models))]
+    metric = {k: RunningStats() for k in range(len(models))}
+    paired = RunningStats() if args.crn and len(models) == 2 else None
+    z = z_value(args.confidence)
+    # the difference is tested at every check, so split the error rate
+    # across them (Bonferroni) to keep early stopping from inflating it
+    looks = max(1, (args.episodes - args.min_episodes) // args.check_every + 1)
+    z_diff = z_value(1 - (1 - args.confidence) / looks)
+    stop_reason = f"reached --episodes {args.episodes}"
+
+    for episode in range(1, args.episodes + 1):
+        wins = []
+        for k, (thief_agent, guard_agent, stats) in enumerate(models):
+            random.seed(seed_rngs[k].randrange(2**63))
+            episode_stats = run_episodes(env, thief_agent, guard_agent, args.role, 1,
+                                         args.max_steps, first_episode=episode)
+            result = ('thief' if episode_stats['thief_wins'] else
+                      'guard' if episode_stats['guard_wins'] else None)
+            stats.push(result, episode_stats['steps'][0])
+            wins.append(1.0 if result == args.metric else 0.0)
+            metric[k].push(wins[-1])
+        if paired is not None:
+            paired.push(wins[0] - wins[1])
+
+        if episode < args.min_episodes or episode % args.check_every:
+            continue
+        precise = all(stats.precise(args, z) for _, _, stats in models)
+        line = f"Episode {episode}: " + ', '.join(
+            f"{args.metric} win rate {metric[k].mean:.3f}" for k in range(len(models)))
+        if len(models) == 2:
+            lo, hi = difference_interval(metric[0], metric[1], z_diff, paired)
+            print(line + f", difference CI [{lo:+.3f}, {hi:+.3f}]")
+            if lo > 0 or hi < 0:
+                stop_reason = f"{args.metric} win rates differ significantly"
+                break
+        else:
+            print(line)
+        if precise:
+            stop_reason = "target precision reached"
+            break
+
+    print(f"\n=== Adaptive Evaluation Results ({args.confidence:.0%} intervals) ===")
+    print(f"Seed      : {base_seed} (crn={args.crn})")
+    print(f"Stopped   : {stop_reason} after {models[0][2].n} episodes per model")
+    for _, _, stats in models:
+        print(stats.report(z))
+    if len(models) == 2:
+        lo, hi = difference_interval(metric[0], metric[1], z_diff, paired)
+        print(f"{args.metric.capitalize()} win rate difference: {metric[0].mean - metric[1].mean:+.3f} "
+              f"(CI {lo:+.3f} to {hi:+.3f}, corrected for {looks} checks)")
+
+
+def evaluate():
+    args = parse_args()
+    if args.adaptive and (args.workers > 1 or args.render or args.telemetry):
+        raise SystemExit("--adaptive is only supported with --workers 1, without --render or --telemetry")
+    if (args.compare_dir or args.crn) and not args.adaptive:
+        raise SystemExit("--compare_dir and --crn require --adaptive")
+    if args.workers > 1 and args.render:
+        raise SystemExit("--render is only supported with --workers 1")
+    if args.workers > 1 and args.telemetry:
+        raise SystemExit("--telemetry is only supported with --workers 1")
+    base_seed = args.seed if args.seed is not None else random.randrange(2**32)
+    if args.adaptive:
+        evaluate_adaptive(args, base_seed)
+        return
+
+    if args.workers > 1:
+        # a worker initializer that raises is restarted forever, so catch a
+        # model built for another grid here
+        layout = parse_layout(args.layout)
+        for role in ('thief', 'guard'):
+            load_agent(role, HeistEnv.ACTIONS, args.model_dir, layout=layout)
+        shards = make_shards(args.episodes, args.workers, base_seed)
+        with Pool(args.workers, initializer=_init_worker,
+                  initargs=(args.role, args.model_dir, args.max_steps, args.layout, args.frozen)) as pool:
+            stats = merge_stats(pool.map(_run_shard, shards))
+    else:
+        random.seed(base_seed)
+        env = HeistEnv(parse_layout(args.layout))
+        action_space = env.ACTIONS
+
+        thief_agent = load_agent('thief', action_space, args.model_dir, args.frozen, env.layout)
+        guard_agent = load_agent('guard', action_space, args.model_dir, args.frozen, env.layout)
+        telemetry = None
+        if args.telemetry:
+            telemetry = Telemetry(args.telemetry, args.telemetry_interval,
+                                  agents={'thief': thief_agent, 'guard': guard_agent})
+            telemetry.instrument_trap_placement()
+        try:
+            stats = run_episodes(env, thief_agent, guard_agent, args.role,
+                                 args.episodes, args.max_steps, render=args.render,
+                                 telemetry=telemetry)
+        finally:
+            if telemetry:
+                telemetry.close()
 
     total = args.episodes
     t = stats['thief_wins']
@@ -120,6 +379,7 @@ def evaluate():
     avg_steps = sum(stats['steps']) / len(stats['steps']) if stats['steps'] else 0
 
     print("\n=== Evaluation Results ===")
+    print(f"Seed      : {base_seed} (workers={args.workers})")
     print(f"Thief wins: {t}/{total} ({t/total*100:.1f}%)")
     print(f"Guard wins: {g}/{total} ({g/total*100:.1f}%)")
     print(f"Draws     : {d}/{total} ({d/total*100:.1f}%)")
@@ -1,50 +1,69 @@
 # file: interpret.py
 
 import os
-import pickle
+import argparse
 
-import pandas as pd
 from sklearn.tree import DecisionTreeClassifier, export_text
 
+from agents.agent_bundle import AgentBundle
+from agents.model_format import resolve_model_path
+from interpret_features import FEATURES, MAX_ROWS, count_visits, extract_features
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(SCRIPT_DIR, 'models', 'thief_agent.pkl')
-
-with open(MODEL_PATH, 'rb') as f:
-    agent = pickle.load(f)
-
-q_table = agent.q_table
-rows = []
-for state, q_vals in q_table.items():
-    (tx, ty), (gx, gy), gems, traps, alarm, (ex, ey) = state
-    gem_list = list(gems)
-    while len(gem_list) < 2:
-        gem_list.append((-1, -1))
-    (g0x, g0y), (g1x, g1y) = gem_list
-    trap_list = list(traps)
-    while len(trap_list) < 2:
-        trap_list.append((-1, -1))
-    (t0x, t0y), (t1x, t1y) = trap_list
-
-    best_action = int(q_vals.index(max(q_vals)))
-    rows.append({
-        'thief_x': tx, 'thief_y': ty,
-        'guard_x': gx, 'guard_y': gy,
-        'alarm': int(alarm),
-        'exit_x': ex, 'exit_y': ey,
-        'gem0_x': g0x, 'gem0_y': g0y,
-        'gem1_x': g1x, 'gem1_y': g1y,
-        'trap0_x': t0x, 'trap0_y': t0y,
-        'trap1_x': t1x, 'trap1_y': t1y,
-        'action': best_action
-    })
-
-df = pd.DataFrame(rows)
-
-feature_cols = [c for c in df.columns if c != 'action']
-X = df[feature_cols]
-y = df['action']
-
-clf = DecisionTreeClassifier(max_depth=7)
-clf.fit(X, y)
-tree_text = export_text(clf, feature_names=feature_cols)
-print(tree_text)
+MODEL_DIR = os.path.join(SCRIPT_DIR, 'models')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Fit a decision tree to a saved agent's greedy actions."
+    )
+    parser.add_argument(
+        '--role', choices=['thief', 'guard'], default='thief',
+        help='Agent to interpret (the guard is fit on its masked view of the thief)'
+    )
+    parser.add_argument(
+        '--model_dir', type=str, default=MODEL_DIR,
+        help='Directory where trained agents are saved'
+    )
+    parser.add_argument(
+        '--max_rows', type=int, default=MAX_ROWS,
+        help=f'Fit on a uniform random sample of at most this many Q-table rows, drawn from '
+             f'the visited states with --visits (default {MAX_ROWS}; 0 for all rows)'
+    )
+    parser.add_argument(
+        '--visits', type=int, default=0,
+        help='Play this many episodes with the saved agents and fit only on visited states, '
+             'weighted by visit count'
+    )
+    parser.add_argument(
+        '--max_depth', type=int, default=7,
+        help='Depth of the decision tree'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Seed for --max_rows sampling and --visits episodes'
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    role = args.role
+    path = resolve_model_path(args.model_dir, f'{role}_agent')
+    if path is None:
+        raise SystemExit(f"No {role} model found in '{args.model_dir}'")
+    agent = AgentBundle.load(path).get_agent()
+    try:
+        visits = count_visits(role, args.model_dir, args.visits, seed=args.seed) if args.visits else None
+        X, y, weights = extract_features(agent, role, max_rows=args.max_rows or None, visits=visits,
+                                         seed=args.seed)
+    except (FileNotFoundError, TypeError) as e:
+        raise SystemExit(str(e))
+
+    clf = DecisionTreeClassifier(max_depth=args.max_depth)
+    clf.fit(X, y, sample_weight=weights)
+    print(export_text(clf, feature_names=FEATURES[role]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import random
+import itertools
+
+import numpy as np
+
+from env.heist_env import HeistEnv
+from env.layouts import parse_layout
+from evaluate import load_agent
+
+# default cap on the rows extract_features() samples, so that peak memory
+# stays bounded however large the Q-table is
+MAX_ROWS = 1_000_000
+
+ITEM_FEATURES = ['guard_x', 'guard_y', 'alarm', 'exit_x', 'exit_y',
+                 'gem0_x', 'gem0_y', 'gem1_x', 'gem1_y',
+                 'trap0_x', 'trap0_y', 'trap1_x', 'trap1_y']
+FEATURES = {
+    'thief': ['thief_x', 'thief_y'] + ITEM_FEATURES,
+    # the guard's view of the thief is masked to (-1, -1) when out of sight
+    'guard': ['thief_view_x', 'thief_view_y'] + ITEM_FEATURES,
+}
+
+
+def iter_chunks(table, chunk_size=65536):
+    """
+    Yield (keys, q_values) blocks of a Q-table without materializing it
+    as Python objects.
+    """
+    if hasattr(table, 'index'):
+        # ArrayQTable: walk the key -> row dict once, gathering rows per block
+        items = iter(table.index.items())
+        values = table.values
+        while True:
+            block = list(itertools.islice(items, chunk_size))
+            if not block:
+                return
+            keys, rows = np.array(block, dtype=np.int64).T
+            yield keys, values[rows]
+    else:
+        # MappedQTable: rows line up with the sorted key array
+        keys, values = table.sorted_arrays()
+        for start in range(0, len(keys), chunk_size):
+            yield np.asarray(keys[start:start + chunk_size]), values[start:start + chunk_size]
+
+
+def decode_features(encoder, keys, out=None):
+    """
+    Vectorized StateEncoder.decode into the FEATURES column layout; absent
+    positions (padding, masked thief) become -1.
+    """
+    W, C, R = encoder.width, encoder.num_cells, encoder.pos_radix
+    k = encoder.max_items
+    out = np.empty((len(keys), len(ITEM_FEATURES) + 2), dtype=np.int16) if out is None else out
+
+    def put(col, cells):
+        out[:, col] = np.where(cells == C, -1, cells // W)
+        out[:, col + 1] = np.where(cells == C, -1, cells % W)
+
+    keys, exit_cell = np.divmod(keys, C)
+    keys, alarm = np.divmod(keys, 2)
+    out[:, 5] = exit_cell // W
+    out[:, 6] = exit_cell % W
+    out[:, 4] = alarm
+    # traps then gems, stored last item first; only the first two are features
+    for base in (11, 7):
+        cells = []
+        for _ in range(k):
+            keys, cell = np.divmod(keys, R)
+            cells.append(cell)
+        cells.reverse()
+        for i in range(2):
+            put(base + 2 * i, cells[i] if i < k else np.full(len(keys), C))
+    thief, guard = np.divmod(keys, R)
+    put(0, thief)
+    put(2, guard)
+    return out
+
+
+def count_visits(role, model_dir, episodes, max_steps=50, layout='default', seed=0):
+    """
+    Visit counts of role's states over episodes played by the saved agents
+    (frozen, so the models are untouched). Returns sorted keys and counts.
+    """
+    env = HeistEnv(parse_layout(layout))
+    agents = {r: load_agent(r, env.ACTIONS, model_dir, frozen=True, layout=env.layout)
+              for r in ('thief', 'guard')}
+    encoder = getattr(agents[role], 'encoder', None)
+    if encoder is None:
+        # load_agent falls back to a random agent when the model is missing
+        raise FileNotFoundError(f"no tabular {role} model found in '{model_dir}'")
+    visited = []
+    random.seed(seed)
+    for _ in range(episodes):
+        env.reset()
+        done = False
+        step = 0
+        while not done and step < max_steps:
+            state_thief, state_guard = env.observe()
+            visited.append(encoder.encode(state_thief if role == 'thief' else state_guard))
+            _, _, done, _ = env.step(agents['thief'].select_action(state_thief),
+                                       agents['guard'].select_action(state_guard))
+            step += 1
+    return np.unique(np.array(visited, dtype=np.int64), return_counts=True)
+
+
+def extract_features(agent, role, max_rows=MAX_ROWS, visits=None, seed=None, chunk_size=65536):
+    """
+    Stream agent's Q-table into preallocated (features, greedy action,
+    sample weight) arrays for a decision tree.
+
+    max_rows keeps a uniform random subset of at most that many rows (all
+    rows if None), so the output size and peak memory stay bounded whatever
+    the table size. visits, a
+    (sorted keys, counts) pair from count_visits(), keeps only visited
+    states and returns their counts as weights; otherwise weights is None.
+    With visits the subset is drawn from the visited states, so sampling
+    never drops a visited state in favour of an unvisited one.
+    """
+    table = getattr(agent, 'q_table', None)
+    if table is None:
+        raise TypeError(f"{type(agent).__name__} has no Q-table to extract features from")
+    n = len(table)
+    rng = np.random.default_rng(seed)
+    selected = None
+    size = n
+    if visits is not None:
+        visit_keys, visit_counts = visits
+        if max_rows is not None and max_rows < len(visit_keys):
+            pick = np.sort(rng.choice(len(visit_keys), size=max_rows, replace=False))
+            visit_keys, visit_counts = visit_keys[pick], visit_counts[pick]
+        size = min(n, len(visit_keys))
+    elif max_rows is not None and max_rows < n:
+        # a row position is kept iff it is in this sorted sample
+        selected = np.sort(rng.choice(n, size=max_rows, replace=False))
+        size = max_rows
+
+    X = np.empty((size, len(FEATURES[role])), dtype=np.int16)
+    y = np.empty(size, dtype=np.int8)
+    weights = np.empty(size, dtype=np.float64) if visits is not None else None
+    filled = 0
+    start = 0
+    for keys, values in iter_chunks(table, chunk_size):
+        stop = start + len(keys)
+        keep = slice(None)
+        if selected is not None:
+            lo, hi = np.searchsorted(selected, (start, stop))
+            keep = selected[lo:hi] - start
+        keys, values = keys[keep], values[keep]
+        if visits is not None:
+            pos = np.minimum(np.searchsorted(visit_keys, keys), max(len(visit_keys) - 1, 0))
+            seen = visit_keys[pos] == keys if len(visit_keys) else np.zeros(len(keys), dtype=bool)
+            keys, values = keys[seen], values[seen]
+            weights[filled:filled + len(keys)] = visit_counts[pos[seen]]
+        end = filled + len(keys)
+        decode_features(agent.encoder, keys, X[filled:end])
+        y[filled:end] = values.argmax(axis=1)
+        filled = end
+        start = stop
+    if weights is not None:
+        weights = weights[:filled]
+    return X[:filled], y[:filled], weights
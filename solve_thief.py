@@ -0,0 +1,99 @@
+import os
+import time
+import argparse
+
+from env.layouts import parse_layout
+from agents.thief_agent import ThiefAgent
+from agents.guard_agent import GuardAgent
+from agents.model_format import resolve_model_path
+from agents.dp_solver import GuardPolicy, solve_thief
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Solve for a best-response thief against a fixed guard by value iteration."
+    )
+    parser.add_argument(
+        '--model_dir', type=str, default='models',
+        help='Directory holding the guard (and, with --init_thief, the thief) to solve against'
+    )
+    parser.add_argument(
+        '--guard_epsilon', type=float, default=None,
+        help="Guard exploration rate to model (default: the saved guard's own epsilon)"
+    )
+    parser.add_argument(
+        '--layout', type=str, default='default',
+        help="Map layout: 'default', 'open:SIZE' or 'random:SIZE[:GEMS[:SEED]]'"
+    )
+    parser.add_argument(
+        '--starts', type=int, default=None,
+        help='Number of reset states (gem/exit draws) to expand from (default: all)'
+    )
+    parser.add_argument(
+        '--max_states', type=int, default=300000,
+        help='Stop expanding after this many states; the rest form a fixed-value frontier'
+    )
+    parser.add_argument(
+        '--init_thief', action='store_true',
+        help="Bootstrap the frontier from the saved thief and keep its Q-values for unexpanded states"
+    )
+    parser.add_argument(
+        '--gamma', type=float, default=0.99,
+        help='Discount factor'
+    )
+    parser.add_argument(
+        '--tol', type=float, default=1e-4,
+        help='Stop when a sweep changes no state value by more than this'
+    )
+    parser.add_argument(
+        '--max_sweeps', type=int, default=10000,
+        help='Upper bound on value-iteration sweeps'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=None,
+        help='Seed for sampling --starts'
+    )
+    parser.add_argument(
+        '--save_dir', type=str, default=os.path.join('models', 'dp'),
+        help='Directory to save the solved thief'
+    )
+    parser.add_argument(
+        '--model_format', choices=['qt', 'pkl'], default='qt',
+        help="Save format: memory-mappable 'qt' with a JSON sidecar, or a legacy 'pkl' pickle"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    guard_path = resolve_model_path(args.model_dir, 'guard_agent')
+    guard = GuardAgent.load(guard_path) if guard_path else None
+    print(f"Guard: {guard_path or 'uniform random'}")
+    init_agent = None
+    if args.init_thief:
+        thief_path = resolve_model_path(args.model_dir, 'thief_agent')
+        if thief_path is None:
+            raise SystemExit(f"--init_thief: no thief_agent found in {args.model_dir}")
+        init_agent = ThiefAgent.load(thief_path)
+
+    start = time.perf_counter()
+    agent, info = solve_thief(
+        parse_layout(args.layout), GuardPolicy(guard, args.guard_epsilon),
+        num_starts=args.starts, seed=args.seed, gamma=args.gamma, tol=args.tol,
+        max_iters=args.max_sweeps, max_states=args.max_states, init_agent=init_agent,
+        verbose=True,
+    )
+    elapsed = time.perf_counter() - start
+    print(f"Solved {info['states']} states ({info['frontier']} frontier, "
+          f"{info['transitions']} transitions) from {info['starts']} starts "
+          f"in {info['sweeps']} sweeps, {elapsed:.1f}s")
+    print(f"Residual {info['residual']:.2e}, mean start value {info['start_value']:.3f}")
+
+    os.makedirs(args.save_dir, exist_ok=True)
+    path = os.path.join(args.save_dir, f'thief_agent.{args.model_format}')
+    agent.save(path)
+    print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+import io
+import os
+import csv
+import math
+import time
+import random
+import shutil
+import argparse
+import itertools
+import contextlib
+from multiprocessing import Pool
+
+import train
+from env.heist_env import HeistEnv
+from env.layouts import parse_layout
+from agents.base_agent import BaseAgent
+from agents.agent_bundle import AgentBundle
+from agents.frozen_policy import FrozenPolicy
+from agents.model_format import resolve_model_path
+from evaluate import run_episodes, make_random_agent
+
+PARAMS = ('alpha', 'gamma', 'epsilon', 'beta_t', 'beta_g')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Hyperparameter sweep over train.py with successive-halving early stopping."
+    )
+    parser.add_argument(
+        '--role', choices=['thief', 'guard', 'both'], default='both',
+        help='Which agent(s) each trial trains'
+    )
+    parser.add_argument(
+        '--metric', choices=['thief', 'guard'], default=None,
+        help="Win rate that ranks trials (default: the trained role; 'thief' for both)"
+    )
+    parser.add_argument('--alpha', type=float, nargs='+', default=[0.1], help='Learning rates')
+    parser.add_argument('--gamma', type=float, nargs='+', default=[0.99], help='Discount factors')
+    parser.add_argument('--epsilon', type=float, nargs='+', default=[0.1], help='Exploration rates')
+    parser.add_argument('--beta_t', type=float, nargs='+', default=[0.05], help='Thief shaping weights')
+    parser.add_argument('--beta_g', type=float, nargs='+', default=[0.15], help='Guard shaping weights')
+    parser.add_argument(
+        '--search', choices=['grid', 'random'], default='grid',
+        help="'grid' tries every combination; 'random' draws --samples configurations, "
+             "each parameter uniform between the smallest and largest value given"
+    )
+    parser.add_argument(
+        '--samples', type=int, default=16,
+        help='Configurations drawn by --search random'
+    )
+    parser.add_argument(
+        '--milestones', type=int, nargs='+', default=[2000, 5000, 10000, 20000],
+        help='Training episodes at which trials are evaluated and the bottom ones stopped'
+    )
+    parser.add_argument(
+        '--keep', type=float, default=0.5,
+        help='Fraction of trials promoted past each milestone'
+    )
+    parser.add_argument(
+        '--eval_episodes', type=int, default=500,
+        help='Evaluation episodes per trial and milestone'
+    )
+    parser.add_argument(
+        '--max_steps', type=int, default=50,
+        help='Max steps per episode (training and evaluation)'
+    )
+    parser.add_argument(
+        '--layout', type=str, default='default',
+        help="Map layout: 'default', 'open:SIZE' or 'random:SIZE[:GEMS[:SEED]]'"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count() or 1,
+        help='Trials trained in parallel'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Base seed: trial i trains with seed+i; every evaluation uses the same episodes'
+    )
+    parser.add_argument(
+        '--top', type=int, default=1,
+        help='Number of best final trials saved as AgentBundles'
+    )
+    parser.add_argument(
+        '--out_dir', type=str, default='sweeps',
+        help='Where trials, results.csv and the winning bundles are written'
+    )
+    parser.add_argument(
+        '--model_format', choices=['qt', 'pkl'], default='pkl',
+        help='Format of the saved winning bundles'
+    )
+    args = parser.parse_args()
+    args.milestones = sorted(set(args.milestones))
+    if args.metric is None:
+        args.metric = 'guard' if args.role == 'guard' else 'thief'
+    if not 0 < args.keep <= 1:
+        parser.error("--keep must be in (0, 1]")
+    return args
+
+
+def make_configs(args):
+    values = {name: getattr(args, name) for name in PARAMS}
+    if args.search == 'grid':
+        return [dict(zip(PARAMS, combo)) for combo in itertools.product(*values.values())]
+    rng = random.Random(args.seed)
+    return [{name: rng.uniform(min(v), max(v)) for name, v in values.items()}
+            for _ in range(args.samples)]
+
+
+def trial_dir(args, trial):
+    return os.path.join(args.out_dir, 'trials', f'trial_{trial:03d}')
+
+
+def trial_argv(args, trial, config, episodes):
+    argv = [
+        '--role', args.role, '--episodes', str(episodes), '--max_steps', str(args.max_steps),
+        '--layout', args.layout, '--save_dir', trial_dir(args, trial), '--model_format', 'pkl',
+        '--seed', str(args.seed + trial), '--checkpoint_interval', str(episodes), '--resume',
+        '--best_eval_episodes', '0',
+    ]
+    for name in PARAMS:
+        argv += [f'--{name}', repr(config[name])]
+    return argv
+
+
+def evaluate_trial(args, directory):
+    """
+    Win counts of the trial's saved agents, played greedily so a trial's
+    exploration rate does not count against it; untrained roles play
+    randomly. Every trial is scored on the same seeded episodes.
+    """
+    env = HeistEnv(parse_layout(args.layout))
+    agents = {}
+    for role in ('thief', 'guard'):
+        path = resolve_model_path(directory, f'{role}_agent')
+        agents[role] = (FrozenPolicy.compile(BaseAgent.load(path)) if path
+                       else make_random_agent(env.ACTIONS))
+    random.seed(args.seed)
+    stats = run_episodes(env, agents['thief'], agents['guard'], args.role,
+                         args.eval_episodes, args.max_steps)
+    return stats
+
+
+def run_trial(task):
+    """
+    Train one trial up to `episodes` (continuing from its last checkpoint)
+    and evaluate it.
+    """
+    args, trial, config, episodes = task
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        train.train(train.parse_args(trial_argv(args, trial, config, episodes)))
+    train_time = time.perf_counter() - start
+    stats = evaluate_trial(args, trial_dir(args, trial))
+    n = args.eval_episodes
+    return {
+        'trial': trial, 'episodes': episodes,
+        'score': stats[f'{args.metric}_wins'] / n,
+        'thief_win_rate': stats['thief_wins'] / n,
+        'guard_win_rate': stats['guard_wins'] / n,
+        'draw_rate': stats['draws'] / n,
+        'train_seconds': round(train_time, 2),
+    }
+
+
+def write_results(path, rows):
+    fields = ['trial', *PARAMS, 'episodes', 'score', 'thief_win_rate', 'guard_win_rate',
+              'draw_rate', 'train_seconds', 'status']
+    tmp = path + '.tmp'
+    with open(tmp, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+
+
+def save_winners(args, ranked, configs):
+    winners_dir = os.path.join(args.out_dir, 'winners')
+    os.makedirs(winners_dir, exist_ok=True)
+    roles = ['thief', 'guard'] if args.role == 'both' else [args.role]
+    saved = []
+    for rank, row in enumerate(ranked[:args.top], start=1):
+        trial = row['trial']
+        metadata = {
+            'sweep_rank': rank,
+            'trial': trial,
+            'hyperparameters': configs[trial],
+            'episodes': row['episodes'],
+            'metric': f'{args.metric}_win_rate',
+            'score': row['score'],
+            'eval_episodes': args.eval_episodes,
+            'layout': args.layout,
+            'seed': args.seed + trial,
+        }
+        for role in roles:
+            agent = BaseAgent.load(resolve_model_path(trial_dir(args, trial), f'{role}_agent'))
+            path = os.path.join(winners_dir, f'rank{rank}_{role}_agent.{args.model_format}')
+            AgentBundle(agent, metadata).save(path)
+            saved.append(path)
+    return saved
+
+
+def main():
+    args = parse_args()
+    configs = make_configs(args)
+    os.makedirs(args.out_dir, exist_ok=True)
+    results_path = os.path.join(args.out_dir, 'results.csv')
+    rows = []
+    alive = list(range(len(configs)))
+    print(f"{len(configs)} configurations, milestones {args.milestones}, keeping {args.keep:.0%} per rung")
+
+    with Pool(min(args.workers, len(configs))) as pool:
+        for rung, episodes in enumerate(args.milestones):
+            start = time.perf_counter()
+            tasks = [(args, trial, configs[trial], episodes) for trial in alive]
+            rung_rows = list(pool.imap_unordered(run_trial, tasks))
+            rung_rows.sort(key=lambda r: (-r['score'], r['trial']))
+            last = rung == len(args.milestones) - 1
+            keep = len(rung_rows) if last else max(1, math.ceil(len(rung_rows) * args.keep))
+            for i, row in enumerate(rung_rows):
+                row.update(configs[row['trial']])
+                row['status'] = ('final' if last else 'promoted') if i < keep else 'stopped'
+                if row['status'] == 'stopped':
+                    shutil.rmtree(trial_dir(args, row['trial']), ignore_errors=True)
+            rows.extend(rung_rows)
+            write_results(results_path, rows)
+            alive = [r['trial'] for r in rung_rows[:keep]]
+            best = rung_rows[0]
+            print(f"Milestone {episodes}: {len(rung_rows)} trials in {time.perf_counter() - start:.1f}s, "
+                  f"best trial {best['trial']} {args.metric} win rate {best['score']:.3f}, "
+                  f"{len(alive)} continue")
+
+    saved = save_winners(args, rung_rows, configs)
+    print(f"Results written to '{results_path}'")
+    for path in saved:
+        print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    main()
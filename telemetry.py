@@ -0,0 +1,220 @@
+import os
+import sys
+import csv
+import json
+import time
+
+import numpy as np
+
+import utils
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PHASES = ('env_step', 'select_action', 'q_update', 'trap_placement')
+RESULTS = ('thief', 'guard', None)
+
+
+class RingBuffer:
+    """
+    Fixed-size float buffer keeping the last `capacity` values.
+    """
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+
+    def push(self, value):
+        self.data[self.count % len(self.data)] = value
+        self.count += 1
+
+    def window(self):
+        return self.data[:min(self.count, len(self.data))]
+
+    def mean(self):
+        w = self.window()
+        return float(w.mean()) if len(w) else 0.0
+
+    def var(self):
+        w = self.window()
+        return float(w.var()) if len(w) else 0.0
+
+
+def q_table_bytes(table):
+    """
+    Approximate resident size of a Q-table (value matrix plus key index).
+    """
+    values = getattr(table, '_values', None)
+    size = values.nbytes if isinstance(values, np.ndarray) and not isinstance(values, np.memmap) else 0
+    index = getattr(table, 'index', None)
+    if isinstance(index, dict):
+        size += sys.getsizeof(index)
+    elif isinstance(table, dict):
+        size += sys.getsizeof(table)
+    return size
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MiB, or None where the
+    resource module is unavailable (Windows).
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, row):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(row) + '\n')
+
+
+class CsvWriter:
+    def __init__(self, path):
+        self.path = path
+        self.fields = None
+
+    def write(self, row):
+        new_file = self.fields is None and not os.path.exists(self.path)
+        if self.fields is None:
+            self.fields = list(row)
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.fields, extrasaction='ignore')
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+
+class PrometheusWriter:
+    """
+    Rewrites a Prometheus text-format file (for node_exporter's textfile
+    collector) with the latest snapshot.
+    """
+    def __init__(self, path, prefix='heist_'):
+        self.path = path
+        self.prefix = prefix
+
+    def write(self, row):
+        lines = []
+        for name, value in row.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"{self.prefix}{name} {value}")
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, self.path)
+
+
+def make_writer(path):
+    if path.endswith('.csv'):
+        return CsvWriter(path)
+    if path.endswith('.prom'):
+        return PrometheusWriter(path)
+    return JsonlWriter(path)
+
+
+class Telemetry:
+    """
+    Low-overhead counters for training and evaluation loops.
+
+    Loops add elapsed perf_counter() deltas with add_time(), report finished
+    episodes with end_episode() and TD errors with record_td(); every
+    `flush_interval` episodes a snapshot row is written. Rolling statistics
+    use fixed-size ring buffers, so memory stays constant over a run.
+    """
+    def __init__(self, path=None, flush_interval=1000, window=1000, agents=None):
+        self.writer = make_writer(path) if path else None
+        self.flush_interval = flush_interval
+        self.agents = agents or {}
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.counters = {'episodes': 0, 'steps': 0}
+        self.outcomes = {result: RingBuffer(window) for result in RESULTS}
+        self.episode_steps = RingBuffer(window)
+        self.td_errors = {role: RingBuffer(window * 50) for role in self.agents}
+        self.start = time.perf_counter()
+        self._orig_trap_tile = None
+
+    def add_time(self, phase, seconds):
+        self.times[phase] += seconds
+
+    def record_td(self, role, td_error):
+        if td_error is not None:
+            self.td_errors[role].push(td_error)
+
+    def end_episode(self, result, steps):
+        self.counters['episodes'] += 1
+        self.counters['steps'] += steps
+        for r, buf in self.outcomes.items():
+            buf.push(1.0 if result == r else 0.0)
+        self.episode_steps.push(steps)
+        if self.writer and self.counters['episodes'] % self.flush_interval == 0:
+            self.flush()
+
+    def instrument_trap_placement(self):
+        """
+        Time every compute_best_trap_tile call (HeistEnv looks it up on utils
+        at call time). Undo with uninstrument().
+        """
+        if self._orig_trap_tile is not None:
+            return
+        original = utils.compute_best_trap_tile
+        perf_counter = time.perf_counter
+
+        def timed(env):
+            t0 = perf_counter()
+            tile = original(env)
+            self.times['trap_placement'] += perf_counter() - t0
+            return tile
+        self._orig_trap_tile = original
+        utils.compute_best_trap_tile = timed
+
+    def uninstrument(self):
+        if self._orig_trap_tile is not None:
+            utils.compute_best_trap_tile = self._orig_trap_tile
+            self._orig_trap_tile = None
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.start
+        row = {
+            'episodes': self.counters['episodes'],
+            'steps': self.counters['steps'],
+            'elapsed_s': round(elapsed, 3),
+            'episodes_per_s': round(self.counters['episodes'] / elapsed, 2) if elapsed else 0.0,
+        }
+        for phase, seconds in self.times.items():
+            row[f'time_{phase}_s'] = round(seconds, 4)
+        row['win_rate_thief'] = round(self.outcomes['thief'].mean(), 4)
+        row['win_rate_guard'] = round(self.outcomes['guard'].mean(), 4)
+        row['draw_rate'] = round(self.outcomes[None].mean(), 4)
+        row['mean_episode_steps'] = round(self.episode_steps.mean(), 2)
+        for role, agent in self.agents.items():
+            if role in self.td_errors:
+                row[f'td_mean_{role}'] = round(self.td_errors[role].mean(), 6)
+                row[f'td_var_{role}'] = round(self.td_errors[role].var(), 6)
+            table = getattr(agent, 'q_table', None)
+            if table is not None:
+                row[f'q_states_{role}'] = len(table)
+                row[f'q_bytes_{role}'] = q_table_bytes(table)
+            if hasattr(agent, 'epsilon'):
+                row[f'epsilon_{role}'] = agent.epsilon
+        rss = peak_rss_mb()
+        row['peak_rss_mb'] = None if rss is None else round(rss, 1)
+        return row
+
+    def flush(self):
+        row = self.snapshot()
+        if self.writer:
+            self.writer.write(row)
+        return row
+
+    def close(self):
+        self.uninstrument()
+        if self.writer and self.counters['episodes'] % self.flush_interval:
+            self.flush()
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+
+from env.heist_env import HeistEnv
+from env.layouts import parse_layout
+from agents.agent_bundle import AgentBundle
+from agents.frozen_policy import FrozenPolicy
+from agents.model_format import EXTENSIONS, compact_agent_class, sidecar_path
+from evaluate import run_episodes
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Round-robin tournament of every saved thief against every saved guard."
+    )
+    parser.add_argument(
+        '--model_dir', type=str, default='models',
+        help='Directory of .pkl/.qt models; each file is classified as thief or guard by its agent class'
+    )
+    parser.add_argument(
+        '--episodes', type=int, default=1000,
+        help='Episodes per pairing'
+    )
+    parser.add_argument(
+        '--max_steps', type=int, default=50,
+        help='Max steps per episode'
+    )
+    parser.add_argument(
+        '--layout', type=str, default='default',
+        help="Map layout: 'default', 'open:SIZE' or 'random:SIZE[:GEMS[:SEED]]'"
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Seed of every pairing, so all pairings play the same random-number stream'
+    )
+    parser.add_argument(
+        '--frozen', action='store_true',
+        help='Play compiled greedy policies (epsilon 0) instead of the agents as saved'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count() or 1,
+        help='Pairings played in parallel'
+    )
+    parser.add_argument(
+        '--cache', type=str, default=os.path.join('tournaments', 'cache.jsonl'),
+        help='Results cache; a pairing is only played if no entry matches its models, config and seed'
+    )
+    parser.add_argument(
+        '--out', type=str, default=os.path.join('tournaments', 'results.json'),
+        help='Where the win-rate matrices and ratings are written'
+    )
+    return parser.parse_args()
+
+
+def file_hash(path):
+    """
+    SHA-256 of a model file (and its .qt sidecar), read in blocks.
+    """
+    digest = hashlib.sha256()
+    paths = [path, sidecar_path(path)] if path.endswith('.qt') else [path]
+    for p in paths:
+        with open(p, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def find_models(model_dir):
+    """
+    {'thief': {name: path}, 'guard': {name: path}} for every model in
+    model_dir; a .qt file shadows a .pkl with the same name. A .qt model's
+    role comes from its JSON sidecar; only .pkl files are unpickled.
+    """
+    models = {'thief': {}, 'guard': {}}
+    for ext in EXTENSIONS:
+        for name in sorted(os.listdir(model_dir)):
+            stem, file_ext = os.path.splitext(name)
+            if file_ext != ext or stem in models['thief'] or stem in models['guard']:
+                continue
+            path = os.path.join(model_dir, name)
+            try:
+                if ext == '.qt':
+                    cls = compact_agent_class(path)
+                else:
+                    cls = type(AgentBundle.load(path).get_agent())
+            except Exception as e:
+                print(f"Skipping {path}: {e}")
+                continue
+            if cls.role in models:
+                models[cls.role][stem] = path
+    return models
+
+
+def cache_key(thief_hash, guard_hash, config):
+    payload = json.dumps({'thief': thief_hash, 'guard': guard_hash, **config}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load_cache(path):
+    cache = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    cache[entry['key']] = entry
+    return cache
+
+
+# Per-process state: each worker loads a model once and reuses it across pairings.
+_worker = {}
+
+
+def _init_worker(config):
+    _worker['config'] = config
+    _worker['env'] = HeistEnv(parse_layout(config['layout']))
+    _worker['agents'] = {}
+
+
+def _agent(path):
+    agents = _worker['agents']
+    if path not in agents:
+        agent = AgentBundle.load(path).get_agent()
+        agents[path] = FrozenPolicy.compile(agent) if _worker['config']['frozen'] else agent
+    return agents[path]
+
+
+def _play(task):
+    key, thief_path, guard_path = task
+    config = _worker['config']
+    start = time.perf_counter()
+    random.seed(config['seed'])
+    stats = run_episodes(_worker['env'], _agent(thief_path), _agent(guard_path), 'both',
+                         config['episodes'], config['max_steps'])
+    return {
+        'key': key,
+        'thief_wins': stats['thief_wins'],
+        'guard_wins': stats['guard_wins'],
+        'draws': stats['draws'],
+        'avg_steps': sum(stats['steps']) / len(stats['steps']),
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+
+
+def elo_ratings(scores, games, iters=2000, lr=100.0):
+    """
+    Elo-style ratings fitted to a thief x guard score matrix (thief wins
+    plus half the draws, as a fraction of games): gradient ascent on the
+    logistic likelihood, which unlike sequential Elo updates does not
+    depend on the order pairings finished in. One virtual draw per pairing
+    keeps ratings finite after a clean sweep. Ratings are centred on 1500.
+    """
+    num_thieves, num_guards = scores.shape
+    scores = (scores * games + 0.5) / (games + 1)
+    games = games + 1
+    ratings = np.zeros(num_thieves + num_guards)
+    for _ in range(iters):
+        diff = ratings[:num_thieves, None] - ratings[None, num_thieves:]
+        expected = 1.0 / (1.0 + 10 ** (-diff / 400))
+        residual = games * (scores - expected)
+        grad = np.concatenate([residual.sum(axis=1), -residual.sum(axis=0)])
+        counts = np.concatenate([games.sum(axis=1), games.sum(axis=0)])
+        ratings += lr * grad / np.maximum(counts, 1)
+        ratings -= ratings.mean()
+    return ratings[:num_thieves] + 1500, ratings[num_thieves:] + 1500
+
+
+def print_matrix(title, thieves, guards, matrix):
+    corner = 'thief \\ guard'
+    width = max(len(name) for name in thieves + [corner])
+    print(f"\n{title}")
+    print(f"{corner:<{width}}" + ''.join(f"  {i:>6}" for i in range(len(guards))))
+    for name, row in zip(thieves, matrix):
+        print(f"{name:<{width}}" + ''.join(f"  {v:6.3f}" for v in row))
+    for i, name in enumerate(guards):
+        print(f"  [{i}] {name}")
+
+
+def main():
+    args = parse_args()
+    config = {
+        'layout': args.layout, 'max_steps': args.max_steps, 'episodes': args.episodes,
+        'seed': args.seed, 'frozen': args.frozen,
+    }
+    models = find_models(args.model_dir)
+    thieves, guards = sorted(models['thief']), sorted(models['guard'])
+    if not thieves or not guards:
+        raise SystemExit(f"Need at least one thief and one guard in {args.model_dir}")
+    hashes = {path: file_hash(path) for role in models for path in models[role].values()}
+
+    cache = load_cache(args.cache)
+    pairings = {}
+    todo = []
+    for t in thieves:
+        for g in guards:
+            thief_path, guard_path = models['thief'][t], models['guard'][g]
+            key = cache_key(hashes[thief_path], hashes[guard_path], config)
+            pairings[t, g] = key
+            if key not in cache:
+                todo.append((key, thief_path, guard_path))
+    print(f"{len(thieves)} thieves x {len(guards)} guards: {len(pairings) - len(todo)} pairings cached, "
+          f"{len(todo)} to play")
+
+    if todo:
+        directory = os.path.dirname(args.cache)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        start = time.perf_counter()
+        with open(args.cache, 'a') as f, \
+                Pool(min(args.workers, len(todo)), initializer=_init_worker, initargs=(config,)) as pool:
+            for result in pool.imap_unordered(_play, todo):
+                # appended as each pairing finishes, so an interrupted run keeps its progress
+                f.write(json.dumps(result) + '\n')
+                f.flush()
+                cache[result['key']] = result
+        print(f"Played {len(todo)} pairings in {time.perf_counter() - start:.1f}s")
+
+    shape = (len(thieves), len(guards))
+    thief_rate, guard_rate, games, scores = (np.zeros(shape) for _ in range(4))
+    for i, t in enumerate(thieves):
+        for j, g in enumerate(guards):
+            r = cache[pairings[t, g]]
+            n = r['thief_wins'] + r['guard_wins'] + r['draws']
+            thief_rate[i, j] = r['thief_wins'] / n
+            guard_rate[i, j] = r['guard_wins'] / n
+            scores[i, j] = (r['thief_wins'] + 0.5 * r['draws']) / n
+            games[i, j] = n
+    thief_elo, guard_elo = elo_ratings(scores, games)
+
+    print_matrix("Thief win rate (rows: thieves, columns: guards)", thieves, guards, thief_rate)
+    print_matrix("Guard win rate", thieves, guards, guard_rate)
+    print("\nRatings")
+    ranked = sorted([(r, 'thief', n) for n, r in zip(thieves, thief_elo)] +
+                    [(r, 'guard', n) for n, r in zip(guards, guard_elo)], reverse=True)
+    for rating, role, name in ranked:
+        print(f"  {rating:7.1f}  {role:<5}  {name}")
+
+    directory = os.path.dirname(args.out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump({
+            'config': config,
+            'thieves': thieves,
+            'guards': guards,
+            'thief_win_rate': thief_rate.tolist(),
+            'guard_win_rate': guard_rate.tolist(),
+            'draw_rate': (1 - thief_rate - guard_rate).tolist(),
+            'elo': {'thief': dict(zip(thieves, thief_elo.round(1).tolist())),
+                    'guard': dict(zip(guards, guard_elo.round(1).tolist()))},
+        }, f, indent=2)
+    print(f"\nResults written to '{args.out}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,28 @@
 import os
+import time
 import argparse
+import queue
 import random
+import multiprocessing as mp
+from collections import Counter
 
 from env.heist_env import HeistEnv
+from env.layouts import parse_layout
+from env.observation import key_encoder
 from agents.thief_agent import ThiefAgent
 from agents.guard_agent import GuardAgent
-from utils import manhattan_distance
+from agents.linear_agent import LinearThiefAgent, LinearGuardAgent
+from agents.q_table import StateEncoder
+from agents.shared_q_table import SharedQTable
+from agents.replay_buffer import ReplayBuffer
+from agents.multistep import NStepQ, WatkinsQLambda
+from agents.dyna import PrioritizedSweeping
+from agents.frozen_policy import FrozenPolicy
+from telemetry import Telemetry
+from checkpoint import Checkpointer, restore
+from evaluate import run_episodes
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description="Train agents in the Heist environment with partial observability for the guard."
     )
@@ -23,6 +38,11 @@ def parse_args():
         '--max_steps', type=int, default=50,
         help='Max steps per episode'
     )
+    parser.add_argument(
+        '--agent', choices=['tabular', 'linear'], default='tabular',
+        help="'tabular' Q-tables, or 'linear' semi-gradient Q-learning on tile-coded "
+             "features with a fixed-size weight vector (saved as .pkl)"
+    )
     parser.add_argument(
         '--alpha', type=float, default=0.1,
         help='Learning rate'
@@ -35,25 +55,114 @@ def parse_args():
         '--epsilon', type=float, default=0.1,
         help='Exploration rate'
     )
+    parser.add_argument(
+        '--n_step', type=int, default=1,
+        help='Update each Q-value from the next N rewards (n-step Q-learning; 1 is the one-step update)'
+    )
+    parser.add_argument(
+        '--q_lambda', type=float, default=None,
+        help="Watkins's Q(lambda) with replacing eligibility traces and this lambda"
+    )
+    parser.add_argument(
+        '--planning_steps', type=int, default=0,
+        help='Dyna-Q: simulated backups per real step, by prioritized sweeping over a learnt model (0 disables)'
+    )
+    parser.add_argument(
+        '--planning_theta', type=float, default=1e-4,
+        help='Smallest TD error that queues a model transition for planning'
+    )
+    parser.add_argument(
+        '--planning_queue', type=int, default=10000,
+        help='Most transitions kept in the planning priority queue'
+    )
+    parser.add_argument(
+        '--beta_t', type=float, default=0.05,
+        help="Thief shaping weight: reward per step closer to the nearest gem (or the exit)"
+    )
+    parser.add_argument(
+        '--beta_g', type=float, default=0.15,
+        help='Guard shaping weight: reward per step closer to the thief'
+    )
+    parser.add_argument(
+        '--layout', type=str, default='default',
+        help="Map layout: 'default', 'open:SIZE' or 'random:SIZE[:GEMS[:SEED]]'"
+    )
     parser.add_argument(
         '--save_dir', type=str, default='models',
         help='Directory to save trained agents'
     )
-    return parser.parse_args()
-
-def mask_guard_state(tuple_state):
-    thief_pos, guard_pos, gems, traps, alarm, exit_pos = tuple_state
-    if not alarm and manhattan_distance(thief_pos, guard_pos) > 2:
-        thief_view = None
-    else:
-        thief_view = thief_pos
-    return (thief_view, guard_pos, gems, traps, alarm, exit_pos)
-
-def split_state(global_state):
-    if isinstance(global_state, dict):
-        return global_state['thief'], global_state['guard']
-    else:
-        return global_state, mask_guard_state(global_state)
+    parser.add_argument(
+        '--model_format', choices=['qt', 'pkl'], default=None,
+        help="Save format: memory-mappable 'qt' with a JSON sidecar (default for tabular agents), "
+             "or a 'pkl' pickle (default and only choice for linear agents)"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Number of parallel actor processes sharing one Q-table per role'
+    )
+    parser.add_argument(
+        '--sync_interval', type=int, default=1,
+        help='Episodes an actor buffers before applying its updates to the shared Q-table'
+    )
+    parser.add_argument(
+        '--table_capacity', type=int, default=2 ** 22,
+        help='Rows preallocated per shared Q-table (power of two)'
+    )
+    parser.add_argument(
+        '--replay_capacity', type=int, default=0,
+        help='Transitions kept per trained agent for experience replay (0 disables replay)'
+    )
+    parser.add_argument(
+        '--replay_batch', type=int, default=64,
+        help='Transitions per replayed mini-batch'
+    )
+    parser.add_argument(
+        '--replay_batches', type=int, default=1,
+        help='Mini-batches replayed per environment step'
+    )
+    parser.add_argument(
+        '--replay_start', type=int, default=1000,
+        help='Transitions to collect before replay starts'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=None,
+        help='Base random seed'
+    )
+    parser.add_argument(
+        '--checkpoint_interval', type=int, default=0,
+        help='Episodes between incremental checkpoints (0, the default, disables checkpointing)'
+    )
+    parser.add_argument(
+        '--checkpoint_dir', type=str, default=None,
+        help="Checkpoint directory (default: SAVE_DIR/checkpoints)"
+    )
+    parser.add_argument(
+        '--full_checkpoint_every', type=int, default=10,
+        help='Delta checkpoints written before the next full base snapshot'
+    )
+    parser.add_argument(
+        '--resume', action='store_true',
+        help='Continue from the latest checkpoint: Q-tables, episode counter and RNG state'
+    )
+    parser.add_argument(
+        '--best_eval_episodes', type=int, default=0,
+        help='Greedy episodes against the random agent that score each checkpoint for the '
+             'best_<role>_so_far snapshots (0, the default, disables them)'
+    )
+    parser.add_argument(
+        '--telemetry', type=str, default=None,
+        help='Write telemetry snapshots to this file (.jsonl, .csv or .prom)'
+    )
+    parser.add_argument(
+        '--telemetry_interval', type=int, default=1000,
+        help='Episodes between telemetry snapshots'
+    )
+    args = parser.parse_args(argv)
+    if args.model_format is None:
+        args.model_format = 'qt' if args.agent == 'tabular' else 'pkl'
+    elif args.agent == 'linear' and args.model_format == 'qt':
+        parser.error("linear agents have no Q-table to store as .qt; use --model_format pkl")
+    return args
 
 def make_random_agent(action_space):
     class RandomAgent:
@@ -67,58 +176,363 @@ def make_random_agent(action_space):
             pass
     return RandomAgent(action_space)
 
-def train():
-    args = parse_args()
-    os.makedirs(args.save_dir, exist_ok=True)
+def make_env(args):
+    return HeistEnv(parse_layout(args.layout), beta_t=args.beta_t, beta_g=args.beta_g)
 
-    env = HeistEnv()
+def make_agents(args, env):
     action_space = env.ACTIONS
-
+    if args.agent == 'linear':
+        thief_agent = LinearThiefAgent(action_space, env.layout, alpha=args.alpha,
+                                       gamma=args.gamma, epsilon=args.epsilon)
+        guard_agent = LinearGuardAgent(action_space, env.layout, alpha=args.alpha,
+                                       gamma=args.gamma, epsilon=args.epsilon)
+        return thief_agent, guard_agent
+    try:
+        encoder = StateEncoder.for_env(env)
+    except ValueError as e:
+        raise SystemExit(f"{e}; train --agent linear on this layout")
     thief_agent = ThiefAgent(
         action_space,
         alpha=args.alpha,
         gamma=args.gamma,
-        epsilon=args.epsilon
+        epsilon=args.epsilon,
+        encoder=encoder
     )
     guard_agent = GuardAgent(
         action_space,
         alpha=args.alpha,
         gamma=args.gamma,
-        epsilon=args.epsilon
+        epsilon=args.epsilon,
+        encoder=encoder
     )
+    return thief_agent, guard_agent
+
+def save_agents(args, thief_agent, guard_agent):
+    if args.role in ('thief', 'both'):
+        thief_agent.save(os.path.join(args.save_dir, f'thief_agent.{args.model_format}'))
+    if args.role in ('guard', 'both'):
+        guard_agent.save(os.path.join(args.save_dir, f'guard_agent.{args.model_format}'))
+
+def make_learner(args, agent):
+    """
+    What the training loop calls update() on: agent itself for the
+    one-step update, or a multi-step wrapper around its Q-table.
+    """
+    if args.planning_steps:
+        return PrioritizedSweeping(agent, args.planning_steps, args.planning_theta, args.planning_queue)
+    if args.q_lambda is not None:
+        return WatkinsQLambda(agent, args.q_lambda)
+    if args.n_step > 1:
+        return NStepQ(agent, args.n_step)
+    return agent
+
+def replay_step(agent, buffer, args, state, action, reward, next_state, done):
+    """
+    Store one transition and replay mini-batches once the buffer is warm.
+    """
+    buffer.push(agent._row(state), action, reward, agent._row(next_state), done)
+    if len(buffer) >= args.replay_start:
+        buffer.replay(agent, args.replay_batch, args.replay_batches)
+
+def greedy_win_rate(args, agent, role):
+    """
+    Win rate of agent's greedy policy against the random agent over
+    args.best_eval_episodes episodes. Every call plays the same seeded
+    episodes, and the training run's random state is left untouched.
+    """
+    state = random.getstate()
+    random.seed(args.seed or 0)
+    env = make_env(args)
+    policy = FrozenPolicy.compile(agent)
+    stats = run_episodes(env, policy, policy, role, args.best_eval_episodes, args.max_steps)
+    random.setstate(state)
+    return stats[f'{role}_wins'] / args.best_eval_episodes
+
+def save_checkpoint(args, checkpointer, telemetry, episode, real_steps):
+    """
+    Snapshot each trained role whose greedy win rate against the random
+    agent is its best so far, then queue an incremental checkpoint.
+    """
+    if args.best_eval_episodes:
+        # evaluation trap placements are not training time
+        if telemetry:
+            telemetry.uninstrument()
+        for role in checkpointer.agents:
+            score = greedy_win_rate(args, checkpointer.agents[role], role)
+            path = os.path.join(args.save_dir, f'best_{role}_so_far.{args.model_format}')
+            checkpointer.update_best(role, score, episode, path, real_steps)
+        if telemetry:
+            telemetry.instrument_trap_placement()
+    checkpointer.save(episode, real_steps)
+
+def train(args=None):
+    args = args or parse_args()
+    os.makedirs(args.save_dir, exist_ok=True)
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.workers > 1 and args.replay_capacity:
+        raise SystemExit("--replay_capacity is only supported with --workers 1")
+    if args.workers > 1 and (args.resume or args.checkpoint_interval):
+        raise SystemExit("--resume and --checkpoint_interval are only supported with --workers 1")
+    if args.resume and (args.replay_capacity or args.planning_steps):
+        # checkpoints hold Q-values and the `random` state only, so these
+        # runs could not continue where they stopped
+        raise SystemExit("--resume does not restore replay buffers or the Dyna model; "
+                         "it cannot be combined with --replay_capacity or --planning_steps")
+    if args.agent == 'linear' and (args.workers > 1 or args.replay_capacity):
+        raise SystemExit("linear agents support neither --workers > 1 nor --replay_capacity")
+    if (args.n_step > 1) + (args.q_lambda is not None) + (args.planning_steps > 0) > 1:
+        raise SystemExit("choose one of --n_step, --q_lambda and --planning_steps")
+    if (args.n_step > 1 or args.q_lambda is not None or args.planning_steps) and \
+            (args.agent == 'linear' or args.workers > 1 or args.replay_capacity):
+        raise SystemExit("--n_step, --q_lambda and --planning_steps need tabular agents, "
+                         "--workers 1 and no replay")
+    if args.workers > 1:
+        train_parallel(args)
+        return
+
+    env = make_env(args)
+    action_space = env.ACTIONS
+
+    thief_agent, guard_agent = make_agents(args, env)
+    random_agent = make_random_agent(action_space)
+    trained = {}
+    if args.role in ('thief', 'both'):
+        trained['thief'] = thief_agent
+    if args.role in ('guard', 'both'):
+        trained['guard'] = guard_agent
+    learners = {role: make_learner(args, agent) for role, agent in trained.items()}
+    replay = {}
+    if args.replay_capacity:
+        for i, role in enumerate(trained):
+            seed = None if args.seed is None else args.seed + i
+            replay[role] = ReplayBuffer(args.replay_capacity, seed=seed)
+    first_episode = 1
+    real_steps = 0
+    checkpoint_dir = args.checkpoint_dir or os.path.join(args.save_dir, 'checkpoints')
+    checkpointer = None
+    if args.checkpoint_interval:
+        checkpointer = Checkpointer(checkpoint_dir, trained, args.full_checkpoint_every,
+                                    extra={'role': args.role, 'layout': args.layout})
+    if args.resume:
+        manifest = restore(checkpoint_dir, trained)
+        if manifest is None:
+            print(f"No checkpoint in '{checkpoint_dir}', starting from scratch.")
+        elif (manifest.get('role'), manifest.get('layout')) != (args.role, args.layout):
+            raise SystemExit(f"Checkpoint was written for --role {manifest.get('role')} "
+                             f"--layout {manifest.get('layout')}")
+        else:
+            first_episode = manifest['episode'] + 1
+            real_steps = manifest.get('real_steps', 0)
+            if checkpointer:
+                checkpointer.resume_from(manifest)
+            print(f"Resumed from episode {manifest['episode']} ({len(manifest['segments'])} segments).")
+    telemetry = None
+    if args.telemetry:
+        telemetry = Telemetry(args.telemetry, args.telemetry_interval, agents=trained)
+        telemetry.instrument_trap_placement()
+    perf_counter = time.perf_counter
+    # tabular agents learn from integer state keys built straight from the env
+    encoder = key_encoder(env, trained.values())
+
+    try:
+        for ep in range(first_episode, args.episodes + 1):
+            env.reset()
+            state_thief, state_guard = env.observe_keys(encoder) if encoder else env.observe()
+            done = False
+            step = 0
+
+            while not done and step < args.max_steps:
+                t0 = perf_counter() if telemetry else 0.0
+                if args.role in ('thief', 'both'):
+                    a_thief = thief_agent.select_action(state_thief)
+                else:
+                    a_thief = random_agent.select_action(state_thief)
+                if args.role in ('guard', 'both'):
+                    a_guard = guard_agent.select_action(state_guard)
+                else:
+                    a_guard = random_agent.select_action(state_guard)
+                t1 = perf_counter() if telemetry else 0.0
+                _, (r_thief, r_guard), done, info = env.step(a_thief, a_guard)
+                next_thief, next_guard = env.observe_keys(encoder) if encoder else env.observe()
+                t2 = perf_counter() if telemetry else 0.0
+                if args.role in ('thief', 'both'):
+                    td_thief = learners['thief'].update(state_thief, a_thief, r_thief, next_thief, done)
+                    if telemetry:
+                        telemetry.record_td('thief', td_thief)
+                if args.role in ('guard', 'both'):
+                    td_guard = learners['guard'].update(state_guard, a_guard, r_guard, next_guard, done)
+                    if telemetry:
+                        telemetry.record_td('guard', td_guard)
+                if 'thief' in replay:
+                    replay_step(thief_agent, replay['thief'], args,
+                                state_thief, a_thief, r_thief, next_thief, done)
+                if 'guard' in replay:
+                    replay_step(guard_agent, replay['guard'], args,
+                                state_guard, a_guard, r_guard, next_guard, done)
+                if telemetry:
+                    t3 = perf_counter()
+                    telemetry.add_time('select_action', t1 - t0)
+                    telemetry.add_time('env_step', t2 - t1)
+                    telemetry.add_time('q_update', t3 - t2)
+                state_thief, state_guard = next_thief, next_guard
+                step += 1
+            for learner in learners.values():
+                if hasattr(learner, 'end_episode'):
+                    learner.end_episode()
+            if telemetry:
+                telemetry.end_episode(info.get('result'), step)
+            real_steps += step
+            if ep % 1000 == 0:
+                print(f"Episode {ep}/{args.episodes} ended: result={info.get('result')}")
+            if checkpointer and (ep % args.checkpoint_interval == 0 or ep == args.episodes):
+                save_checkpoint(args, checkpointer, telemetry, ep, real_steps)
+    finally:
+        # restores utils.compute_best_trap_tile even if training raises
+        if telemetry:
+            telemetry.close()
+    if checkpointer:
+        checkpointer.close()
+    save_agents(args, thief_agent, guard_agent)
+
+    for role, learner in learners.items():
+        if hasattr(learner, 'stats'):
+            print(f"{role} planning: " + ', '.join(f"{k}={v}" for k, v in learner.stats().items()))
+    # real steps to the best greedy score, comparable across runs with and
+    # without --planning_steps (benchmarks/time_to_target.py does this to a target)
+    for role, best in (checkpointer.best.items() if checkpointer else ()):
+        print(f"{role} best greedy win rate {best['score']:.1%} at episode {best['episode']} "
+              f"after {best.get('real_steps', 0)} of {real_steps} real steps")
+    print(f"Training complete. Models saved to '{args.save_dir}'.")
+
+def apply_updates(agent, transitions):
+    for state, action, reward, next_state, done in transitions:
+        row = agent._row(state)
+        with agent.q_table.lock_for(row):
+            agent.update(state, action, reward, next_state, done)
+    transitions.clear()
+
+def run_actor(actor_id, args, episodes, seed, thief_table, guard_table, progress):
+    """
+    Actor process: plays its share of episodes against its own HeistEnv and
+    applies buffered updates to the shared Q-tables every sync_interval episodes.
+    """
+    random.seed(seed)
+    env = make_env(args)
+    action_space = env.ACTIONS
+    thief_agent, guard_agent = make_agents(args, env)
+    thief_agent.q_table = thief_table
+    guard_agent.q_table = guard_table
     random_agent = make_random_agent(action_space)
+    train_thief = args.role in ('thief', 'both')
+    train_guard = args.role in ('guard', 'both')
+    thief_pending, guard_pending = [], []
+    results = Counter()
+    synced = 0
+    encoder = key_encoder(env, (thief_agent, guard_agent))
 
-    for ep in range(1, args.episodes + 1):
-        obs = env.reset()
-        state_thief, state_guard = split_state(obs)
+    for ep in range(1, episodes + 1):
+        env.reset()
+        state_thief, state_guard = env.observe_keys(encoder) if encoder else env.observe()
         done = False
         step = 0
 
         while not done and step < args.max_steps:
-            if args.role in ('thief', 'both'):
-                a_thief = thief_agent.select_action(state_thief)
-            else:
-                a_thief = random_agent.select_action(state_thief)
-            if args.role in ('guard', 'both'):
-                a_guard = guard_agent.select_action(state_guard)
-            else:
-                a_guard = random_agent.select_action(state_guard)
-            next_obs, (r_thief, r_guard), done, info = env.step(a_thief, a_guard)
-            next_thief, next_guard = split_state(next_obs)
-            if args.role in ('thief', 'both'):
-                thief_agent.update(state_thief, a_thief, r_thief, next_thief, done)
-            if args.role in ('guard', 'both'):
-                guard_agent.update(state_guard, a_guard, r_guard, next_guard, done)
+            a_thief = (thief_agent if train_thief else random_agent).select_action(state_thief)
+            a_guard = (guard_agent if train_guard else random_agent).select_action(state_guard)
+            _, (r_thief, r_guard), done, info = env.step(a_thief, a_guard)
+            next_thief, next_guard = env.observe_keys(encoder) if encoder else env.observe()
+            if train_thief:
+                thief_pending.append((state_thief, a_thief, r_thief, next_thief, done))
+            if train_guard:
+                guard_pending.append((state_guard, a_guard, r_guard, next_guard, done))
             state_thief, state_guard = next_thief, next_guard
             step += 1
-        if ep % 1000 == 0:
-            print(f"Episode {ep}/{args.episodes} ended: result={info.get('result')}")
-    if args.role in ('thief', 'both'):
-        thief_agent.save(os.path.join(args.save_dir, 'thief_agent.pkl'))
-    if args.role in ('guard', 'both'):
-        guard_agent.save(os.path.join(args.save_dir, 'guard_agent.pkl'))
+        results[info.get('result')] += 1
 
-    print(f"Training complete. Models saved to '{args.save_dir}'.")
+        if ep % args.sync_interval == 0 or ep == episodes:
+            apply_updates(thief_agent, thief_pending)
+            apply_updates(guard_agent, guard_pending)
+            progress.put((actor_id, ep - synced, dict(results)))
+            synced = ep
+            results.clear()
+
+def actor_main(actor_id, args, episodes, seed, thief_table, guard_table, progress):
+    """
+    Actor process target: run_actor, reporting a failure to the parent
+    through the progress queue as (actor_id, None, error message).
+    """
+    try:
+        run_actor(actor_id, args, episodes, seed, thief_table, guard_table, progress)
+    except Exception as e:
+        progress.put((actor_id, None, f"{type(e).__name__}: {e}"))
+        raise
+
+def stop_actors(actors, message):
+    for p in actors:
+        if p.is_alive():
+            p.terminate()
+        p.join()
+    raise SystemExit(message)
+
+def train_parallel(args):
+    env = make_env(args)
+    action_space = env.ACTIONS
+    # built up front so a layout tabular agents cannot encode fails here, not in every actor
+    thief_agent, guard_agent = make_agents(args, env)
+    thief_table = SharedQTable(len(action_space), capacity=args.table_capacity)
+    guard_table = SharedQTable(len(action_space), capacity=args.table_capacity)
+    progress = mp.Queue()
+
+    base = args.episodes // args.workers
+    actors = []
+    for i in range(args.workers):
+        episodes = base + (1 if i < args.episodes % args.workers else 0)
+        seed = random.randrange(2 ** 63)
+        actors.append(mp.Process(
+            target=actor_main,
+            args=(i, args, episodes, seed, thief_table, guard_table, progress),
+            daemon=True,
+        ))
+    start = time.perf_counter()
+    for p in actors:
+        p.start()
+
+    completed = 0
+    results = Counter()
+    next_report = 1000
+    while completed < args.episodes:
+        try:
+            actor_id, n, counts = progress.get(timeout=1.0)
+        except queue.Empty:
+            actor_id = n = None
+        if n is None and actor_id is not None:
+            stop_actors(actors, f"Actor {actor_id} failed: {counts}")
+        # an actor killed outright never reports; don't wait for it forever
+        for i, p in enumerate(actors):
+            if p.exitcode not in (None, 0):
+                stop_actors(actors, f"Actor {i} exited with code {p.exitcode}")
+        if n is None:
+            continue
+        completed += n
+        results.update(counts)
+        if completed >= next_report or completed == args.episodes:
+            elapsed = time.perf_counter() - start
+            print(f"Episode {completed}/{args.episodes}: "
+                  f"{completed / elapsed:.1f} episodes/sec, "
+                  f"thief={results.get('thief', 0)} guard={results.get('guard', 0)} "
+                  f"draw={results.get(None, 0)}")
+            results.clear()
+            next_report = (completed // 1000 + 1) * 1000
+    for p in actors:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    thief_agent.q_table = thief_table.to_array_table()
+    guard_agent.q_table = guard_table.to_array_table()
+    save_agents(args, thief_agent, guard_agent)
+    print(f"Training complete in {elapsed:.1f}s ({args.episodes / elapsed:.1f} episodes/sec "
+          f"across {args.workers} actors). Models saved to '{args.save_dir}'.")
 
 if __name__ == '__main__':
     train()
@@ -1,6 +1,7 @@
 import heapq
 import random
-from collections import Counter
+from collections import Counter, deque
+from functools import lru_cache
 
 def manhattan_distance(a, b):
     return abs(a[0] - b[0]) + abs(a[1] - b[1])
@@ -32,30 +33,106 @@ def astar(start, goal, walls, width, height):
 
     return []
 
-def compute_best_trap_tile(env):
+class PathTable:
+    """
+    Shortest-path tables for one static wall layout.
+
+    Paths are the ones astar() returns (so trap scoring is unchanged) and are
+    computed once per (start, goal) pair; BFS distance rows are computed once
+    per source tile. Either cache is cleared when it reaches its size limit,
+    so memory stays bounded on large maps.
+    """
+    MAX_PATHS = 1 << 16
+    MAX_DISTANCE_ROWS = 4096
+
+    def __init__(self, walls, width, height):
+        self.walls = frozenset(walls)
+        self.width = width
+        self.height = height
+        self._paths = {}
+        self._distances = {}
+
+    def path(self, start, goal):
+        key = (start, goal)
+        path = self._paths.get(key)
+        if path is None:
+            path = tuple(astar(start, goal, self.walls, self.width, self.height))
+            if len(self._paths) >= self.MAX_PATHS:
+                self._paths.clear()
+            self._paths[key] = path
+        return path
+
+    def next_hop(self, start, goal):
+        path = self.path(start, goal)
+        return path[1] if len(path) > 1 else None
+
+    def distances(self, source):
+        """
+        {tile: shortest path length} for every tile reachable from source.
+        """
+        row = self._distances.get(source)
+        if row is None:
+            row = {source: 0}
+            queue = deque([source])
+            while queue:
+                current = queue.popleft()
+                for neighbor in get_neighbors(current, self.walls, self.width, self.height):
+                    if neighbor not in row:
+                        row[neighbor] = row[current] + 1
+                        queue.append(neighbor)
+            if len(self._distances) >= self.MAX_DISTANCE_ROWS:
+                self._distances.clear()
+            self._distances[source] = row
+        return row
+
+    def distance(self, a, b):
+        return self.distances(a).get(b)
+
+
+@lru_cache(maxsize=32)
+def _path_table(walls, width, height):
+    return PathTable(walls, width, height)
+
+def get_path_table(walls, width, height):
+    # one table per recently used layout; sweeps and tournaments over many
+    # random: layouts drop the least recently used ones
+    return _path_table(frozenset(walls), width, height)
+
+@lru_cache(maxsize=65536)
+def _best_trap_tile(walls, alarms, width, height, thief_pos, gems, collected, exit_pos, traps):
+    table = get_path_table(walls, width, height)
     score = Counter()
-    thief_pos = env.thief_pos
-    exit_pos  = env.exit
-    walls, width, height = env.walls, env.width, env.height
-    for g in env.gems:
-        path = astar(thief_pos, g, walls, width, height)
-        for tile in path[1:]:
+    for g in gems:
+        for tile in table.path(thief_pos, g)[1:]:
             score[tile] += 1
-    for g in list(env.gems) + env.collected:
-        path = astar(g, exit_pos, walls, width, height)
-        for tile in path[1:]:
+    for g in gems + collected:
+        for tile in table.path(g, exit_pos)[1:]:
             score[tile] += 2
     candidates = [
         (tile, sc) for tile, sc in score.items()
-        if env._is_valid(tile)
-           and tile not in env.alarms
-           and tile not in env.traps
+        if tile not in walls
+           and tile not in alarms
+           and tile not in traps
     ]
     if not candidates:
         return None
-    best_tile, _ = max(candidates, key=lambda x: x[1])
+    # ties go to the lowest (x, y) tile, matching VecHeistEnv
+    best_tile, _ = max(candidates, key=lambda x: (x[1], -x[0][0], -x[0][1]))
     return best_tile
 
+def compute_best_trap_tile(env):
+    layout = getattr(env, 'layout', None)
+    if layout is not None:
+        # the layout's frozensets cache their hashes, which matters on big maps
+        walls, alarms = layout.walls, layout.alarms
+    else:
+        walls, alarms = frozenset(env.walls), frozenset(env.alarms)
+    return _best_trap_tile(
+        walls, alarms, env.width, env.height,
+        env.thief_pos, tuple(env.gems), tuple(env.collected), env.exit,
+        frozenset(env.traps),
+    )
+
 def state_to_key(state):
     thief_pos, guard_pos, gems, traps, alarm, exit_pos = state
     parts = [
@@ -1,20 +1,22 @@
 import os
 import sys
+import time
 import random
+import argparse
 import pygame
 
 from env.heist_env import HeistEnv
-from agents.thief_agent import ThiefAgent
-from agents.guard_agent import GuardAgent
-from utils import manhattan_distance
+from env.layouts import parse_layout
+from agents.base_agent import BaseAgent
+from agents.frozen_policy import FrozenPolicy
+from agents.model_format import resolve_model_path
 
 # ---- Configuration ----
-CELL_SIZE = 80
-GRID_SIZE = 6
-WIDTH = CELL_SIZE * GRID_SIZE
-HEIGHT = CELL_SIZE * GRID_SIZE
-FPS = 3   # frames per second => ~0.33s per step
+CELL_SIZE = 80      # largest cell size; shrunk to fit MAX_WINDOW on big maps
+MAX_WINDOW = 960
+FPS = 3   # frames per second => ~0.33s per step (window only; headless runs unthrottled)
 MODEL_DIR = 'models'
+LAYOUT = 'default'  # see env.layouts.parse_layout
 
 # Colors
 WHITE  = (255,255,255)
@@ -28,30 +30,16 @@ BLUE   = (0,0,255)
 PURPLE = (128,0,128)
 
 
-def mask_guard_state(tuple_state):
-    thief_pos, guard_pos, gems, traps, alarm, exit_pos = tuple_state
-    if not alarm and manhattan_distance(thief_pos, guard_pos) > 2:
-        thief_view = None
-    else:
-        thief_view = thief_pos
-    return (thief_view, guard_pos, gems, traps, alarm, exit_pos)
-
-
-def split_state(obs):
-    if isinstance(obs, dict):
-        return obs['thief'], obs['guard']
-    else:
-        return obs, mask_guard_state(obs)
-
-
-def load_agent(agent_cls, filename, action_space):
-    path = os.path.join(MODEL_DIR, filename)
-    if os.path.exists(path):
+def load_agent(role, action_space, model_dir=MODEL_DIR, frozen=False):
+    name = f'{role}_agent'
+    path = resolve_model_path(model_dir, name)
+    if path:
         try:
-            return agent_cls.load(path)
+            agent = BaseAgent.load(path, role=role)
+            return FrozenPolicy.compile(agent) if frozen else agent
         except Exception as e:
-            print(f"Failed to load {filename}: {e}")
-    print(f"Using random agent for {filename}")
+            print(f"Failed to load {path}: {e}")
+    print(f"Using random agent for {name}")
     class RandomAgent:
         def __init__(self, action_space):
             self.action_space = action_space
@@ -60,76 +48,249 @@ def load_agent(agent_cls, filename, action_space):
     return RandomAgent(action_space)
 
 
-def draw_grid(screen, env):
-    """Draw walls, alarms, gems, traps, exit, and agents."""
-    for x in range(GRID_SIZE):
-        for y in range(GRID_SIZE):
-            rect = pygame.Rect(y*CELL_SIZE, x*CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            pygame.draw.rect(screen, WHITE, rect)
-            pygame.draw.rect(screen, GRAY, rect, 1)
-
-            pos = (x,y)
-            if pos in env.walls:
-                pygame.draw.rect(screen, BLACK, rect)
-            elif pos in env.alarms:
-                pygame.draw.rect(screen, RED, rect)
-            if pos in env.gems:
-                pygame.draw.circle(screen, YELLOW, rect.center, CELL_SIZE//4)
-            if pos in env.traps:
+def cell_size_for(env):
+    return max(2, min(CELL_SIZE, MAX_WINDOW // max(env.height, env.width)))
+
+
+class Renderer:
+    """
+    Draws an env onto a surface. Walls, alarms and cell borders never
+    change, so they are pre-rendered once to a background surface; each
+    draw() only restores and repaints the cells whose contents (gems,
+    traps, exit, agents) changed since the previous frame and returns their
+    rects for pygame.display.update().
+    """
+    def __init__(self, env, cell=CELL_SIZE):
+        self.env = env
+        self.cell = cell
+        self.background = pygame.Surface((cell * env.width, cell * env.height))
+        self.background.fill(WHITE)
+        for x in range(env.height):
+            for y in range(env.width):
+                rect = self.rect((x, y))
+                pygame.draw.rect(self.background, GRAY, rect, 1)
+                if (x, y) in env.walls:
+                    pygame.draw.rect(self.background, BLACK, rect)
+                elif (x, y) in env.alarms:
+                    pygame.draw.rect(self.background, RED, rect)
+        self.drawn = {}
+
+    def rect(self, pos):
+        x, y = pos
+        return pygame.Rect(y * self.cell, x * self.cell, self.cell, self.cell)
+
+    def _contents(self):
+        """
+        What each non-static cell shows, as cell -> tuple of layer names in
+        drawing order.
+        """
+        env = self.env
+        layers = {}
+        for pos in env.gems:
+            layers.setdefault(pos, []).append('gem')
+        for pos in env.traps:
+            layers.setdefault(pos, []).append('trap')
+        layers.setdefault(env.exit, []).append('exit')
+        layers.setdefault(env.thief_pos, []).append('thief')
+        layers.setdefault(env.guard_pos, []).append('guard')
+        return {pos: tuple(items) for pos, items in layers.items()}
+
+    def _paint(self, screen, pos, items):
+        rect = self.rect(pos)
+        screen.blit(self.background, rect, rect)
+        for item in items:
+            if item == 'gem':
+                pygame.draw.circle(screen, YELLOW, rect.center, self.cell // 4)
+            elif item == 'trap':
                 pygame.draw.rect(screen, ORANGE, rect)
-            if pos == env.exit:
+            elif item == 'exit':
                 pygame.draw.rect(screen, GREEN, rect)
+            elif item == 'thief':
+                pygame.draw.circle(screen, BLUE, rect.center, self.cell // 3)
+            else:
+                pygame.draw.circle(screen, PURPLE, rect.center, self.cell // 3)
+        return rect
 
-    # Draw thief
-    tx, ty = env.thief_pos
-    trect = pygame.Rect(ty*CELL_SIZE, tx*CELL_SIZE, CELL_SIZE, CELL_SIZE)
-    pygame.draw.circle(screen, BLUE, trect.center, CELL_SIZE//3)
-    # Draw guard
-    gx, gy = env.guard_pos
-    grect = pygame.Rect(gy*CELL_SIZE, gx*CELL_SIZE, CELL_SIZE, CELL_SIZE)
-    pygame.draw.circle(screen, PURPLE, grect.center, CELL_SIZE//3)
+    def draw(self, screen, full=False):
+        """
+        Bring screen up to date with the env; returns the dirty rects.
+        """
+        contents = self._contents()
+        if full:
+            screen.blit(self.background, (0, 0))
+            for pos, items in contents.items():
+                self._paint(screen, pos, items)
+            self.drawn = contents
+            return [screen.get_rect()]
+        dirty = []
+        for pos in self.drawn.keys() | contents.keys():
+            items = contents.get(pos, ())
+            if self.drawn.get(pos) != items:
+                dirty.append(self._paint(screen, pos, items))
+        self.drawn = contents
+        return dirty
 
 
-def main():
-    pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("HeistEnv Visualization")
-    clock = pygame.time.Clock()
+def draw_grid(screen, env, cell=CELL_SIZE):
+    """Draw walls, alarms, gems, traps, exit, and agents (full frame)."""
+    Renderer(env, cell).draw(screen, full=True)
 
-    env = HeistEnv()
-    action_space = env.ACTIONS
 
-    thief_agent = load_agent(ThiefAgent, 'thief_agent.pkl', action_space)
-    guard_agent = load_agent(GuardAgent, 'guard_agent.pkl', action_space)
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Watch agents play HeistEnv, or export episodes as frames/GIFs headlessly."
+    )
+    parser.add_argument(
+        '--model_dir', type=str, default=MODEL_DIR,
+        help='Directory where trained agents are saved'
+    )
+    parser.add_argument(
+        '--layout', type=str, default=LAYOUT,
+        help="Map layout: 'default', 'open:SIZE' or 'random:SIZE[:GEMS[:SEED]]'"
+    )
+    parser.add_argument(
+        '--fps', type=float, default=FPS,
+        help='Steps per second in the window; frame rate of exported GIFs'
+    )
+    parser.add_argument(
+        '--max_steps', type=int, default=None,
+        help='Max steps per episode (default: unlimited in the window, 50 when headless)'
+    )
+    parser.add_argument(
+        '--frozen', action='store_true',
+        help='Play compiled greedy policies (epsilon 0) that never modify the loaded models'
+    )
+    parser.add_argument(
+        '--headless', action='store_true',
+        help='Render off-screen with the SDL dummy driver and export instead of displaying'
+    )
+    parser.add_argument(
+        '--episodes', type=int, nargs='+', default=[1],
+        help='Episode numbers to export headlessly; episode i is played with seed SEED+i'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Base seed for headless episodes'
+    )
+    parser.add_argument(
+        '--export', choices=['gif', 'png'], default='gif',
+        help="'gif': one animated GIF per episode (needs Pillow); 'png': one image per frame"
+    )
+    parser.add_argument(
+        '--out_dir', type=str, default='frames',
+        help='Where headless exports are written'
+    )
+    return parser.parse_args()
 
-    running = True
-    while running:
-        obs = env.reset()
-        state_thief, state_guard = split_state(obs)
-        done = False
 
-        while not done and running:
-            for ev in pygame.event.get():
-                if ev.type == pygame.QUIT:
-                    running = False
+def play_episode(env, thief_agent, guard_agent, max_steps=None, on_step=None):
+    """
+    Play one episode, calling on_step() after reset and after every step;
+    on_step returning False stops the episode. Returns the result.
+    """
+    env.reset()
+    state_thief, state_guard = env.observe()
+    done = False
+    info = {}
+    step = 0
+    if on_step and on_step() is False:
+        return None
+    while not done and (max_steps is None or step < max_steps):
+        a_thief = thief_agent.select_action(state_thief)
+        a_guard = guard_agent.select_action(state_guard)
 
-            a_thief = thief_agent.select_action(state_thief)
-            a_guard = guard_agent.select_action(state_guard)
+        _, (r_t, r_g), done, info = env.step(a_thief, a_guard)
+        state_thief, state_guard = env.observe()
+        step += 1
+        if on_step and on_step() is False:
+            return None
+    return info.get('result')
 
-            new_obs, (r_t, r_g), done, info = env.step(a_thief, a_guard)
-            next_thief, next_guard = split_state(new_obs)
 
-            draw_grid(screen, env)
-            pygame.display.flip()
-            clock.tick(FPS)
+def save_gif(frames, path, fps):
+    try:
+        from PIL import Image
+    except ImportError:
+        raise SystemExit("GIF export needs Pillow (pip install pillow); use --export png instead")
+    images = [Image.frombytes('RGB', size, data) for size, data in frames]
+    images[0].save(path, save_all=True, append_images=images[1:],
+                   duration=int(1000 / fps), loop=0)
 
-            # Advance states
-            state_thief, state_guard = next_thief, next_guard
 
+def export_episodes(args, env, thief_agent, guard_agent, cell):
+    """
+    Render the requested episodes off-screen as fast as they can be played.
+    """
+    os.makedirs(args.out_dir, exist_ok=True)
+    surface = pygame.Surface((cell * env.width, cell * env.height))
+    max_steps = args.max_steps or 50
+    total_frames = 0
+    start = time.perf_counter()
+    for ep in args.episodes:
+        random.seed(args.seed + ep)
+        renderer = Renderer(env, cell)
+        frames = []
+
+        def capture():
+            renderer.draw(surface, full=not frames)
+            if args.export == 'png':
+                pygame.image.save(surface, os.path.join(args.out_dir, f'episode_{ep:03d}_{len(frames):03d}.png'))
+                frames.append(None)
+            else:
+                frames.append((surface.get_size(), pygame.image.tobytes(surface, 'RGB')))
+
+        result = play_episode(env, thief_agent, guard_agent, max_steps, capture)
+        if args.export == 'gif':
+            path = os.path.join(args.out_dir, f'episode_{ep:03d}.gif')
+            save_gif(frames, path, args.fps)
+        else:
+            path = os.path.join(args.out_dir, f'episode_{ep:03d}_*.png')
+        total_frames += len(frames)
+        print(f"Episode {ep}: {result or 'draw'}, {len(frames)} frames -> {path}")
+    elapsed = time.perf_counter() - start
+    print(f"Exported {total_frames} frames in {elapsed:.1f}s ({total_frames / elapsed:.0f} frames/s)")
+
+
+def main():
+    args = parse_args()
+    if args.headless:
+        # must be set before pygame.init()
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    env = HeistEnv(parse_layout(args.layout))
+    action_space = env.ACTIONS
+    cell = cell_size_for(env)
+
+    pygame.init()
+    thief_agent = load_agent('thief', action_space, args.model_dir, args.frozen)
+    guard_agent = load_agent('guard', action_space, args.model_dir, args.frozen)
+
+    if args.headless:
+        export_episodes(args, env, thief_agent, guard_agent, cell)
+        pygame.quit()
+        return
+
+    screen = pygame.display.set_mode((cell * env.width, cell * env.height))
+    pygame.display.set_caption("HeistEnv Visualization")
+    clock = pygame.time.Clock()
+    renderer = Renderer(env, cell)
+    running = True
+
+    def show():
+        nonlocal running
+        for ev in pygame.event.get():
+            if ev.type == pygame.QUIT:
+                running = False
+        pygame.display.update(renderer.draw(screen, full=not renderer.drawn))
+        clock.tick(args.fps)
+        return running
+
+    while running:
+        renderer.drawn = {}
+        result = play_episode(env, thief_agent, guard_agent, args.max_steps, show)
         if not running:
             break
 
-        print(f"Episode ended: {info.get('result')}")
+        print(f"Episode ended: {result}")
         pygame.time.delay(1000)
 
     pygame.quit()